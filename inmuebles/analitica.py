@@ -0,0 +1,99 @@
+# inmuebles/analitica.py
+# Panel y JSON de ocupación (portada/analitica.py): ocupación, días vacíos y
+# renta media por mes de la cartera, por tipo y por propietario.
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+
+from portada import analitica, versiones
+from portada.models import Inmueble
+
+MESES_DEFECTO = 24
+MESES_MAXIMO = 240
+
+
+def rango(GET):
+    """(desde, hasta, errores) de ?desde=AAAA-MM&hasta=AAAA-MM; por defecto los últimos 24 meses."""
+    hasta = timezone.localdate().replace(day=1)
+    desde = (hasta - datetime.timedelta(days=31 * (MESES_DEFECTO - 1))).replace(day=1)
+    errores = []
+    for nombre in ('desde', 'hasta'):
+        if GET.get(nombre):
+            try:
+                valor = datetime.datetime.strptime(GET[nombre], '%Y-%m').date()
+            except ValueError:
+                errores.append(f"'{nombre}' debe tener el formato AAAA-MM")
+                continue
+            if nombre == 'desde':
+                desde = valor
+            else:
+                hasta = valor
+    if desde > hasta:
+        errores.append("'desde' es posterior a 'hasta'")
+    elif (hasta.year - desde.year) * 12 + hasta.month - desde.month >= MESES_MAXIMO:
+        errores.append(f"Como mucho {MESES_MAXIMO} meses")
+    return desde, hasta, errores
+
+
+@login_required
+def panel(request):
+    desde, hasta, errores = rango(request.GET)
+    datos = None if errores else analitica.cacheado(desde, hasta)
+    propietario = request.GET.get('propietario', '')
+    contexto = {
+        'desde': f'{desde:%Y-%m}', 'hasta': f'{hasta:%Y-%m}', 'errores': errores, 'propietario': propietario,
+    }
+    if datos:
+        series = [('Cartera', datos['cartera'])]
+        series += [(dict(Inmueble.TIPO_CHOICES).get(t, t), s) for t, s in datos['tipos'].items()]
+        if propietario.isdigit() and int(propietario) in datos['propietarios']:
+            s = datos['propietarios'][int(propietario)]
+            series.insert(1, (s['nombre'], s))
+        contexto.update(
+            meses=datos['meses'], series=series,
+            # filas por mes, la más reciente arriba
+            filas=[(mes, [(s['ocupacion'][n], s['dias_vacios'][n], s['renta_media'][n]) for _, s in series])
+                   for n, mes in reversed(list(enumerate(datos['meses'])))],
+            propietarios=sorted(((p, s['nombre']) for p, s in datos['propietarios'].items()), key=lambda x: x[1]),
+        )
+    return render(request, 'inmuebles/ocupacion.html', contexto)
+
+
+def ocupacion_json(request):
+    """
+    Las series en JSON. ?agrupacion=cartera,tipos,propietarios elige qué
+    bloques (por defecto cartera y tipos) y ?propietario=<id> se queda con uno.
+    """
+    if not request.user.is_authenticated:
+        raise PermissionDenied  # 403 como el resto de la API
+    desde, hasta, errores = rango(request.GET)
+    if errores:
+        return JsonResponse({'error': '; '.join(errores)}, status=400)
+    pedidas = request.GET.get('agrupacion', 'cartera,tipos').split(',')
+    propietario = request.GET.get('propietario', '')
+
+    # con el rango ya resuelto: sin desde/hasta, la misma URL cambia de meses al cambiar de mes
+    etag = versiones.etag(analitica.MODELOS, request.path, f'{desde:%Y-%m}', f'{hasta:%Y-%m}',
+                          ','.join(sorted(pedidas)), propietario)
+    no_modificado = etag and get_conditional_response(request, etag=etag)
+    if no_modificado:
+        return no_modificado
+
+    datos = analitica.cacheado(desde, hasta)
+    respuesta = {'meses': datos['meses']}
+    for bloque in ('cartera', 'tipos', 'propietarios'):
+        if bloque in pedidas:
+            respuesta[bloque] = datos[bloque]
+    if propietario.isdigit():
+        respuesta['propietarios'] = {k: v for k, v in datos['propietarios'].items() if k == int(propietario)}
+    response = JsonResponse(respuesta, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,111 @@
+# inmuebles/api.py
+# API JSON de solo lectura sobre los listados: mismos filtros GET que
+# InmuebleList/PagoList, selección de campos (?campos=a,b), paginación por
+# cursor y filas sacadas con values() sin instanciar modelos. El ETag sale
+# de las versiones de portada/versiones.py, así que una petición sin cambios
+# se responde 304 sin leer las tablas.
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+
+from portada import versiones
+from .cacheo import query_normalizada
+from .paginacion import PaginadorCursor
+from .views import InmuebleList, PagoList
+
+LIMITE_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+
+class ApiListadoMixin:
+    """
+    Convierte un ListView con filtros en su versión JSON. La vista define
+    campos_api = {nombre público: ruta para values()} y campos_defecto.
+    """
+    raise_exception = True  # 403 en vez de redirigir al login
+    campos_api = {}
+    campos_defecto = ()
+
+    def campos_pedidos(self):
+        """(campos pedidos, los que no existen)."""
+        pedidos = self.request.GET.get('campos')
+        if pedidos is None:
+            return list(self.campos_defecto), []
+        campos = list(dict.fromkeys(c.strip() for c in pedidos.split(',') if c.strip()))
+        return campos, [c for c in campos if c not in self.campos_api]
+
+    def etag(self):
+        return versiones.etag(self.modelos_cache, self.request.path, query_normalizada(self.request.GET))
+
+    def get(self, request, *args, **kwargs):
+        campos, desconocidos = self.campos_pedidos()
+        if desconocidos or not campos:
+            return JsonResponse({
+                'error': f"Campos no válidos: {', '.join(desconocidos) or '(ninguno)'}",
+                'campos': list(self.campos_api),
+            }, status=400)
+        try:
+            limite = min(max(int(request.GET.get('limite', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+        except ValueError:
+            limite = LIMITE_DEFECTO
+
+        etag = self.etag()
+        no_modificado = etag and get_conditional_response(request, etag=etag)
+        if no_modificado:
+            return no_modificado
+
+        qs = self.get_queryset()
+        orden = self.orden_efectivo.lstrip('-')
+        # el campo de orden y el id hacen falta para el cursor aunque no se pidan
+        necesarios = dict.fromkeys([*campos, orden, 'id'])
+        directos = [c for c in necesarios if self.campos_api.get(c, c) == c]
+        alias = {c: F(self.campos_api[c]) for c in necesarios if self.campos_api.get(c, c) != c}
+        paginador = PaginadorCursor(qs.values(*directos, **alias), limite, self.orden_efectivo)
+        pagina = paginador.pagina(request.GET.get('cursor'))
+
+        response = JsonResponse({
+            'resultados': [{c: fila[c] for c in campos} for fila in pagina],
+            'siguiente': pagina.cursor_siguiente,
+            'anterior': pagina.cursor_anterior,
+        }, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+        if etag:
+            response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'  # siempre revalidar con el ETag
+        return response
+
+
+class InmuebleApi(ApiListadoMixin, InmuebleList):
+    campos_api = {
+        'id': 'id',
+        'tipo': 'tipo',
+        'direccion': 'direccion',
+        'planta': 'planta',
+        'puerta': 'puerta',
+        'metros': 'metros',
+        'habitaciones': 'habitaciones',
+        'propietario_id': 'propietario_id',
+        'propietario_nombre': 'propietario__nombre',
+        'contrato_vigente_id': 'contrato_vigente_id',
+    }
+    campos_defecto = ('id', 'tipo', 'direccion', 'planta', 'puerta', 'metros', 'habitaciones',
+                      'propietario_id', 'contrato_vigente_id')
+
+
+class PagoApi(ApiListadoMixin, PagoList):
+    # contrato_id: borrar un contrato lo pone a NULL en sus pagos sin señales de Pago
+    modelos_cache = PagoList.modelos_cache + ('contrato',)
+    campos_api = {
+        'id': 'id',
+        'fecha': 'fecha',
+        'inmueble_id': 'inmueble_id',
+        'inmueble_direccion': 'inmueble__direccion',
+        'contrato_id': 'contrato_id',
+        'tipo_id': 'tipo_id',
+        'tipo_nombre': 'tipo__nombre',
+        'descripcion': 'descripcion',
+        'total': 'total',
+        'pagado': 'pagado',
+        'quien_paga': 'quien_paga',
+    }
+    campos_defecto = ('id', 'fecha', 'inmueble_id', 'tipo_id', 'descripcion', 'total', 'pagado', 'quien_paga')
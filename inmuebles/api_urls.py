@@ -0,0 +1,11 @@
+from django.urls import path
+from . import analitica, api, morosidad
+
+app_name = 'api'
+
+urlpatterns = [
+    path('inmuebles/', api.InmuebleApi.as_view(), name='inmuebles'),
+    path('pagos/', api.PagoApi.as_view(), name='pagos'),
+    path('ocupacion/', analitica.ocupacion_json, name='ocupacion'),
+    path('morosidad/alertas/', morosidad.alertas, name='morosidad_alertas'),
+]
@@ -0,0 +1,139 @@
+# inmuebles/asincronas.py
+# Versiones async de los listados para servir por ASGI (settings.VISTAS_ASYNC):
+# las consultas independientes de una página (filas, COUNT, totales, tipos)
+# se lanzan a la vez, cada una en un hilo con su propia conexión, en lugar de
+# una detrás de otra. El filtrado y el contexto son los de las vistas síncronas.
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db import close_old_connections, connection
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from portada import replica
+
+from .cacheo import MARCA_CSRF
+from .paginacion import PaginadorCursor, conteo_cacheado
+from .views import InmuebleList, PagoList
+
+
+def _con_conexion_propia(funcion):
+    def ejecutar():
+        if replica.activa():
+            replica.al_dia()  # el hilo puede tener abierta una réplica ya sustituida
+        try:
+            return funcion()
+        finally:
+            close_old_connections()  # la conexión del hilo se cierra (o se reutiliza) según CONN_MAX_AGE
+    return ejecutar
+
+
+async def en_paralelo(*funciones):
+    """Ejecuta funciones síncronas con consultas a la vez y devuelve sus resultados en orden."""
+    if await sync_to_async(lambda: connection.in_atomic_block)():
+        # dentro de una transacción (ATOMIC_REQUESTS, tests) solo su conexión ve lo escrito
+        return [await sync_to_async(f)() for f in funciones]
+    return await asyncio.gather(*(
+        sync_to_async(_con_conexion_propia(f), thread_sensitive=False)() for f in funciones
+    ))
+
+
+class ListadoAsyncMixin:
+    """
+    Sustituye el get de un ListView con CursorPaginationMixin y
+    RespuestaCacheadaMixin por uno async. La vista declara en
+    consultas_contexto() las consultas del contexto que no dependen de la página.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
+        if request.method not in ('GET', 'HEAD'):
+            return self.http_method_not_allowed(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    def _guardada(self):
+        self.clave = self.clave_respuesta()
+        return cache.get(self.clave) if self.clave else None
+
+    def _numero_pagina(self):
+        """Como el ListView: un entero desde 1 o 'last' (None aquí: depende del total)."""
+        pagina = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        if pagina == 'last':
+            return None
+        try:
+            numero = int(pagina)
+        except ValueError:
+            raise Http404('Página no válida')
+        if numero < 1:
+            raise Http404('Página no válida')
+        return numero
+
+    async def get(self, request, *args, **kwargs):
+        guardada = await sync_to_async(self._guardada)()
+        if guardada is not None:
+            return self.servir_guardada(guardada)
+
+        self.object_list = qs = self.get_queryset()
+        por_pagina = self.get_paginate_by(qs)
+        if self.usa_cursor():
+            paginador = PaginadorCursor(qs, por_pagina, self.orden_efectivo)
+            token = request.GET.get(self.cursor_param)
+            paginacion = [lambda: paginador.pagina(token)]
+        else:
+            paginador = self.get_paginator(qs, por_pagina)
+            numero = self._numero_pagina()
+            if numero is None:
+                # la última: el total se cuenta antes (y queda en caché para la consulta de abajo)
+                paginador.count, = await en_paralelo(lambda: conteo_cacheado(qs))
+                numero = paginador.num_pages
+            desde = (numero - 1) * por_pagina
+            paginacion = [lambda: list(qs[desde:desde + por_pagina]), lambda: conteo_cacheado(qs)]
+        consultas = self.consultas_contexto()
+        # contexto_filtros() lee versiones de la caché, que puede ser la BD: también en un hilo
+        resultados = await en_paralelo(*paginacion, self.contexto_filtros, *consultas)
+
+        if self.usa_cursor():
+            pagina = resultados[0]
+        else:
+            filas, paginador.count = resultados[0], resultados[1]
+            try:
+                paginador.validate_number(numero)
+            except InvalidPage as e:
+                raise Http404(str(e))
+            pagina = paginador._get_page(filas, numero, paginador)
+        contexto = {
+            'view': self,
+            'paginator': paginador,
+            'page_obj': pagina,
+            'is_paginated': pagina.has_other_pages(),
+            'object_list': pagina.object_list,
+            self.get_context_object_name(qs): pagina.object_list,
+            **resultados[len(paginacion)],
+        }
+        for extra in resultados[len(paginacion) + 1:]:
+            contexto.update(extra)
+        if self.clave:
+            contexto['csrf_token'] = MARCA_CSRF
+
+        response = TemplateResponse(request, self.get_template_names(), contexto)
+        await en_paralelo(lambda: self._renderizar(response))
+        return response
+
+    def _renderizar(self, response):
+        # en un hilo: las plantillas pueden tocar la sesión (mensajes) y eso es síncrono
+        response.render()
+        if self.clave:
+            self.guardar_respuesta(response)
+
+
+class InmuebleListAsync(ListadoAsyncMixin, InmuebleList):
+    pass
+
+
+class PagoListAsync(ListadoAsyncMixin, PagoList):
+    pass
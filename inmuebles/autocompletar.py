@@ -0,0 +1,82 @@
+# inmuebles/autocompletar.py
+# Búsqueda incremental para los FK de los formularios: en vez de un <select>
+# con todas las filas, un campo de texto que pide al servidor páginas pequeñas
+# de resultados por prefijo (índices FTS de portada/busqueda.py).
+from django import forms
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views import View
+
+from portada import busqueda
+from portada.models import Inmueble, Propietario, TipoPago
+
+POR_PAGINA = 20
+
+
+def _inmuebles(texto):
+    qs = Inmueble.objects.order_by('direccion', 'id')
+    return qs.filter(busqueda.q_busqueda('inmueble', texto)) if texto else qs
+
+
+def _propietarios(texto):
+    qs = Propietario.objects.order_by('nombre', 'id')
+    return qs.filter(busqueda.q_busqueda('propietario', texto, columnas=['nombre', 'dni'])) if texto else qs
+
+
+def _tipos(texto):
+    # tabla pequeña: no necesita índice de texto
+    return TipoPago.objects.filter(activo=True, nombre__icontains=texto).order_by('nombre', 'id')
+
+
+# fuente -> (modelo, función que filtra por el texto buscado)
+FUENTES = {
+    'inmueble': (Inmueble, _inmuebles),
+    'propietario': (Propietario, _propietarios),
+    'tipopago': (TipoPago, _tipos),
+}
+
+
+def buscar(fuente, texto='', pagina=1):
+    """Una página de resultados [(id, etiqueta)] y si hay más."""
+    filas = list(FUENTES[fuente][1](texto.strip())[(pagina - 1) * POR_PAGINA:pagina * POR_PAGINA + 1])
+    return [(o.pk, str(o)) for o in filas[:POR_PAGINA]], len(filas) > POR_PAGINA
+
+
+class AutocompletarView(LoginRequiredMixin, View):
+    """GET ?q=texto&pagina=N -> {"resultados": [{"id", "texto"}], "mas": bool, "pagina": N}"""
+
+    def get(self, request, fuente):
+        if fuente not in FUENTES:
+            raise Http404
+        try:
+            pagina = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            pagina = 1
+        resultados, mas = buscar(fuente, request.GET.get('q', ''), pagina)
+        return JsonResponse({'resultados': [{'id': i, 'texto': t} for i, t in resultados], 'mas': mas,
+                             'pagina': pagina})
+
+
+class Autocompletar(forms.Widget):
+    """
+    Widget para un ModelChoiceField: input oculto con el id y un campo de
+    búsqueda contra AutocompletarView. Solo consulta la etiqueta del valor actual.
+    """
+    template_name = 'inmuebles/widgets/autocompletar.html'
+
+    def __init__(self, fuente, attrs=None):
+        super().__init__(attrs)
+        self.fuente = fuente
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        etiqueta = ''
+        if value not in (None, ''):
+            obj = FUENTES[self.fuente][0].objects.filter(pk=value).first() if str(value).isdigit() else None
+            etiqueta = str(obj) if obj else ''
+        context['widget'].update({
+            'url': reverse('inmuebles:autocompletar', args=[self.fuente]),
+            'etiqueta': etiqueta,
+        })
+        return context
@@ -0,0 +1,75 @@
+# inmuebles/cacheo.py
+# Caché de listados completos sobre portada/versiones.py: lo guardado deja de
+# servirse en cuanto cambia cualquiera de los modelos de los que depende.
+from urllib.parse import urlencode
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from portada import versiones
+
+
+# ocupa el sitio del token CSRF en las respuestas cacheadas (no puede salir de escapar nada)
+MARCA_CSRF = 'csrf-token-de-la-peticion'
+
+
+def con_token(request, contenido):
+    """Pone en `contenido` el token CSRF de la petición (y hace que la respuesta fije la cookie)."""
+    return contenido.replace(MARCA_CSRF.encode(), get_token(request).encode())
+
+
+def query_normalizada(GET, ignorar=()):
+    """Query string con los parámetros ordenados y sin los vacíos: ?a=1&b= y ?b=&a=1 son la misma."""
+    return urlencode(sorted((k, v) for k, vs in GET.lists() if k not in ignorar for v in vs if v != ''))
+
+
+class RespuestaCacheadaMixin:
+    """
+    Cachea la respuesta GET entera de un listado por usuario + query
+    normalizada + versión de `modelos_cache`. Los formularios POST de la
+    página se renderizan con MARCA_CSRF en lugar del token, que se pone al
+    servirla: lo cacheado no depende de la cookie CSRF de cada navegador.
+
+    Solo con una caché compartida (versiones.compartida()): con una local
+    los cambios hechos en otros procesos no invalidarían lo guardado.
+    """
+    modelos_cache = ()
+    cache_ttl = versiones.TTL
+    clave = None
+
+    def clave_respuesta(self):
+        request = self.request
+        if not versiones.compartida() or not request.user.is_authenticated or len(messages.get_messages(request)):
+            return None  # los mensajes se muestran una sola vez
+        return versiones.clave(
+            f'respuesta:{request.resolver_match.view_name}', self.modelos_cache,
+            request.user.pk, query_normalizada(request.GET),
+        )
+
+    def get_context_data(self, **kwargs):
+        contexto = super().get_context_data(**kwargs)
+        if self.clave:
+            contexto['csrf_token'] = MARCA_CSRF  # el de la vista manda sobre el del context processor
+        return contexto
+
+    def guardar_respuesta(self, response):
+        """Guarda la respuesta ya renderizada y le pone el token CSRF de esta petición."""
+        cache.set(self.clave, (response.content, response['Content-Type']), self.cache_ttl)
+        response.content = con_token(self.request, response.content)
+
+    def servir_guardada(self, guardada):
+        contenido, content_type = guardada
+        return HttpResponse(con_token(self.request, contenido), content_type=content_type)
+
+    def get(self, request, *args, **kwargs):
+        self.clave = self.clave_respuesta()
+        guardada = cache.get(self.clave) if self.clave else None
+        if guardada is not None:
+            return self.servir_guardada(guardada)
+        response = super().get(request, *args, **kwargs)
+        if self.clave and response.status_code == 200:
+            response.render()
+            self.guardar_respuesta(response)
+        return response
@@ -0,0 +1,159 @@
+# inmuebles/documentos.py
+# Documentos de cada inmueble: subida al almacén por contenido
+# (portada/almacen.py) y descarga con soporte de Range, o delegada en el
+# servidor web con X-Sendfile / X-Accel-Redirect (settings.DOCUMENTOS_ENVIO).
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header
+from django.views.generic import FormView
+
+from portada import previsualizacion
+from portada.models import Documento, Inmueble
+
+TROZO = 64 * 1024
+# lo único que se muestra en el navegador; el resto (HTML, SVG...) se descarga: lo sube cualquier usuario
+EN_LINEA = frozenset({'application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/webp'})
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def rango(cabecera, tamano):
+    """
+    (inicio, fin) inclusivos de una cabecera Range de un solo tramo. None si no
+    hay o no se entiende (se sirve entero, como permite la RFC 9110) y False si
+    el tramo cae fuera del fichero (416).
+    """
+    m = _RANGO.match(cabecera.strip()) if cabecera else None
+    if not m or m.groups() == ('', ''):
+        return None
+    desde, hasta = m.groups()
+    if desde == '':  # sufijo: los últimos N bytes
+        n = int(hasta)
+        return (max(tamano - n, 0), tamano - 1) if n and tamano else False
+    inicio = int(desde)
+    fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if hasta and int(hasta) < inicio:
+        return None
+    return (inicio, fin) if inicio < tamano else False
+
+
+def _trozos(ruta, inicio, longitud):
+    with open(ruta, 'rb') as f:
+        f.seek(inicio)
+        while longitud > 0:
+            trozo = f.read(min(TROZO, longitud))
+            if not trozo:
+                break
+            longitud -= len(trozo)
+            yield trozo
+
+
+def servir(request, storage, nombre, etag, descarga=None, adjunto=False, en_linea=EN_LINEA):
+    """
+    Respuesta para un fichero del almacén. El contenido de un nombre no cambia
+    nunca, así que el ETag es fuerte y vale para If-None-Match e If-Range.
+    Los tipos fuera de `en_linea` se sirven como application/octet-stream y
+    siempre como adjunto, y ninguno puede ejecutar scripts en el origen de la
+    aplicación (CSP sandbox).
+    """
+    ruta = storage.path(nombre)
+    if not os.path.exists(ruta):
+        raise Http404('El fichero no está en el almacén')
+    etag = f'"{etag}"'
+    if etag in [e.strip() for e in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    content_type = mimetypes.guess_type(descarga or nombre)[0]
+    if content_type not in en_linea:
+        content_type, adjunto = 'application/octet-stream', True
+    envio = getattr(settings, 'DOCUMENTOS_ENVIO', '')
+    if envio:
+        # el servidor web manda el fichero (y resuelve los Range); Django solo autoriza
+        response = HttpResponse(content_type=content_type)
+        if envio == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.DOCUMENTOS_ACCEL_PREFIJO.rstrip('/') + '/' + quote(nombre)
+        else:
+            response['X-Sendfile'] = ruta
+    else:
+        tamano = os.path.getsize(ruta)
+        si_rango = request.headers.get('If-Range')
+        tramo = rango(request.headers.get('Range'), tamano) if not si_rango or si_rango == etag else None
+        if tramo is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamano}'
+            return response
+        if tramo:
+            inicio, fin = tramo
+            response = StreamingHttpResponse(_trozos(ruta, inicio, fin - inicio + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+            response['Content-Length'] = fin - inicio + 1
+        else:
+            response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+    if descarga or adjunto:
+        response['Content-Disposition'] = content_disposition_header(adjunto, descarga) if descarga else 'attachment'
+    return response
+
+
+@login_required
+def descargar(request, pk):
+    doc = get_object_or_404(Documento, pk=pk)
+    if not doc.archivo:
+        raise Http404
+    nombre = doc.nombre_original or os.path.basename(doc.archivo.name)
+    return servir(request, doc.archivo.storage, doc.archivo.name, doc.digest, nombre,
+                  adjunto='descargar' in request.GET)
+
+
+@login_required
+def miniatura(request, pk):
+    doc = get_object_or_404(Documento, pk=pk)
+    if not doc.archivo:
+        raise Http404
+    # 404 hasta que la genere generar_previsualizaciones
+    return servir(request, doc.archivo.storage, previsualizacion.nombre(doc.digest), doc.digest)
+
+
+class DocumentoForm(forms.ModelForm):
+    class Meta:
+        model = Documento
+        fields = ['archivo', 'descripcion']
+
+
+class DocumentosView(LoginRequiredMixin, FormView):
+    """Documentos de un inmueble y subida de uno nuevo."""
+    template_name = 'inmuebles/documentos.html'
+    form_class = DocumentoForm
+
+    @cached_property
+    def inmueble(self):
+        return get_object_or_404(Inmueble, pk=self.kwargs['pk'])
+
+    def form_valid(self, form):
+        form.instance.inmueble = self.inmueble
+        form.save()
+        return redirect('inmuebles:documentos', pk=self.inmueble.pk)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        documentos = list(self.inmueble.documentos.order_by('-fecha_subida'))
+        for doc in documentos:
+            doc.con_miniatura = bool(doc.archivo) and previsualizacion.disponible(doc)
+        ctx.update(inmueble=self.inmueble, documentos=documentos)
+        return ctx
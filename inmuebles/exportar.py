@@ -0,0 +1,161 @@
+# inmuebles/exportar.py
+# Exportación en streaming (CSV / XLSX) de los listados: memoria constante
+# sea cual sea el nº de filas, se leen tuplas con values_list().iterator()
+import csv
+import datetime
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db import router
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+FORMULA = ('=', '+', '-', '@', '\t', '\r')  # un texto que empieza así Excel lo ejecuta como fórmula
+
+
+class _Buffer:
+    """Destino de escritura que solo acumula lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def recoger(self):
+        datos = b''.join(p if isinstance(p, bytes) else p.encode() for p in self.partes)
+        self.partes = []
+        return datos
+
+
+def _filas(qs, columnas):
+    campos = [c[1] for c in columnas]
+    formatos = [c[2] if len(c) > 2 else None for c in columnas]
+    for fila in qs.values_list(*campos).iterator(chunk_size=CHUNK_SIZE):
+        yield [f(v) if f else v for f, v in zip(formatos, fila)]
+
+
+def _texto_csv(valor):
+    # solo el texto escrito por usuarios: los números negativos siguen siendo números
+    if valor is None:
+        return ''
+    if isinstance(valor, str) and valor.startswith(FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(qs, columnas):
+    buffer = _Buffer()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')  # BOM para que Excel detecte UTF-8
+    writer.writerow([c[0] for c in columnas])
+    yield buffer.recoger()
+    for n, fila in enumerate(_filas(qs, columnas), 1):
+        writer.writerow([_texto_csv(v) for v in fila])
+        if n % 500 == 0:
+            yield buffer.recoger()
+    yield buffer.recoger()
+
+
+# --- XLSX mínimo escrito a mano: una hoja, cadenas en línea, sin estilos ---
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'officeDocument" Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+)
+
+
+def _celda(valor):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, bool):
+        valor = 'Sí' if valor else 'No'
+    elif isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    elif isinstance(valor, (datetime.date, datetime.datetime)):
+        valor = valor.isoformat()
+    return f'<c t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(v) for v in valores) + '</row>'
+
+
+def generar_xlsx(qs, columnas, hoja='Datos'):
+    buffer = _Buffer()
+    # sobre un destino sin seek zipfile escribe en streaming (data descriptors)
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(hoja=escape(hoja)))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja_xml.write(_fila_xml(c[0] for c in columnas).encode())
+            yield buffer.recoger()
+            for n, fila in enumerate(_filas(qs, columnas), 1):
+                hoja_xml.write(_fila_xml(fila).encode())
+                if n % 500 == 0:
+                    yield buffer.recoger()
+            hoja_xml.write(b'</sheetData></worksheet>')
+    yield buffer.recoger()
+
+
+FORMATOS = {
+    'csv': (generar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (generar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+class ExportarMixin:
+    """
+    Convierte un ListView en su exportación: reutiliza get_queryset() (los
+    mismos filtros GET) y responde en streaming. La vista define
+    columnas_export = [(cabecera, campo de values_list[, formateador])].
+    """
+    columnas_export = ()
+    nombre_export = 'export'
+
+    def get(self, request, *args, **kwargs):
+        formato = request.GET.get('formato', 'csv')
+        generador, content_type = FORMATOS.get(formato, FORMATOS['csv'])
+        qs = self.get_queryset()
+        # la BD se fija ahora: el streaming se consume ya fuera de la vista (y del middleware)
+        qs = qs.using(router.db_for_read(qs.model))
+        response = StreamingHttpResponse(generador(qs, self.columnas_export), content_type=content_type)
+        nombre = f"{self.nombre_export}_{timezone.localdate():%Y%m%d}.{'xlsx' if formato == 'xlsx' else 'csv'}"
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
@@ -0,0 +1,73 @@
+# inmuebles/liquidaciones.py
+# Liquidaciones mensuales de los propietarios (portada/liquidaciones.py):
+# resumen del mes por propietario y descarga de cada una en HTML o PDF.
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.files.storage import default_storage
+from django.db.models import Q, Sum
+from django.http import Http404, HttpResponse
+from django.views.generic import ListView
+
+from portada import almacen, liquidaciones
+from portada.models import Pago, Propietario
+from portada.rentas import limites_mes
+
+from .documentos import EN_LINEA, servir
+
+
+def periodo_de(texto):
+    if not texto:
+        return liquidaciones.mes_anterior()
+    try:
+        return datetime.datetime.strptime(texto, '%Y-%m').date()
+    except ValueError:
+        raise Http404('Mes no válido (AAAA-MM)')
+
+
+class LiquidacionList(LoginRequiredMixin, ListView):
+    template_name = 'liquidaciones/lista.html'
+    paginate_by = 50
+    context_object_name = 'propietarios'
+
+    def get_queryset(self):
+        self.periodo = periodo_de(self.request.GET.get('mes'))
+        qs = Propietario.objects.filter(inmuebles__isnull=False).distinct().order_by('nombre', 'id')
+        q = self.request.GET.get('q')
+        if q:
+            qs = qs.filter(Q(nombre__icontains=q) | Q(dni__icontains=q))
+        return qs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        # cifras solo de la página: las mismas cuatro consultas con 50 propietarios que con todos
+        datos = liquidaciones.calcular(self.periodo, [p.pk for p in ctx['propietarios']])
+        ctx['filas'] = [datos[p.pk] for p in ctx['propietarios'] if p.pk in datos]
+        inicio, fin = limites_mes(self.periodo)
+        ctx['cartera'] = Pago.objects.filter(fecha__range=(inicio, fin)).aggregate(
+            cobrado=Sum('total', filter=Q(quien_paga='inquilino', pagado=True)),
+            pendiente_cobro=Sum('total', filter=Q(quien_paga='inquilino', pagado=False)),
+            gastos=Sum('total', filter=Q(quien_paga='propietario', pagado=True)),
+        )
+        ctx.update(mes=f'{self.periodo:%Y-%m}', q=self.request.GET.get('q', ''))
+        return ctx
+
+
+@login_required
+def liquidacion(request, mes, pk):
+    formato = request.GET.get('formato', 'html')
+    if formato not in liquidaciones.FORMATOS:
+        raise Http404
+    datos = liquidaciones.calcular(periodo_de(mes), [pk]).get(pk)
+    if datos is None:
+        raise Http404
+    try:
+        nombre = liquidaciones.obtener(datos, formato)
+    except liquidaciones.NoDisponible as e:
+        return HttpResponse(f"PDF no disponible: {e}", status=501, content_type='text/plain; charset=utf-8')
+    # el nombre es la huella de los datos: vale como ETag
+    # la HTML la genera la aplicación, no un usuario: se puede ver en el navegador (sin scripts, por el sandbox)
+    return servir(request, default_storage, nombre, almacen.digest(nombre),
+                  liquidaciones.nombre_descarga(datos, formato), adjunto=formato == 'pdf',
+                  en_linea=EN_LINEA | {'text/html'})
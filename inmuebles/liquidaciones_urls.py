@@ -0,0 +1,9 @@
+from django.urls import path
+from . import liquidaciones
+
+app_name = 'liquidaciones'
+
+urlpatterns = [
+    path('', liquidaciones.LiquidacionList.as_view(), name='lista'),
+    path('<str:mes>/<int:pk>/', liquidaciones.liquidacion, name='liquidacion'),
+]
@@ -0,0 +1,64 @@
+# inmuebles/morosidad.py
+# Informe de deudores y alertas sobre la tabla materializada de morosidad
+# (portada/morosidad.py): por contrato, propietario o inquilino, por tramos de antigüedad.
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.views.generic import ListView
+
+from portada import morosidad
+
+AGRUPACIONES = {
+    'contrato': morosidad.por_contrato,
+    'propietario': morosidad.por_propietario,
+    'inquilino': morosidad.por_inquilino,
+}
+LIMITE_ALERTAS = 500
+
+
+class MorosidadList(LoginRequiredMixin, ListView):
+    template_name = 'pagos/morosidad.html'
+    paginate_by = 50
+    context_object_name = 'filas'
+
+    def get_queryset(self):
+        # sin recalcular: lo hace el cron diario (actualizar_morosidad), no la petición
+        self.al = morosidad.referencia()
+        self.agrupar = self.request.GET.get('agrupar')
+        if self.agrupar not in AGRUPACIONES:
+            self.agrupar = 'contrato'
+        return AGRUPACIONES[self.agrupar]()
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(
+            al=self.al, agrupar=self.agrupar, totales=morosidad.totales(),
+            alertas=morosidad.alertas()[:10],
+        )
+        return ctx
+
+
+def alertas(request):
+    """Contratos con deuda en un tramo por encima de ?minimo= (por defecto, cualquiera de más de 90 días)."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied  # 403 como el resto de la API
+    campo = request.GET.get('tramo', 'tramo_90')
+    try:
+        minimo = Decimal(request.GET.get('minimo', '0'))
+        filas = morosidad.alertas(minimo, campo)
+    except (InvalidOperation, ValueError):
+        return JsonResponse({'error': "Parámetros no válidos", 'tramos': morosidad.TRAMOS}, status=400)
+    # sin recalcular aquí: en producción se lee de la réplica (api:*) y lo rehace el cron diario
+    return JsonResponse({
+        'al': morosidad.referencia(),
+        'tramo': campo,
+        'resultados': [
+            {'contrato_id': m.contrato_id, 'inmueble_id': m.inmueble_id, 'inmueble': str(m.inmueble),
+             'propietario_id': m.propietario_id, 'propietario': m.propietario.nombre,
+             'importe': getattr(m, campo), 'total': m.total, 'pagos': m.num}
+            for m in filas[:LIMITE_ALERTAS]
+        ],
+    }, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
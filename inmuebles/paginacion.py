@@ -0,0 +1,178 @@
+# inmuebles/paginacion.py
+# Paginación para listados grandes: conteo cacheado y modo cursor (keyset)
+import base64
+import binascii
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from portada import versiones
+
+CONTEO_TTL = 300  # segundos que se reutiliza el COUNT(*) de un mismo filtro
+
+
+def conteo_cacheado(qs, ttl=CONTEO_TTL):
+    """COUNT(*) del queryset, cacheado por su SQL para que todas las páginas lo compartan."""
+    qs = qs.order_by()
+    sql, params = qs.query.sql_with_params()
+    # con la versión de las tablas que toca: cualquier alta o baja lo invalida
+    clave = versiones.clave('conteo', versiones.de_sql(sql), sql, repr(params))
+    n = cache.get(clave)
+    if n is None:
+        n = qs.count()
+        cache.set(clave, n, ttl)
+    return n
+
+
+def codificar_cursor(datos):
+    crudo = json.dumps(datos, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        datos = json.loads(crudo)
+    except (binascii.Error, ValueError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+class PaginadorConteoCacheado(Paginator):
+    """Paginator de Django con el total cacheado: las páginas profundas no repiten el COUNT."""
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return conteo_cacheado(self.object_list)
+        return super().count
+
+
+class PaginaCursor:
+    es_cursor = True
+    number = None
+
+    def __init__(self, object_list, paginator, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    """
+    Paginación keyset sobre (campo de orden, id): cada página es un
+    WHERE (campo, id) > (último valor) ... LIMIT n, sin OFFSET.
+    `orden` es el mismo string que acepta order_by, p. ej. '-fecha'.
+    """
+
+    def __init__(self, queryset, per_page, orden):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.orden = orden
+        self.desc = orden.startswith('-')
+        self.campo = orden.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.campo)
+
+    @cached_property
+    def count(self):
+        return conteo_cacheado(self.queryset)
+
+    @cached_property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    def _ordenacion(self, desc):
+        if self.field.null:
+            # nulos al principio en ascendente y al final en descendente (como SQLite)
+            campo = F(self.campo).desc(nulls_last=True) if desc else F(self.campo).asc(nulls_first=True)
+        else:
+            campo = f'-{self.campo}' if desc else self.campo
+        return [campo, '-id' if desc else 'id']
+
+    def _despues_de(self, valor, pk, desc):
+        c = self.campo
+        mayor = '__lt' if desc else '__gt'
+        if valor is None:
+            cond = Q(**{f'{c}__isnull': True, f'id{mayor}': pk})
+            return cond if desc else cond | Q(**{f'{c}__isnull': False})
+        cond = Q(**{f'{c}{mayor}': valor}) | Q(**{c: valor, f'id{mayor}': pk})
+        return cond | Q(**{f'{c}__isnull': True}) if (desc and self.field.null) else cond
+
+    def _clave(self, fila):
+        if isinstance(fila, dict):
+            return fila[self.campo], fila['id']
+        return getattr(fila, self.campo), fila.pk
+
+    def _token(self, fila, direccion):
+        valor, pk = self._clave(fila)
+        return codificar_cursor({'o': self.orden, 'v': valor, 'i': pk, 'd': direccion})
+
+    def pagina(self, token=None):
+        datos = decodificar_cursor(token) if token else None
+        if token and (datos is None or datos.get('o') != self.orden):
+            raise Http404('Cursor no válido')
+
+        atras = bool(datos) and datos.get('d') == 'p'
+        desc = self.desc != atras  # recorrer hacia atrás = invertir el orden
+        qs = self.queryset
+        if datos:
+            try:
+                valor = None if datos.get('v') is None else self.field.to_python(datos['v'])
+                pk = int(datos['i'])
+            except Exception:
+                raise Http404('Cursor no válido')
+            qs = qs.filter(self._despues_de(valor, pk, desc))
+        filas = list(qs.order_by(*self._ordenacion(desc))[:self.per_page + 1])
+        hay_mas = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+        if atras:
+            filas.reverse()
+            hay_siguiente, hay_anterior = True, hay_mas
+        else:
+            hay_siguiente, hay_anterior = hay_mas, bool(datos)
+
+        return PaginaCursor(
+            filas, self,
+            cursor_siguiente=self._token(filas[-1], 'n') if filas and hay_siguiente else None,
+            cursor_anterior=self._token(filas[0], 'p') if filas and hay_anterior else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Añade a un ListView el modo cursor: se activa con ?cursor= en la URL.
+    La vista debe dejar en self.orden_efectivo el orden aplicado en get_queryset.
+    """
+    paginator_class = PaginadorConteoCacheado
+    cursor_param = 'cursor'
+
+    def usa_cursor(self):
+        return self.cursor_param in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.usa_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = PaginadorCursor(queryset, page_size, self.orden_efectivo)
+        page = paginator.pagina(self.request.GET.get(self.cursor_param))
+        return paginator, page, page.object_list, page.has_other_pages()
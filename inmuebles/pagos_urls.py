@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import asincronas, morosidad, views
 
 app_name = 'pagos'
 
 urlpatterns = [
-    path('', views.PagoList.as_view(), name='lista'),
+    path('', (asincronas.PagoListAsync if settings.VISTAS_ASYNC else views.PagoList).as_view(), name='lista'),
+    path('exportar/', views.PagoExport.as_view(), name='exportar'),
+    path('acciones/', views.PagoAcciones.as_view(), name='acciones'),
+    path('morosidad/', morosidad.MorosidadList.as_view(), name='morosidad'),
     path('nuevo/', views.PagoCreate.as_view(), name='nuevo'),
     path('<int:pk>/editar/', views.PagoUpdate.as_view(), name='editar'),
     path('<int:pk>/borrar/', views.PagoDelete.as_view(), name='borrar'),
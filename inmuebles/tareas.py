@@ -0,0 +1,43 @@
+# inmuebles/tareas.py
+# Tareas de la cola (portada/tareas.py) de la interfaz: exportar un listado
+# entero a un fichero que se descarga al terminar, sin tener una petición
+# abierta mientras se escriben cientos de miles de filas.
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from portada.tareas import tarea
+
+from .exportar import FORMATOS
+from .paginacion import conteo_cacheado
+from .views import InmuebleExport, PagoExport
+
+LISTADOS = {'pagos': PagoExport, 'inmuebles': InmuebleExport}
+FILAS_POR_TROZO = 500  # los generadores de exportar.py entregan un trozo cada 500 filas
+
+
+@tarea('exportar', web=True, solo_staff=False, titulo='Exportar listado')
+def exportar(ctx, listado, query='', formato='csv'):
+    """Los mismos filtros que la vista de exportación, a partir de la query string del listado."""
+    vista = LISTADOS[listado]()
+    request = HttpRequest()
+    request.GET = QueryDict(query)
+    vista.setup(request)
+    qs = vista.get_queryset()
+    total = conteo_cacheado(qs)
+    formato = formato if formato in FORMATOS else 'csv'
+    generador = FORMATOS[formato][0]
+    nombre = f"{vista.nombre_export}_{timezone.localdate():%Y%m%d}.{formato}"
+
+    with tempfile.TemporaryFile() as temporal:
+        for n, trozo in enumerate(generador(qs, vista.columnas_export)):
+            temporal.write(trozo)
+            filas = min(n * FILAS_POR_TROZO, total)
+            ctx.progreso(filas, total, f'{filas} de {total} filas')
+        temporal.seek(0)
+        guardado = default_storage.save(ctx.fichero(nombre), File(temporal))
+    return {'fichero': guardado, 'nombre': os.path.basename(nombre), 'filas': total}
@@ -1,3 +1,785 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import itertools
+import re
+import tempfile
+import zipfile
+from unittest import mock
+
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from inmuebles import asincronas, autocompletar
+from inmuebles.cacheo import MARCA_CSRF, query_normalizada
+from inmuebles.paginacion import PaginadorCursor
+from inmuebles.views import InmuebleList, PagoList
+from portada import auditoria
+from portada.models import (Auditoria, Contrato, Documento, Inmueble, Inquilino, Morosidad, Pago, Propietario,
+                            TipoPago)
+from portada.tests import CACHE_COMPARTIDA, CACHE_LOCAL
+
+# filtros de cada listado con un valor representativo
+FILTROS_PAGOS = {
+    'q': 'ibi', 'inmueble_q': 'mayor', 'inmueble': '1', 'tipo': '1', 'pagado': 'no', 'quien': 'inquilino',
+    'desde': '2025-01-01', 'hasta': '2025-12-31',
+}
+ORDENES_PAGOS = ['-fecha', 'fecha', '-total', 'total']
+
+FILTROS_INMUEBLES = {
+    'q': 'mayor', 'prop': 'garcia', 'tipo': 'piso', 'planta': '1', 'alquilado': 'si',
+    'm2_min': '40', 'm2_max': '90', 'hab_min': '1', 'hab_max': '3',
+}
+ORDENES_INMUEBLES = ['direccion', '-direccion', 'metros', '-metros', 'habitaciones', '-habitaciones']
+
+# "SCAN tabla" sin índice = recorrido completo de la tabla (las FTS5 salen como VIRTUAL TABLE INDEX)
+SCAN_COMPLETO = re.compile(r'\bSCAN (\w+)(?! USING (COVERING )?INDEX| VIRTUAL TABLE INDEX)(\s|$)')
+
+
+def queryset_de(view_class, params):
+    request = RequestFactory().get('/', params)
+    request.user = get_user_model()(username='plan')
+    view = view_class()
+    view.setup(request)
+    return view, view.get_queryset()
+
+
+def combinaciones(filtros):
+    claves = list(filtros)
+    for n in range(len(claves) + 1):
+        for grupo in itertools.combinations(claves, n):
+            yield {k: filtros[k] for k in grupo}
+
+
+class PlanesConsultaTests(TestCase):
+    """EXPLAIN QUERY PLAN de cada combinación de filtros/orden: ninguna debe recorrer una tabla entera."""
+
+    def assertSinScanCompleto(self, qs, contexto):
+        plan = qs.explain()
+        scans = [m.group(1) for m in SCAN_COMPLETO.finditer(plan)]
+        self.assertFalse(scans, f"{contexto}: recorrido completo de {scans}\n{plan}")
+
+    def comprobar_listado(self, view_class, filtros, ordenes):
+        for params in combinaciones(filtros):
+            for orden in ordenes:
+                params = {**params, 'orden': orden}
+                with self.subTest(vista=view_class.__name__, **params):
+                    view, qs = queryset_de(view_class, params)
+                    self.assertSinScanCompleto(qs[:view.paginate_by], params)
+
+    def test_pagos(self):
+        self.comprobar_listado(PagoList, FILTROS_PAGOS, ORDENES_PAGOS)
+
+    def test_inmuebles(self):
+        self.comprobar_listado(InmuebleList, FILTROS_INMUEBLES, ORDENES_INMUEBLES)
+
+    def test_paginas_por_cursor(self):
+        casos = [(PagoList, o, datetime.date(2025, 1, 1) if 'fecha' in o else 10) for o in ORDENES_PAGOS]
+        casos += [(InmuebleList, o, {'direccion': 'C/ Mayor', 'metros': 50.0}.get(o.lstrip('-'), 2))
+                  for o in ORDENES_INMUEBLES]
+        for view_class, orden, valor in casos:
+            with self.subTest(vista=view_class.__name__, orden=orden):
+                view, qs = queryset_de(view_class, {'orden': orden})
+                paginador = PaginadorCursor(qs, view.paginate_by, orden)
+                siguiente = qs.filter(paginador._despues_de(valor, 100, paginador.desc))
+                self.assertSinScanCompleto(
+                    siguiente.order_by(*paginador._ordenacion(paginador.desc))[:view.paginate_by], orden
+                )
+
+    def test_autocompletar(self):
+        for fuente in ('inmueble', 'propietario'):  # TipoPago es un catálogo de pocas filas
+            filtrar = autocompletar.FUENTES[fuente][1]
+            for texto in ('', 'may'):
+                with self.subTest(fuente=fuente, texto=texto):
+                    self.assertSinScanCompleto(filtrar(texto)[:autocompletar.POR_PAGINA + 1], fuente)
+
+    def test_contrato_vigente(self):
+        # la búsqueda de PagoCreate.form_valid
+        hoy = datetime.date(2025, 6, 1)
+        qs = Contrato.objects.filter(inmueble=1, fecha_inicio__lte=hoy).filter(
+            Q(fecha_fin__gte=hoy) | Q(fecha_fin__isnull=True)
+        ).order_by('-fecha_inicio')[:1]
+        self.assertSinScanCompleto(qs, 'contrato vigente')
+
+    def test_contratos_solapados(self):
+        # la comprobación de Contrato.clean()
+        for fin in (datetime.date(2025, 12, 31), None):
+            contrato = Contrato(inmueble_id=1, fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=fin, pk=5)
+            self.assertSinScanCompleto(contrato.solapados()[:1], 'solapados')
+
+    def test_historial_auditoria(self):
+        pago = Pago(pk=5)
+        self.assertIn('auditoria_objeto_idx', auditoria.historial(pago)[:20].explain())
+        self.assertIn('auditoria_usuario_idx', auditoria.por_usuario(1)[:20].explain())
+
+
+class PaginacionCursorTests(TestCase):
+    """Recorrer un listado por cursor, hacia delante y hacia atrás, da las mismas filas que el orden completo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        # valores repetidos (desempata el id) y habitaciones nulas
+        Inmueble.objects.bulk_create([
+            Inmueble(tipo='piso', direccion=f'C/ Mayor {n % 4}', metros=40 + n % 3,
+                     habitaciones=None if n % 3 == 0 else n % 5, propietario=prop)
+            for n in range(17)
+        ])
+
+    def esperado(self, orden):
+        campo = orden.lstrip('-')
+
+        def clave(inmueble):
+            valor = getattr(inmueble, campo)
+            return valor is not None, valor or 0, inmueble.pk
+
+        filas = sorted(Inmueble.objects.all(), key=clave)
+        # como SQLite: nulos al principio en ascendente y al final en descendente
+        return [i.pk for i in (filas[::-1] if orden.startswith('-') else filas)]
+
+    def test_ida_y_vuelta_en_cada_orden(self):
+        for orden in ORDENES_INMUEBLES:
+            with self.subTest(orden=orden):
+                paginador = PaginadorCursor(Inmueble.objects.all(), 5, orden)
+                paginas, pagina = [], paginador.pagina()
+                self.assertFalse(pagina.has_previous())
+                while True:
+                    paginas.append([i.pk for i in pagina])
+                    if not pagina.has_next():
+                        break
+                    pagina = paginador.pagina(pagina.cursor_siguiente)
+                self.assertEqual([pk for p in paginas for pk in p], self.esperado(orden))
+                self.assertEqual(len(paginas), paginador.num_pages)
+                # y de vuelta desde la última con los cursores hacia atrás
+                for anterior in reversed(paginas[:-1]):
+                    pagina = paginador.pagina(pagina.cursor_anterior)
+                    self.assertEqual([i.pk for i in pagina], anterior)
+                self.assertFalse(pagina.has_previous())
+
+    def test_cursor_no_valido(self):
+        paginador = PaginadorCursor(Inmueble.objects.all(), 5, 'metros')
+        otro = PaginadorCursor(Inmueble.objects.all(), 5, '-metros').pagina().cursor_siguiente
+        for token in ('basura', otro):
+            with self.subTest(token=token), self.assertRaises(Http404):
+                paginador.pagina(token)
+
+
+class ExportarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.mayor = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        otro = Inmueble.objects.create(tipo='local', direccion='Plaza "Nueva" & 2', metros=80, propietario=prop)
+        renta = TipoPago.objects.create(nombre='Renta')
+        for n, inmueble in enumerate([cls.mayor, otro, otro]):
+            Pago.objects.create(inmueble=inmueble, tipo=renta, total=Decimal('100.5') + n, quien_paga='inquilino',
+                                fecha=datetime.date(2025, 1, 1 + n), pagado=n == 0, descripcion=f'Pago; {n}')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def descargar(self, url):
+        r = self.client.get(url)
+        self.assertTrue(r.streaming)
+        self.assertIn('attachment;', r['Content-Disposition'])
+        return r, b''.join(r.streaming_content)
+
+    def test_csv_con_los_filtros_del_listado(self):
+        r, contenido = self.descargar('/pagos/exportar/?formato=csv&orden=fecha')
+        self.assertTrue(r['Content-Type'].startswith('text/csv'))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual(filas[0], ['Fecha', 'Inmueble', 'Tipo', 'Descripción', 'Total', 'Quién paga', 'Pagado'])
+        self.assertEqual(filas[1], ['2025-01-01', 'C/ Mayor 1', 'Renta', 'Pago; 0', '100.50', 'Inquilino', 'Sí'])
+        self.assertEqual(len(filas), 4)
+        _, contenido = self.descargar('/inmuebles/exportar/?q=mayor')
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual([f[2] for f in filas[1:]], ['C/ Mayor 1'])
+        self.assertEqual(filas[1][6:8], ['', 'No'])  # sin habitaciones, sin contrato
+
+    def test_csv_sin_formulas(self):
+        Pago.objects.filter(inmueble=self.mayor).update(descripcion='=HYPERLINK("http://x")', total=Decimal('-5'))
+        _, contenido = self.descargar('/pagos/exportar/?formato=csv&orden=fecha')
+        fila = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig')), delimiter=';'))[1]
+        self.assertEqual((fila[3], fila[4]), ('\'=HYPERLINK("http://x")', '-5.00'))
+
+    def test_xlsx(self):
+        r, contenido = self.descargar('/inmuebles/exportar/?formato=xlsx&orden=metros')
+        self.assertTrue(r['Content-Disposition'].endswith('.xlsx"'))
+        with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+            self.assertIsNone(zf.testzip())
+            hoja = zf.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(hoja.count('<row>'), 3)
+        self.assertIn('<c t="inlineStr"><is><t>Plaza "Nueva" &amp; 2</t></is></c>', hoja)
+        self.assertIn('<c><v>80.0</v></c>', hoja)
+        self.assertLess(hoja.index('C/ Mayor 1'), hoja.index('Plaza'))
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA, AUDITORIA_INTERVALO=0)
+class CacheListadosTests(TestCase):
+    """La respuesta cacheada de un listado se invalida con cualquier cambio de los modelos que muestra."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        cls.tipo = TipoPago.objects.create(nombre='Renta')
+        cls.pago = Pago.objects.create(inmueble=cls.inmueble, tipo=cls.tipo, fecha=datetime.date(2025, 1, 1),
+                                       total=Decimal('500'), quien_paga='inquilino')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def get(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                respuesta = self.client.get(url)
+        return respuesta.content.decode(), len(ctx.captured_queries)
+
+    def test_segunda_peticion_sin_consultas_de_datos(self):
+        primero, n1 = self.get('/pagos/?orden=-fecha&q=')
+        segundo, n2 = self.get('/pagos/?q=&orden=-fecha')  # misma query normalizada
+        sin_token = re.compile(r'name="csrfmiddlewaretoken" value="[^"]+"')  # cambia en cada respuesta
+        self.assertEqual(sin_token.sub('', primero), sin_token.sub('', segundo))
+        self.assertEqual(n2, 2)  # sesión y usuario
+        self.assertLess(n2, n1)
+
+    def test_invalida_al_cambiar_pago(self):
+        self.assertIn('Pendiente', self.get('/pagos/')[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/pagos/{self.pago.pk}/toggle/')
+        html, _ = self.get('/pagos/')
+        self.assertNotIn('pill red', html)
+        self.assertIn('Pagado: 500,00', html.replace('.', ','))
+
+    def test_invalida_al_cambiar_modelos_relacionados(self):
+        self.get('/pagos/')
+        self.tipo.nombre = 'Alquiler'
+        self.tipo.save()
+        self.assertIn('Alquiler', self.get('/pagos/')[0])
+        self.inmueble.direccion = 'C/ Real 2'
+        self.inmueble.save()
+        self.assertIn('C/ Real 2', self.get('/pagos/')[0])
+        self.assertIn('C/ Real 2', self.get('/inmuebles/')[0])
+
+    def test_conteo_al_borrar(self):
+        Pago.objects.bulk_create([
+            Pago(inmueble=self.inmueble, tipo=self.tipo, fecha=datetime.date(2024, 1, n), total=1,
+                 quien_paga='inquilino') for n in range(1, 21)
+        ])
+        self.assertIn('Página 1 / 2', self.get('/pagos/?pagado=no')[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Pago.objects.filter(fecha=datetime.date(2024, 1, 1)).get().delete()
+        self.assertNotIn('Página 1 /', self.get('/pagos/?pagado=no')[0])
+
+    def test_por_usuario(self):
+        self.get('/pagos/')
+        otro = get_user_model().objects.create_user('otro', password='x')
+        self.client.force_login(otro)
+        self.client.get('/pagos/')
+        _, n = self.get('/pagos/')
+        self.assertEqual(n, 2)
+
+    def test_token_csrf_de_cada_peticion(self):
+        self.get('/pagos/')
+        otro = Client(enforce_csrf_checks=True)  # sin cookie CSRF y con otra sesión
+        otro.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = otro.get('/pagos/')
+        self.assertEqual(len(ctx.captured_queries), 2)  # servida de la caché
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', respuesta.content.decode())[1]
+        self.assertNotEqual(token, MARCA_CSRF)
+        self.assertIn('csrftoken', respuesta.cookies)
+        self.assertEqual(otro.post(f'/pagos/{self.pago.pk}/toggle/').status_code, 403)
+        self.assertEqual(otro.post(f'/pagos/{self.pago.pk}/toggle/', {'csrfmiddlewaretoken': token}).status_code, 302)
+
+    @override_settings(CACHES=CACHE_LOCAL)
+    def test_sin_cache_compartida_no_se_guardan(self):
+        self.get('/pagos/')
+        _, n = self.get('/pagos/')
+        self.assertGreater(n, 2)  # la página se vuelve a calcular
+
+    def test_query_normalizada(self):
+        from django.http import QueryDict
+        self.assertEqual(query_normalizada(QueryDict('b=2&a=1&c=')), 'a=1&b=2')
+        self.assertEqual(query_normalizada(QueryDict('a=1&page=3'), ignorar=('page',)), 'a=1')
+
+
+class AutocompletarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        cls.prop = Propietario.objects.create(nombre='Ana García', dni='12345678Z')
+        Inmueble.objects.bulk_create([
+            Inmueble(tipo='piso', direccion=f'C/ {"Mayor" if n % 2 else "Real"} {n}', metros=50, propietario=cls.prop)
+            for n in range(300)
+        ])
+        cls.tipo = TipoPago.objects.create(nombre='Renta')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_prefijo_y_paginas(self):
+        datos = self.client.get('/inmuebles/autocompletar/inmueble/', {'q': 'may'}).json()
+        self.assertEqual(len(datos['resultados']), autocompletar.POR_PAGINA)
+        self.assertTrue(datos['mas'])
+        self.assertTrue(all('Mayor' in r['texto'] for r in datos['resultados']))
+        ultima = self.client.get('/inmuebles/autocompletar/inmueble/', {'q': 'may', 'pagina': 8}).json()
+        self.assertEqual((len(ultima['resultados']), ultima['mas'], ultima['pagina']), (150 - 7 * 20, False, 8))
+        dni = self.client.get('/inmuebles/autocompletar/propietario/', {'q': '1234'}).json()
+        self.assertEqual(dni['resultados'], [{'id': self.prop.pk, 'texto': str(self.prop)}])
+        self.assertEqual(self.client.get('/inmuebles/autocompletar/otra/').status_code, 404)
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/inmuebles/autocompletar/inmueble/').status_code, 302)
+
+    def test_formularios_sin_opciones(self):
+        for url in ('/pagos/nuevo/', '/inmuebles/nuevo/'):
+            with self.subTest(url=url):
+                html = self.client.get(url).content.decode()
+                self.assertNotIn('C/ Mayor', html)
+                self.assertLess(len(html), 20000)
+
+    def test_misma_etiqueta(self):
+        # el id va en cada opción (data-id): el widget no busca el objeto por su texto
+        gemelos = Inmueble.objects.bulk_create([
+            Inmueble(tipo='local', direccion='Pza. Sol 1', metros=90, propietario=self.prop) for _ in range(2)
+        ])
+        datos = self.client.get('/inmuebles/autocompletar/inmueble/', {'q': 'sol'}).json()
+        self.assertEqual(datos['resultados'], [{'id': i.pk, 'texto': str(i)} for i in gemelos])
+        html = self.client.get('/pagos/nuevo/').content.decode()
+        self.assertIn('role="listbox"', html)
+        self.assertIn('dataset.id', html)
+        self.assertNotIn('datalist', html)
+
+    def test_alta_de_pago(self):
+        inmueble = Inmueble.objects.first()
+        html = self.client.get(f'/pagos/nuevo/?inmueble={inmueble.pk}').content.decode()
+        self.assertIn(f'value="{inmueble}"', html)
+        respuesta = self.client.post('/pagos/nuevo/', {
+            'inmueble': inmueble.pk, 'tipo': self.tipo.pk, 'fecha': '2025-01-01', 'total': '10',
+            'quien_paga': 'inquilino',
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertTrue(Pago.objects.filter(inmueble=inmueble, tipo=self.tipo).exists())
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA, AUDITORIA_INTERVALO=0)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        cls.tipo = TipoPago.objects.create(nombre='Renta')
+        Pago.objects.bulk_create([
+            Pago(inmueble=cls.inmueble, tipo=cls.tipo, fecha=datetime.date(2025, 1, n), total=n,
+                 pagado=n % 2 == 0, quien_paga='inquilino') for n in range(1, 31)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_campos_filtros_y_cursor(self):
+        datos = self.client.get('/api/pagos/', {'pagado': 'no', 'campos': 'id,total,inmueble_direccion',
+                                                'orden': 'total', 'limite': 10}).json()
+        self.assertEqual(set(datos['resultados'][0]), {'id', 'total', 'inmueble_direccion'})
+        self.assertEqual([r['total'] for r in datos['resultados']], [f'{n}.00' for n in range(1, 20, 2)])
+        resto = self.client.get('/api/pagos/', {'pagado': 'no', 'campos': 'total', 'orden': 'total', 'limite': 10,
+                                                'cursor': datos['siguiente']}).json()
+        self.assertEqual([r['total'] for r in resto['resultados']], [f'{n}.00' for n in range(21, 30, 2)])
+        self.assertIsNone(resto['siguiente'])
+
+    def test_campos_no_validos(self):
+        respuesta = self.client.get('/api/inmuebles/', {'campos': 'id,nada'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('nada', respuesta.json()['error'])
+
+    def test_304_sin_leer_filas(self):
+        respuesta = self.client.get('/api/pagos/', {'pagado': 'si'})
+        etag = respuesta['ETag']
+        self.assertNotIn('Last-Modified', respuesta)  # al segundo: no distingue dos cambios seguidos
+        with CaptureQueriesContext(connection) as ctx:
+            repetida = self.client.get('/api/pagos/', {'pagado': 'si'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repetida.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'portada_pago' in q['sql']])
+        # otra consulta, otro ETag
+        self.assertNotEqual(self.client.get('/api/pagos/', {'pagado': 'no'})['ETag'], etag)
+
+    def test_etag_cambia_con_los_datos(self):
+        etag = self.client.get('/api/pagos/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Pago.objects.filter(total=1).get().delete()
+        respuesta = self.client.get('/api/pagos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_etag_cambia_al_borrar_el_contrato(self):
+        contrato = Contrato.objects.create(inmueble=self.inmueble, propietario=self.inmueble.propietario,
+                                           fecha_inicio=datetime.date(2025, 1, 1), precio_mensual=Decimal('500'))
+        Pago.objects.filter(total=1).update(contrato=contrato)
+        etag = self.client.get('/api/pagos/', {'campos': 'id,contrato_id'})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            contrato.delete()  # SET_NULL en los pagos: ninguna señal de Pago
+        respuesta = self.client.get('/api/pagos/', {'campos': 'id,contrato_id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual({r['contrato_id'] for r in respuesta.json()['resultados']}, {None})
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/inmuebles/').status_code, 403)
+
+    @override_settings(CACHES=CACHE_LOCAL)
+    def test_sin_cache_compartida_no_hay_304(self):
+        respuesta = self.client.get('/api/pagos/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('ETag', respuesta)
+
+
+@override_settings(CACHES=CACHE_LOCAL)  # sin respuestas cacheadas: se compara lo que calcula cada vista
+class VistasAsyncTests(TestCase):
+    """Las vistas async muestran lo mismo que las síncronas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.inmuebles = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=40 + n,
+                                                 propietario=prop) for n in range(1, 20)]
+        tipo = TipoPago.objects.create(nombre='Renta')
+        Pago.objects.bulk_create([
+            Pago(inmueble=cls.inmuebles[n % 3], tipo=tipo, fecha=datetime.date(2025, 1 + n % 12, 1), total=n,
+                 pagado=n % 2 == 0, quien_paga='inquilino') for n in range(1, 46)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def respuesta(self, vista, params, usuario=None):
+        request = RequestFactory().get('/', params)
+        request.user = usuario or self.usuario
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        resultado = vista.as_view()(request)
+        if asyncio.iscoroutine(resultado):
+            async def esperar():
+                return await resultado
+            resultado = async_to_sync(esperar)()
+        return resultado
+
+    def resumen(self, respuesta):
+        ctx = respuesta.context_data
+        pagina = ctx['page_obj']
+        return ([o.pk for o in ctx['object_list']], pagina.number, pagina.has_next(),
+                {k: v for k, v in ctx.items() if k.startswith('total_') or k in ('TIPOS', 'qs_base', 'orden')})
+
+    def test_mismo_contexto(self):
+        casos = [
+            (PagoList, asincronas.PagoListAsync, {}),
+            (PagoList, asincronas.PagoListAsync, {'page': 2, 'pagado': 'no'}),
+            (PagoList, asincronas.PagoListAsync, {'q': 'renta', 'orden': 'total', 'cursor': ''}),
+            (InmuebleList, asincronas.InmuebleListAsync, {'page': 2}),
+            (InmuebleList, asincronas.InmuebleListAsync, {'page': 'last'}),
+            (InmuebleList, asincronas.InmuebleListAsync, {'orden': '-metros', 'cursor': ''}),
+        ]
+        for sincrona, asincrona, params in casos:
+            with self.subTest(vista=sincrona.__name__, params=params):
+                esperado = self.resumen(self.respuesta(sincrona, params))
+                self.assertEqual(self.resumen(self.respuesta(asincrona, params)), esperado)
+
+    def test_errores(self):
+        self.assertEqual(self.respuesta(asincronas.PagoListAsync, {}, AnonymousUser()).status_code, 302)
+        for pagina in (99, 0, -1, 'x'):
+            with self.subTest(pagina=pagina), self.assertRaises(Http404):
+                self.respuesta(asincronas.PagoListAsync, {'page': pagina})
+
+
+class DocumentosTests(TestCase):
+    CONTENIDO = bytes(range(256)) * 40  # 10240 bytes
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(f'/inmuebles/{self.inmueble.pk}/documentos/', {
+            'archivo': SimpleUploadedFile('Contrato 2025.pdf', self.CONTENIDO), 'descripcion': 'Contrato',
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.doc = Documento.objects.get()
+        self.url = f'/inmuebles/documentos/{self.doc.pk}/'
+
+    def test_descarga_completa_y_condicional(self):
+        respuesta = self.client.get(self.url + '?descargar')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.CONTENIDO)
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', respuesta['Content-Disposition'])
+        self.assertIn('Contrato 2025.pdf', respuesta['Content-Disposition'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertContains(self.client.get(f'/inmuebles/{self.inmueble.pk}/documentos/'), 'Contrato')
+
+    def test_solo_tipos_seguros_en_linea(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(respuesta['Content-Disposition'].startswith('inline'))
+        for nombre in ('pagina.html', 'dibujo.svg', 'sin_extension'):
+            with self.subTest(nombre=nombre):
+                self.client.post(f'/inmuebles/{self.inmueble.pk}/documentos/', {
+                    'archivo': SimpleUploadedFile(nombre, b'<script>alert(1)</script>' + nombre.encode()),
+                })
+                doc = Documento.objects.get(nombre_original=nombre)
+                respuesta = self.client.get(f'/inmuebles/documentos/{doc.pk}/')
+                self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+                self.assertTrue(respuesta['Content-Disposition'].startswith('attachment'))
+                self.assertEqual(respuesta['X-Content-Type-Options'], 'nosniff')
+                self.assertEqual(respuesta['Content-Security-Policy'], 'sandbox')
+
+    def test_rangos(self):
+        casos = {'bytes=0-99': (0, 99), 'bytes=10000-': (10000, 10239), 'bytes=-40': (10200, 10239),
+                 'bytes=10200-99999': (10200, 10239)}
+        for cabecera, (inicio, fin) in casos.items():
+            with self.subTest(cabecera=cabecera):
+                respuesta = self.client.get(self.url, HTTP_RANGE=cabecera)
+                self.assertEqual(respuesta.status_code, 206)
+                self.assertEqual(respuesta['Content-Range'], f'bytes {inicio}-{fin}/10240')
+                self.assertEqual(b''.join(respuesta.streaming_content), self.CONTENIDO[inicio:fin + 1])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=20000-').status_code, 416)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-9').status_code, 200)  # varios: entero
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otro"').status_code, 200)
+
+    def test_envio_delegado(self):
+        with self.settings(DOCUMENTOS_ENVIO='x-accel-redirect'):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['X-Accel-Redirect'], f'/protegido/{self.doc.archivo.name}')
+        self.assertEqual(respuesta.content, b'')
+        with self.settings(DOCUMENTOS_ENVIO='x-sendfile'):
+            self.assertEqual(self.client.get(self.url)['X-Sendfile'], self.doc.archivo.path)
+        self.assertEqual(self.client.get(self.url + 'miniatura/').status_code, 404)  # aún sin generar
+
+
+class LiquidacionesVistasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        cls.prop = Propietario.objects.create(nombre='Ana', dni='12345678Z')
+        inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=cls.prop)
+        renta = TipoPago.objects.create(nombre='Renta', quien_por_defecto='inquilino')
+        Pago.objects.create(inmueble=inmueble, tipo=renta, fecha=datetime.date(2025, 3, 1), total=Decimal('700'),
+                            pagado=True, quien_paga='inquilino')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.usuario)
+
+    def test_lista_y_descarga(self):
+        self.assertContains(self.client.get('/liquidaciones/?mes=2025-03'), '700,00')
+        url = f'/liquidaciones/2025-03/{self.prop.pk}/'
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'Liquidaci', b''.join(respuesta.streaming_content))
+        self.assertIn('liquidacion_2025-03_12345678Z.html', respuesta['Content-Disposition'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'/liquidaciones/2025-13/{self.prop.pk}/').status_code, 404)
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA)
+class OcupacionVistasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        Contrato.objects.create(inmueble=inmueble, propietario=prop, fecha_inicio=datetime.date(2025, 1, 1),
+                                precio_mensual=Decimal('700'))
+
+    def test_panel_y_json(self):
+        url = '/api/ocupacion/?desde=2025-01&hasta=2025-02'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(url)
+        datos = respuesta.json()
+        self.assertEqual(datos['meses'], ['2025-01', '2025-02'])
+        self.assertEqual(datos['cartera']['ocupacion'], [1.0, 1.0])
+        self.assertNotIn('propietarios', datos)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/ocupacion/?desde=2025-03&hasta=2025-01').status_code, 400)
+        self.assertContains(self.client.get('/inmuebles/ocupacion/?desde=2025-01&hasta=2025-02'), '700,00')
+
+    def test_etag_del_rango_por_defecto_cambia_de_mes(self):
+        self.client.force_login(self.usuario)
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2025, 3, 31)):
+            etag = self.client.get('/api/ocupacion/')['ETag']
+            self.assertEqual(self.client.get('/api/ocupacion/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2025, 4, 1)):
+            respuesta = self.client.get('/api/ocupacion/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['meses'][-1], '2025-04')
+
+
+class MorosidadVistasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        contrato = Contrato.objects.create(inmueble=inmueble, propietario=prop, fecha_inicio=datetime.date(2020, 1, 1),
+                                           precio_mensual=Decimal('700'))
+        contrato.inquilinos.add(Inquilino.objects.create(nombre='Luis', dni='2'))
+        renta = TipoPago.objects.create(nombre='Renta', quien_por_defecto='inquilino')
+        Pago.objects.create(inmueble=inmueble, contrato=contrato, tipo=renta, total=Decimal('700'),
+                            fecha=datetime.date(2020, 2, 1), quien_paga='inquilino')
+
+    def test_informe_y_alertas(self):
+        self.client.force_login(self.usuario)
+        for agrupar, texto in [('contrato', 'Luis'), ('propietario', 'Ana'), ('inquilino', 'Luis')]:
+            self.assertContains(self.client.get(f'/pagos/morosidad/?agrupar={agrupar}'), texto)
+        alertas = self.client.get('/api/morosidad/alertas/?minimo=100').json()
+        self.assertEqual([(a['propietario'], a['importe']) for a in alertas['resultados']], [('Ana', '700.00')])
+        self.assertEqual(self.client.get('/api/morosidad/alertas/?tramo=x').status_code, 400)
+
+    def test_el_informe_no_recalcula(self):
+        self.client.force_login(self.usuario)
+        Morosidad.objects.update(al=datetime.date(2025, 1, 31))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertContains(self.client.get('/pagos/morosidad/'), 'Morosidad a 31/01/2025')
+        self.assertFalse([q for q in consultas if q['sql'].startswith(('DELETE', 'INSERT'))])
+        Morosidad.objects.all().delete()
+        self.assertContains(self.client.get('/pagos/morosidad/'), 'Morosidad</h2>')
+
+
+class PagoAccionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        cls.renta = TipoPago.objects.create(nombre='Renta')
+        cls.pagos = [Pago.objects.create(inmueble=inmueble, tipo=cls.renta, total=Decimal('700'), quien_paga='inquilino',
+                                         fecha=datetime.date(2025, mes, 1)) for mes in (1, 2, 3)]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_marcados_y_filtro(self):
+        ids = [str(p.pk) for p in self.pagos[:2]]
+        r = self.client.post('/pagos/acciones/', {'accion': 'pagado', 'seleccion': ids, 'query': 'pagado=si'},
+                             follow=True)
+        self.assertEqual(r.redirect_chain, [('/pagos/?pagado=si', 302)])
+        self.assertContains(r, '2 de 2 pagos actualizados')
+        self.assertEqual(Pago.objects.filter(pagado=True).count(), 2)
+
+        # todos los del filtro, con el total que se mostró
+        datos = {'accion': 'quien', 'quien': 'propietario', 'todos': '1', 'query': 'pagado=si'}
+        self.client.post('/pagos/acciones/', dict(datos, esperado_total='1400.00'))
+        self.assertEqual(Pago.objects.filter(quien_paga='propietario').count(), 2)
+        r = self.client.post('/pagos/acciones/', dict(datos, accion='borrar', esperado_total='700.00'), follow=True)
+        self.assertContains(r, 'han cambiado')
+        self.assertEqual(Pago.objects.count(), 3)
+        self.client.post('/pagos/acciones/', dict(datos, accion='borrar', esperado_total='1400.00'))
+        self.assertEqual(list(Pago.objects.values_list('pk', flat=True)), [self.pagos[2].pk])
+
+    def test_lista_con_acciones(self):
+        r = self.client.get('/pagos/?pagado=no')
+        self.assertContains(r, 'name="seleccion"', count=3)
+        self.assertContains(r, 'name="esperado_total" value="2100')
+        r = self.client.post('/pagos/acciones/', {'accion': 'pagado'}, follow=True)
+        self.assertContains(r, 'No hay pagos marcados')
+
+
+@override_settings(AUDITORIA_INTERVALO=0)
+class FragmentosPagosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('u', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        inmueble = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=prop)
+        renta = TipoPago.objects.create(nombre='Renta')
+        cls.pagos = [Pago.objects.create(inmueble=inmueble, tipo=renta, total=Decimal(100 * mes), quien_paga='inquilino',
+                                         fecha=datetime.date(2025, mes, 1)) for mes in (1, 2, 3)]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def toggle(self, pago, query, **totales):
+        return self.client.post(f'/pagos/{pago.pk}/toggle/', {'query': query, 'fragmento': '1', **totales}).json()
+
+    def test_filtro_solo_resultados(self):
+        completa = self.client.get('/pagos/?pagado=no')
+        trozo = self.client.get('/pagos/?pagado=no&fragmento=1')
+        self.assertNotContains(trozo, '<html')
+        self.assertNotContains(trozo, 'name="inmueble_q"')
+        self.assertContains(trozo, 'name="seleccion"', count=3)
+        self.assertContains(trozo, 'formato=csv')  # los enlaces no arrastran el parámetro
+        self.assertNotContains(trozo, 'fragmento')
+        self.assertLess(len(trozo.content) * 2, len(completa.content))
+
+    def test_toggle_fila_y_totales_por_diferencia(self):
+        datos = {'total_listado': '600', 'total_pagado': '0', 'total_pendiente': '600'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.toggle(self.pagos[0], '', **datos)
+        self.assertFalse([c for c in ctx if 'SUM(' in c['sql']])  # sin volver a agregar
+        self.assertIn('Marcar pendiente', res['fila'])
+        self.assertIn('Pagado: 100,00', res['totales'])
+        self.assertIn('Pendiente: 500,00', res['totales'])
+        # con ?pagado=no el pago sale del filtro: se resta del total listado
+        res = self.toggle(self.pagos[1], 'pagado=no', **datos)
+        self.assertIn('Ya no cumple el filtro', res['fila'])
+        self.assertIn('Total listado: 400,00', res['totales'])
+        self.assertIn('Pendiente: 400,00', res['totales'])
+        self.assertIn('value="400.00"', res['totales'])  # esperado_total de las acciones masivas
+        # sin los totales de la página se calculan
+        res = self.toggle(self.pagos[2], 'pagado=si')
+        self.assertIn('Total listado: 600,00', res['totales'])
+
+    def test_toggle_dos_veces_fuera_del_filtro(self):
+        datos = {'total_listado': '600', 'total_pagado': '0', 'total_pendiente': '600'}
+        res = self.toggle(self.pagos[0], 'pagado=no', **datos)
+        self.assertIn('Total listado: 500,00', res['totales'])
+        # la fila sigue en la página: al desmarcarla vuelve a cumplir el filtro
+        datos = {'total_listado': '500', 'total_pagado': '0', 'total_pendiente': '500'}
+        res = self.toggle(self.pagos[0], 'pagado=no', **datos)
+        self.assertNotIn('Ya no cumple el filtro', res['fila'])
+        self.assertIn('Total listado: 600,00', res['totales'])
+        self.assertIn('Pagado: 0,00', res['totales'])
+        self.assertIn('Pendiente: 600,00', res['totales'])
+
+    def test_toggle_auditado_con_el_usuario(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toggle(self.pagos[0], '')
+        cambio = auditoria.historial(self.pagos[0]).get()
+        self.assertEqual((cambio.accion, cambio.cambios), (Auditoria.CAMBIO, {'pagado': [False, True]}))
+        self.assertEqual((cambio.usuario, cambio.usuario_nombre), (self.usuario, 'u'))
+
+    def test_toggle_sin_js_vuelve_al_filtro(self):
+        r = self.client.post(f'/pagos/{self.pagos[0].pk}/toggle/', {'query': 'pagado=no'})
+        self.assertRedirects(r, '/pagos/?pagado=no')
 
-# Create your tests here.
@@ -1,11 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import analitica, asincronas, documentos, views
+from .autocompletar import AutocompletarView
 
 app_name = "inmuebles"
 
 urlpatterns = [
-    path("", views.InmuebleList.as_view(), name="lista"),
+    path("", (asincronas.InmuebleListAsync if settings.VISTAS_ASYNC else views.InmuebleList).as_view(), name="lista"),
+    path("exportar/", views.InmuebleExport.as_view(), name="exportar"),
+    path("importar/", views.ImportarView.as_view(), name="importar"),
+    path("ocupacion/", analitica.panel, name="ocupacion"),
+    path("autocompletar/<str:fuente>/", AutocompletarView.as_view(), name="autocompletar"),
     path("nuevo/", views.InmuebleCreate.as_view(), name="nuevo"),
     path("<int:pk>/editar/", views.InmuebleUpdate.as_view(), name="editar"),
     path("<int:pk>/borrar/", views.InmuebleDelete.as_view(), name="borrar"),
+    path("<int:pk>/documentos/", documentos.DocumentosView.as_view(), name="documentos"),
+    path("documentos/<int:pk>/", documentos.descargar, name="documento"),
+    path("documentos/<int:pk>/miniatura/", documentos.miniatura, name="miniatura"),
 ]
@@ -1,32 +1,40 @@
 # inmuebles/views.py
-from django.contrib.auth.mixins import LoginRequiredMixin
+import io
+from decimal import Decimal
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, FormView
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from django import forms
+from django.contrib import messages
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
 from django.shortcuts import redirect, get_object_or_404
-from django.views import View
 from django.urls import reverse
-from django.db.models import Exists, OuterRef, Q, Sum
-from portada.models import Inmueble, Contrato, Pago, TipoPago  # usamos los modelos de 'portada'
+from django.http import JsonResponse, QueryDict
+from django.template.loader import render_to_string
+from portada.models import Inmueble, Pago, TipoPago  # usamos los modelos de 'portada'
+from portada import acciones, busqueda, importacion, ocupacion, resumen, tareas, versiones
+from .autocompletar import Autocompletar
+from .cacheo import RespuestaCacheadaMixin
+from .exportar import ExportarMixin
+from .paginacion import CursorPaginationMixin
 
-class InmuebleList(LoginRequiredMixin, ListView):
+FRAGMENTO = 'fragmento'  # parámetro de las peticiones del JS que solo quieren un trozo de la página
+
+class InmuebleList(LoginRequiredMixin, RespuestaCacheadaMixin, CursorPaginationMixin, ListView):
     model = Inmueble
     template_name = 'inmuebles/lista.html'
     paginate_by = 15
     ordering = ['direccion']
+    modelos_cache = ('inmueble', 'propietario')
 
     # filtros ampliados: búsqueda, atributos, estado de alquiler
     def get_queryset(self):
-        today = timezone.localdate()
-        subq = Contrato.objects.filter(
-            inmueble=OuterRef('pk'),
-            fecha_inicio__lte=today
-        ).filter(Q(fecha_fin__gte=today) | Q(fecha_fin__isnull=True))
-
-        qs = Inmueble.objects.select_related('propietario').annotate(
-            alquilado=Exists(subq)
-        )
+        # 'alquilado' sale del puntero contrato_vigente (portada/ocupacion.py)
+        qs = Inmueble.objects.select_related('propietario')
 
         GET = self.request.GET
         q       = GET.get('q')
@@ -40,15 +48,15 @@ class InmuebleList(LoginRequiredMixin, ListView):
         alquilado_filtro = GET.get('alquilado')
         orden   = GET.get('orden')
 
-        if q: qs = qs.filter(direccion__icontains=q)
+        if q: qs = qs.filter(busqueda.q_busqueda('inmueble', q))
         if tipo: qs = qs.filter(tipo=tipo)
-        if prop: qs = qs.filter(propietario__nombre__icontains=prop)
+        if prop: qs = qs.filter(busqueda.q_busqueda('propietario', prop, 'propietario', ['nombre']))
         if planta: qs = qs.filter(planta=planta)
 
         if alquilado_filtro == 'si':
-            qs = qs.filter(alquilado=True)
+            qs = qs.filter(contrato_vigente__isnull=False)
         elif alquilado_filtro == 'no':
-            qs = qs.filter(alquilado=False)
+            qs = qs.filter(contrato_vigente__isnull=True)
 
         def to_float(v):
             try: return float(v)
@@ -65,16 +73,25 @@ class InmuebleList(LoginRequiredMixin, ListView):
         if hab_min_v is not None: qs = qs.filter(habitaciones__gte=hab_min_v)
         if hab_max_v is not None: qs = qs.filter(habitaciones__lte=hab_max_v)
 
-        if orden in ('direccion','-direccion','metros','-metros','habitaciones','-habitaciones'):
-            qs = qs.order_by(orden)
-        else:
-            qs = qs.order_by(*self.ordering)
-        return qs
+        if orden not in ('direccion','-direccion','metros','-metros','habitaciones','-habitaciones'):
+            orden = self.ordering[0]
+        self.orden_efectivo = orden
+        return qs.order_by(orden, '-id' if orden.startswith('-') else 'id')
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        ctx.update(self.contexto_filtros())
+        for consulta in self.consultas_contexto():
+            ctx.update(consulta())
+        return ctx
+
+    def consultas_contexto(self):
+        # consultas del contexto independientes de la página (las vistas async las lanzan a la vez)
+        return []
+
+    def contexto_filtros(self):
         GET = self.request.GET
-        ctx.update({
+        return {
             'q': GET.get('q',''),
             'tipo': GET.get('tipo',''),
             'prop': GET.get('prop',''),
@@ -86,19 +103,42 @@ class InmuebleList(LoginRequiredMixin, ListView):
             'alquilado': GET.get('alquilado',''),
             'orden': GET.get('orden','-direccion'),
             'TIPO_CHOICES': Inmueble.TIPO_CHOICES,
-            'qs_base': '&'.join(f'{k}={v}' for k,v in GET.items() if k!='page' and v!=''),
-        })
-        return ctx
+            'qs_base': '&'.join(f'{k}={v}' for k,v in GET.items() if k not in ('page','cursor',FRAGMENTO) and v!=''),
+        }
+
+def si_no(valor):
+    return 'Sí' if valor else 'No'
+
+class InmuebleExport(ExportarMixin, InmuebleList):
+    nombre_export = 'inmuebles'
+    columnas_export = [
+        ('ID', 'id'),
+        ('Tipo', 'tipo', dict(Inmueble.TIPO_CHOICES).get),
+        ('Dirección', 'direccion'),
+        ('Planta', 'planta'),
+        ('Puerta', 'puerta'),
+        ('m²', 'metros'),
+        ('Hab.', 'habitaciones'),
+        ('Alquilado', 'contrato_vigente_id', si_no),
+        ('Propietario', 'propietario__nombre'),
+        ('DNI propietario', 'propietario__dni'),
+    ]
+
+class InmuebleForm(forms.ModelForm):
+    class Meta:
+        model = Inmueble
+        fields = ['tipo','direccion','planta','puerta','metros','habitaciones','propietario']
+        widgets = {'propietario': Autocompletar('propietario')}
 
 class InmuebleCreate(LoginRequiredMixin, CreateView):
     model = Inmueble
-    fields = ['tipo','direccion','planta','puerta','metros','habitaciones','propietario']
+    form_class = InmuebleForm
     template_name = 'inmuebles/form.html'
     success_url = reverse_lazy('inmuebles:lista')
 
 class InmuebleUpdate(LoginRequiredMixin, UpdateView):
     model = Inmueble
-    fields = ['tipo','direccion','planta','puerta','metros','habitaciones','propietario']
+    form_class = InmuebleForm
     template_name = 'inmuebles/form.html'
     success_url = reverse_lazy('inmuebles:lista')
 
@@ -107,21 +147,76 @@ class InmuebleDelete(LoginRequiredMixin, DeleteView):
     template_name = 'inmuebles/confirm_borrar.html'
     success_url = reverse_lazy('inmuebles:lista')
 
+class ImportarForm(forms.Form):
+    tipo = forms.ChoiceField(choices=[(t, t.capitalize()) for t in importacion.IMPORTADORES])
+    archivo = forms.FileField(help_text="CSV con cabecera, separado por comas o punto y coma, en UTF-8.")
+    dry_run = forms.BooleanField(required=False, label="Solo validar (no guardar)")
+    segundo_plano = forms.BooleanField(required=False, label="En segundo plano",
+                                       help_text="Para ficheros grandes: el resultado se ve en Tareas.")
+
+class ImportarView(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    form_class = ImportarForm
+    template_name = 'inmuebles/importar.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form):
+        if form.cleaned_data['segundo_plano']:
+            # el trabajador lee el fichero del storage; la tarea lo borra al terminar bien
+            fichero = default_storage.save('tareas/entrada/importacion.csv', form.cleaned_data['archivo'])
+            tareas.encolar('importar_csv', {'tipo': form.cleaned_data['tipo'], 'fichero': fichero,
+                                            'dry_run': form.cleaned_data['dry_run']}, self.request.user)
+            return redirect('portada:tareas')
+        archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+        try:
+            resultado = importacion.importar(form.cleaned_data['tipo'], archivo,
+                                             dry_run=form.cleaned_data['dry_run'])
+        except UnicodeDecodeError:
+            form.add_error('archivo', "El fichero no está en UTF-8.")
+            return self.form_invalid(form)
+        except ValidationError as e:
+            form.add_error('archivo', e)
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(
+            form=form, resultado=resultado, errores=resultado['errores'][:500]
+        ))
+
 # ----- GESTIÓN DE PAGOS -----
 class PagoForm(forms.ModelForm):
     class Meta:
         model = Pago
         fields = ['inmueble', 'tipo', 'fecha', 'descripcion', 'total', 'pagado', 'quien_paga']
+        widgets = {
+            'inmueble': Autocompletar('inmueble'),
+            'tipo': Autocompletar('tipopago'),
+        }
 
-class PagoList(LoginRequiredMixin, ListView):
+def tipos_activos():
+    return versiones.cacheado(
+        'tipos_activos', ['tipopago'], lambda: list(TipoPago.objects.filter(activo=True).order_by('nombre'))
+    )
+
+class PagoList(LoginRequiredMixin, RespuestaCacheadaMixin, CursorPaginationMixin, ListView):
     model = Pago
     template_name = 'pagos/lista.html'
     paginate_by = 20
     ordering = ['-fecha']
+    modelos_cache = ('pago', 'inmueble', 'tipopago')
+    template_fragmento = 'pagos/fragmentos/resultados.html'
+
+    def filtros(self):
+        return self.request.GET
+
+    def get_template_names(self):
+        # ?fragmento=1: solo totales y tabla, para cambiar el filtro sin recargar la página
+        if self.request.GET.get(FRAGMENTO):
+            return [self.template_fragmento]
+        return super().get_template_names()
 
     def get_queryset(self):
         qs = Pago.objects.select_related('inmueble', 'tipo')
-        GET = self.request.GET
+        GET = self.filtros()
         q = GET.get('q')
         inmueble_id = GET.get('inmueble')
         inmueble_q = GET.get('inmueble_q')
@@ -133,14 +228,14 @@ class PagoList(LoginRequiredMixin, ListView):
         orden = GET.get('orden')
 
         if q:
-            qs = qs.filter(descripcion__icontains=q)
+            qs = qs.filter(busqueda.q_busqueda('pago', q))
         if inmueble_id:
             try:
                 qs = qs.filter(inmueble_id=int(inmueble_id))
             except:
                 pass
         if inmueble_q:
-            qs = qs.filter(inmueble__direccion__icontains=inmueble_q)
+            qs = qs.filter(busqueda.q_busqueda('inmueble', inmueble_q, 'inmueble'))
         if tipo:
             try:
                 qs = qs.filter(tipo_id=int(tipo))
@@ -157,20 +252,59 @@ class PagoList(LoginRequiredMixin, ListView):
         if hasta:
             qs = qs.filter(fecha__lte=hasta)
 
-        if orden in ('fecha','-fecha','total','-total'):
-            qs = qs.order_by(orden)
-        else:
-            qs = qs.order_by(*self.ordering)
-        return qs
+        if orden not in ('fecha','-fecha','total','-total'):
+            orden = self.ordering[0]
+        self.orden_efectivo = orden
+        return qs.order_by(orden, '-id' if orden.startswith('-') else 'id')
+
+    def get_dims_resumen(self):
+        # filtros que se pueden resolver sobre ResumenPago (sin texto y con meses
+        # completos); None si hay que agregar sobre los pagos
+        GET = self.filtros()
+        if GET.get('q') or GET.get('inmueble_q'):
+            return None
+        dims = {}
+        try:
+            if GET.get('inmueble'):
+                dims['inmueble_id'] = int(GET['inmueble'])
+            if GET.get('tipo'):
+                dims['tipo_id'] = int(GET['tipo'])
+            desde = parse_date(GET['desde']) if GET.get('desde') else None
+            hasta = parse_date(GET['hasta']) if GET.get('hasta') else None
+        except ValueError:
+            return None
+        if GET.get('pagado') in ('si', 'no'):
+            dims['pagado'] = GET['pagado'] == 'si'
+        if GET.get('quien') in ('inquilino', 'propietario'):
+            dims['quien_paga'] = GET['quien']
+        if GET.get('desde'):
+            if not desde or desde.day != 1:
+                return None
+            dims['mes__gte'] = desde
+        if GET.get('hasta'):
+            if not hasta or (hasta + timedelta(days=1)).day != 1:
+                return None
+            dims['mes__lte'] = hasta.replace(day=1)
+        return dims
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        GET = self.request.GET
-        qs = ctx['object_list']
-        totales = qs.aggregate(total=Sum('total'))
-        total_pagado = qs.filter(pagado=True).aggregate(total=Sum('total'))['total'] or 0
-        total_pendiente = qs.filter(pagado=False).aggregate(total=Sum('total'))['total'] or 0
-        ctx.update({
+        ctx.update(self.contexto_filtros())
+        for consulta in self.consultas_contexto():
+            ctx.update(consulta())
+        return ctx
+
+    def consultas_contexto(self):
+        # consultas del contexto independientes de la página (las vistas async las lanzan a la vez)
+        return [self.totales, lambda: {'TIPOS': tipos_activos()}]
+
+    def totales(self):
+        dims = self.get_dims_resumen()
+        return resumen.totales(self.object_list if dims is None else None, dims)
+
+    def contexto_filtros(self):
+        GET = self.filtros()
+        return {
             'q': GET.get('q',''),
             'inmueble': GET.get('inmueble',''),
             'inmueble_q': GET.get('inmueble_q',''),
@@ -180,14 +314,23 @@ class PagoList(LoginRequiredMixin, ListView):
             'desde': GET.get('desde',''),
             'hasta': GET.get('hasta',''),
             'orden': GET.get('orden','-fecha'),
-            'TIPOS': TipoPago.objects.filter(activo=True).order_by('nombre'),
+            'version_filtros': versiones.versiones('tipopago'),
             'QUIEN_CHOICES': Pago.QUIEN_CHOICES,
-            'total_listado': totales['total'] or 0,
-            'total_pagado': total_pagado,
-            'total_pendiente': total_pendiente,
-            'qs_base': '&'.join(f'{k}={v}' for k,v in GET.items() if k!='page' and v!=''),
-        })
-        return ctx
+            'ACCIONES': acciones.ACCIONES,
+            'qs_base': '&'.join(f'{k}={v}' for k,v in GET.items() if k not in ('page','cursor',FRAGMENTO) and v!=''),
+        }
+
+class PagoExport(ExportarMixin, PagoList):
+    nombre_export = 'pagos'
+    columnas_export = [
+        ('Fecha', 'fecha'),
+        ('Inmueble', 'inmueble__direccion'),
+        ('Tipo', 'tipo__nombre'),
+        ('Descripción', 'descripcion'),
+        ('Total', 'total'),
+        ('Quién paga', 'quien_paga', dict(Pago.QUIEN_CHOICES).get),
+        ('Pagado', 'pagado', si_no),
+    ]
 
 class PagoCreate(LoginRequiredMixin, CreateView):
     model = Pago
@@ -218,10 +361,7 @@ class PagoCreate(LoginRequiredMixin, CreateView):
         # autoasociar contrato activo
         inmueble = form.cleaned_data.get('inmueble')
         fecha = form.cleaned_data.get('fecha') or timezone.localdate()
-        contrato_activo = Contrato.objects.filter(
-            inmueble=inmueble,
-            fecha_inicio__lte=fecha
-        ).filter(Q(fecha_fin__gte=fecha) | Q(fecha_fin__isnull=True)).order_by('-fecha_inicio').first()
+        contrato_activo = ocupacion.contrato_para(inmueble, fecha)
         if contrato_activo:
             form.instance.contrato = contrato_activo
         return super().form_valid(form)
@@ -237,10 +377,80 @@ class PagoDelete(LoginRequiredMixin, DeleteView):
     template_name = 'pagos/confirm_borrar.html'
     success_url = reverse_lazy('pagos:lista')
 
-class PagoTogglePagado(LoginRequiredMixin, View):
+class PagoPostMixin:
+    """Formularios POST del listado de pagos: traen su filtro en `query` y vuelven a él."""
+    http_method_names = ['post']
+
+    def filtros(self):
+        return QueryDict(self.request.POST.get('query', ''))
+
+    def volver(self):
+        query = self.request.POST.get('query', '')
+        return redirect(reverse('pagos:lista') + (f'?{query}' if query else ''))
+
+class PagoTogglePagado(PagoPostMixin, PagoList):
     def post(self, request, pk):
-        pago = get_object_or_404(Pago, pk=pk)
+        pago = get_object_or_404(Pago.objects.select_related('inmueble', 'tipo'), pk=pk)
+        fragmento = request.POST.get(FRAGMENTO)
+        antes = fragmento and self.en_filtro(pago)
         pago.pagado = not pago.pagado
         pago.save(update_fields=['pagado'])
-        next_url = request.POST.get('next') or reverse('pagos:lista')
-        return redirect(next_url)
+        if not fragmento:
+            return self.volver()
+        # con JS: solo la fila y los totales, sin volver a pintar ni a agregar el listado
+        despues = self.en_filtro(pago)
+        contexto = {**self.contexto_filtros(), **self.totales_tras(pago, antes, despues), 'p': pago,
+                    'fuera': not despues}
+        return JsonResponse({
+            'fila': render_to_string('pagos/fragmentos/fila.html', contexto, request),
+            'totales': render_to_string('pagos/fragmentos/totales.html', contexto, request),
+        })
+
+    def en_filtro(self, pago):
+        return self.get_queryset().filter(pk=pago.pk).exists()
+
+    def totales_tras(self, pago, antes, despues):
+        # los totales que mostraba la página (los manda el JS) más lo que mueve este pago: sale de
+        # los totales si cumplía el filtro y vuelve a entrar, con el estado nuevo, si lo cumple ahora
+        try:
+            totales = {k: Decimal(self.request.POST[k]) for k in resumen.SUMAS}
+        except (KeyError, ArithmeticError):
+            self.object_list = self.get_queryset()
+            return self.totales()
+        for cuenta, signo, pagado in ((antes, -1, not pago.pagado), (despues, 1, pago.pagado)):
+            if cuenta:
+                totales['total_listado'] += signo * pago.total
+                totales['total_pagado' if pagado else 'total_pendiente'] += signo * pago.total
+        return totales
+
+class PagoAcciones(PagoPostMixin, PagoList):
+    """Acciones masivas del listado de pagos sobre los marcados o sobre todo el filtro (portada/acciones.py)."""
+
+    def post(self, request):
+        POST = request.POST
+        esperado = {}
+        if POST.get('todos'):
+            qs = self.get_queryset()
+            try:
+                esperado['total'] = Decimal(POST.get('esperado_total', ''))
+            except ArithmeticError:
+                pass
+        else:
+            ids = {int(i) for i in POST.getlist('seleccion') if i.isdigit()}
+            qs = Pago.objects.filter(pk__in=ids)
+            esperado['num'] = len(ids)
+        accion = POST.get('accion')
+        valor = POST.get('tipo') if accion == 'tipo' else POST.get('quien')
+        if not POST.get('todos') and not esperado['num']:
+            messages.error(request, "No hay pagos marcados.")
+        else:
+            try:
+                res = acciones.aplicar(qs, accion, valor, **esperado)
+            except acciones.Conflicto as e:
+                messages.error(request, f"{e} Revisa el listado y vuelve a intentarlo.")
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                hecho = 'borrados' if accion == 'borrar' else 'actualizados'
+                messages.success(request, f"{res['cambiados']} de {res['seleccionados']} pagos {hecho}.")
+        return self.volver()
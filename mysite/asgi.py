@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+os.environ.setdefault('DJANGO_VISTAS_ASYNC', '1')  # settings.VISTAS_ASYNC
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,11 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'portada.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portada.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -118,6 +121,66 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Documentos subidos (portada/almacen.py). No se publican como estáticos: se
+# descargan por la vista, que comprueba la sesión y admite Range.
+MEDIA_ROOT = BASE_DIR / 'media'
+# '' sirve el fichero Django; 'x-sendfile' (Apache mod_xsendfile, lighttpd) o
+# 'x-accel-redirect' (nginx) delegan el envío en el servidor web, que también
+# atiende los Range. Para nginx, DOCUMENTOS_ACCEL_PREFIJO es una location
+# `internal` con alias a MEDIA_ROOT.
+DOCUMENTOS_ENVIO = ''
+DOCUMENTOS_ACCEL_PREFIJO = '/protegido/'
+
+# Caché de conteos, listados y selects (portada/versiones.py). Las versiones que
+# invalidan lo cacheado se suben en el proceso que guarda, así que con varios
+# procesos tiene que ser compartida (settings_produccion usa la BD o Redis). Con
+# esta, local, no se cachean respuestas enteras ni se responde 304 en la API.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Métricas por petición (portada.middleware.MetricasMiddleware)
+# Las consultas más lentas que este umbral se guardan como muestra con sus parámetros.
+METRICAS_CONSULTA_LENTA_MS = 100
+# Token para que Prometheus lea /metricas/ sin sesión de staff (vacío = desactivado).
+METRICAS_TOKEN = ''
+# Fichero donde se escribe una línea JSON por petición (vacío = no se escribe).
+METRICAS_LOG = os.environ.get('DJANGO_METRICAS_LOG', '')
+
+# Listados y portada en versión async (inmuebles/asincronas.py): consultas
+# independientes de cada página a la vez. mysite/asgi.py lo activa al servir por ASGI.
+VISTAS_ASYNC = os.environ.get('DJANGO_VISTAS_ASYNC') == '1'
+
+# Auditoría de cambios (portada/auditoria.py): segundos entre volcados del búfer
+# al registro. Con 0 se escribe al confirmar cada cambio, sin hilo aparte.
+AUDITORIA_INTERVALO = float(os.environ.get('DJANGO_AUDITORIA_INTERVALO', 2))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'linea': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'metricas': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': METRICAS_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'linea',
+        } if METRICAS_LOG else {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'portada.metricas': {'handlers': ['metricas'], 'level': 'INFO' if METRICAS_LOG else 'WARNING',
+                             'propagate': False},
+    },
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,116 @@
+"""
+Perfil de producción: DJANGO_SETTINGS_MODULE=mysite.settings_produccion
+
+Parte de mysite.settings y cambia lo que depende del despliegue.
+DJANGO_SECRET_KEY es obligatoria. La BD se elige con variables de entorno:
+
+- SQLite (por defecto): BD_NOMBRE es el fichero; se abre en modo WAL con
+  busy_timeout y mmap/cache ampliados. Con BD_REPLICA=<fichero> se añade la
+  BD 'replica', una copia de solo lectura que mantiene `manage.py
+  refrescar_replica --intervalo N`.
+- PostgreSQL: BD_MOTOR=postgresql, BD_NOMBRE, BD_USUARIO, BD_CLAVE, BD_HOST,
+  BD_PUERTO; con BD_REPLICA=<host> la réplica de streaming. Requiere psycopg.
+
+Los listados, exportaciones, informes, la API y los changelists del admin
+leen de la réplica (REPLICA_VISTAS, portada/replica.py).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+DEBUG = os.environ.get('DJANGO_DEBUG') == '1'
+# sin valor por defecto: la clave de mysite.settings está en el repositorio
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Falta la variable de entorno DJANGO_SECRET_KEY.")
+ALLOWED_HOSTS = [h for h in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if h]
+
+# --- Base de datos ---
+CONN_MAX_AGE = int(os.environ.get('BD_CONN_MAX_AGE', 600))
+
+PRAGMAS_SQLITE = [
+    'PRAGMA journal_mode=WAL',      # lectores y un escritor a la vez
+    'PRAGMA synchronous=NORMAL',    # seguro con WAL y mucho más rápido que FULL
+    'PRAGMA busy_timeout=5000',     # esperar al escritor en vez de "database is locked"
+    'PRAGMA mmap_size=268435456',   # 256 MB leídos por mmap
+    'PRAGMA cache_size=-65536',     # 64 MB de caché de páginas por conexión
+    'PRAGMA temp_store=MEMORY',
+]
+PRAGMAS_REPLICA = [
+    'PRAGMA query_only=ON',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def _sqlite(nombre, pragmas, **opciones):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': nombre,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': {'init_command': ';'.join(pragmas), 'timeout': 5, **opciones},
+    }
+
+
+def _postgresql(host):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('BD_NOMBRE', 'gestor'),
+        'USER': os.environ.get('BD_USUARIO', ''),
+        'PASSWORD': os.environ.get('BD_CLAVE', ''),
+        'HOST': host,
+        'PORT': os.environ.get('BD_PUERTO', ''),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+
+if os.environ.get('BD_MOTOR') == 'postgresql':
+    DATABASES = {'default': _postgresql(os.environ.get('BD_HOST', ''))}
+    if os.environ.get('BD_REPLICA'):
+        DATABASES['replica'] = _postgresql(os.environ['BD_REPLICA'])
+else:
+    # IMMEDIATE: las transacciones toman el bloqueo de escritura al empezar y
+    # esperan con busy_timeout, en vez de fallar al intentar subir de lectura a escritura
+    DATABASES = {'default': _sqlite(os.environ.get('BD_NOMBRE', BASE_DIR / 'db.sqlite3'), PRAGMAS_SQLITE,
+                                    transaction_mode='IMMEDIATE')}
+    if os.environ.get('BD_REPLICA'):
+        DATABASES['replica'] = _sqlite(os.environ['BD_REPLICA'], PRAGMAS_REPLICA)
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['portada.replica.RouterReplica']
+    MIDDLEWARE = MIDDLEWARE + ['portada.middleware.ReplicaMiddleware']
+
+# vistas (patrones de view_name) cuyas lecturas van a la réplica
+REPLICA_VISTAS = [
+    'inmuebles:lista', 'inmuebles:exportar', 'inmuebles:autocompletar', 'inmuebles:ocupacion',
+    'pagos:lista', 'pagos:exportar',
+    'liquidaciones:*',
+    'api:*',
+    'admin:*_changelist',
+]
+# segundos que quien ha escrito sigue leyendo de la principal (>= intervalo de refresco)
+REPLICA_RETRASO_MAX = int(os.environ.get('REPLICA_RETRASO_MAX', 120))
+
+# --- Caché (portada/versiones.py) ---
+# Tiene que ser la misma para todos los procesos: las versiones que invalidan lo
+# cacheado las suben también el trabajador de tareas y los comandos. Con
+# CACHE_REDIS=redis://host:6379/1 va a Redis (requiere redis-py); si no, a la
+# tabla cache_django de la BD ('manage.py createcachetable' al desplegar).
+if os.environ.get('CACHE_REDIS'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                          'LOCATION': os.environ['CACHE_REDIS']}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache_django',
+                          'OPTIONS': {'MAX_ENTRIES': 50000}}}
+
+# --- Documentos ---
+MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', BASE_DIR / 'media')
+# el servidor web envía los ficheros (ver settings.DOCUMENTOS_ENVIO)
+DOCUMENTOS_ENVIO = os.environ.get('DOCUMENTOS_ENVIO', '')
+DOCUMENTOS_ACCEL_PREFIJO = os.environ.get('DOCUMENTOS_ACCEL_PREFIJO', '/protegido/')
@@ -7,6 +7,8 @@ urlpatterns = [
     path('', include('portada.urls')),
     path('inmuebles/', include('inmuebles.urls')),
     path('pagos/', include('inmuebles.pagos_urls')),
+    path('liquidaciones/', include('inmuebles.liquidaciones_urls')),
+    path('api/', include('inmuebles.api_urls')),
     path('accounts/', include('django.contrib.auth.urls')),  # login
     path('accounts/login/',  auth_views.LoginView.as_view(),  name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
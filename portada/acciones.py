@@ -0,0 +1,116 @@
+# portada/acciones.py
+# Acciones masivas sobre pagos (marcar pagados o pendientes, cambiar el tipo o
+# quién paga, borrar): un único UPDATE o DELETE sobre la selección, sea una
+# lista de ids o todos los pagos de un filtro.
+#
+# update() no lanza señales y el borrado se hace con los receptores de
+# signals.py silenciados: el resumen, la morosidad y las versiones se ajustan
+# aquí, agrupados, con las filas leídas antes de escribir (una consulta). Control optimista: la selección tiene que seguir
+# siendo la que vio el usuario (mismo nº de pagos o mismo importe total) y el
+# UPDATE lleva la condición de que las filas sigan sin el valor nuevo; si
+# cuenta otro nº de filas que las leídas, se deshace todo y se lanza Conflicto.
+# Las mismas filas dan la auditoría de cada pago, sin volver a leerlos.
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import auditoria, morosidad, resumen, signals, versiones
+from .models import Auditoria, Pago, TipoPago
+
+LOTE_BORRADO = 500  # ids por DELETE, lejos del límite de variables de SQLite
+
+ACCIONES = {
+    # acción -> (etiqueta, campo que cambia)
+    'pagado': ('Marcar pagados', 'pagado'),
+    'pendiente': ('Marcar pendientes', 'pagado'),
+    'tipo': ('Cambiar tipo', 'tipo_id'),
+    'quien': ('Cambiar quién paga', 'quien_paga'),
+    'borrar': ('Borrar', None),
+}
+
+
+class Conflicto(Exception):
+    """Los pagos han cambiado desde que se mostraron: no se ha tocado nada."""
+
+
+def _valor(accion, valor):
+    if accion == 'pagado':
+        return True
+    if accion == 'pendiente':
+        return False
+    if accion == 'tipo':
+        if not str(valor).isdigit() or not TipoPago.objects.filter(pk=int(valor)).exists():
+            raise ValueError("Tipo de pago desconocido.")
+        return int(valor)
+    if accion == 'quien':
+        if valor not in dict(Pago.QUIEN_CHOICES):
+            raise ValueError("Valor de «quién paga» no válido.")
+        return valor
+    return None
+
+
+def _borrar(ids):
+    """
+    QuerySet.delete() por lotes con los receptores de signals.py silenciados:
+    lo que harían pago a pago se hace en aplicar(), agrupado. Las relaciones
+    y cualquier otro receptor se atienden como en un borrado normal.
+    """
+    borrados = 0
+    with signals.silenciar(Pago):
+        for n in range(0, len(ids), LOTE_BORRADO):
+            _, por_modelo = Pago.objects.filter(pk__in=ids[n:n + LOTE_BORRADO]).delete()
+            borrados += por_modelo.get(Pago._meta.label, 0)
+    return borrados
+
+
+def _auditoria(afectadas, nuevas, campo):
+    usuario = auditoria.usuario_actual()
+    if not nuevas:
+        return [auditoria.fila(Pago, f['id'], Auditoria.BAJA, auditoria.diferencias(Pago, f, None), usuario)
+                for f in afectadas]
+    return [auditoria.fila(Pago, f['id'], Auditoria.CAMBIO, auditoria.diferencias(Pago, f, n, {campo}), usuario)
+            for f, n in zip(afectadas, nuevas)]
+
+
+def aplicar(qs, accion, valor=None, num=None, total=None):
+    """
+    Aplica `accion` a los pagos de `qs`. `num` y `total`, si se dan, son el nº
+    de pagos y el importe que se mostraron al usuario. Devuelve
+    {'seleccionados', 'cambiados'}.
+    """
+    if accion not in ACCIONES:
+        raise ValueError(f"Acción desconocida: {accion}")
+    campo = ACCIONES[accion][1]
+    valor = _valor(accion, valor)
+    qs = qs.select_related(None).order_by()
+
+    with transaction.atomic():
+        filas = list(qs.values('id', *auditoria.campos(Pago)))
+        if num is not None and len(filas) != num:
+            raise Conflicto(f"Se esperaban {num} pagos y hay {len(filas)}.")
+        if total is not None and sum(resumen.importe(f['total']) for f in filas) != resumen.importe(total):
+            raise Conflicto("Los importes de los pagos seleccionados han cambiado.")
+
+        if campo is None:
+            afectadas, nuevas = filas, []
+            cambiadas = _borrar([f['id'] for f in filas])
+        else:
+            afectadas = [f for f in filas if f[campo] != valor]
+            nuevas = [dict(f, **{campo: valor}) for f in afectadas]
+            cambiadas = qs.exclude(**{campo: valor}).update(**{campo: valor}) if afectadas else 0
+        if cambiadas != len(afectadas):
+            raise Conflicto("Otro usuario ha modificado algunos de los pagos.")
+
+        sumas = defaultdict(lambda: [0, 0])
+        for signo, lista in ((-1, afectadas), (1, nuevas)):
+            for f in lista:
+                dims = tuple(resumen.clave(f).items())
+                sumas[dims][0] += signo * f['total']
+                sumas[dims][1] += signo
+        resumen.sumar_lote(sumas)
+        if campo != 'tipo_id':  # el tipo no cuenta para la morosidad
+            morosidad.lote(nuevas, quitar=afectadas)
+        if afectadas:
+            versiones.invalidar('pago')
+            auditoria.anotar(_auditoria(afectadas, nuevas, campo))
+    return {'seleccionados': len(filas), 'cambiados': len(afectadas)}
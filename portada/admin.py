@@ -1,7 +1,9 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Inmueble, Propietario, Inquilino, Contrato, Pago, TipoPago
+from django.db.models import Count, Q
+from .models import Auditoria, Inmueble, Propietario, Inquilino, Contrato, Pago, Tarea, TipoPago
+from . import busqueda
 
 #admin.site.register(Inmueble)
 #admin.site.register(Propietario)
@@ -11,6 +13,25 @@ from .models import Inmueble, Propietario, Inquilino, Contrato, Pago, TipoPago
 
 #Editamos menu admin
 
+class BusquedaFTSMixin:
+    # la caja de búsqueda usa los índices FTS de portada.busqueda en vez de icontains;
+    # busquedas_fts = [(índice, ruta, columnas)], search_fields queda como respaldo
+    busquedas_fts = ()
+
+    def q_busqueda_extra(self, search_term):
+        return None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not busqueda.expresion(search_term) or not self.busquedas_fts:
+            return super().get_search_results(request, queryset, search_term)
+        q = Q()
+        for indice, ruta, columnas in self.busquedas_fts:
+            q |= busqueda.q_busqueda(indice, search_term, ruta, columnas)
+        extra = self.q_busqueda_extra(search_term)
+        if extra is not None:
+            q |= extra
+        return queryset.filter(q), False
+
 class InmuebleInline(admin.TabularInline):  # usa StackedInline si prefieres en bloques
     model = Inmueble
     extra = 0
@@ -19,27 +40,35 @@ class InmuebleInline(admin.TabularInline):  # usa StackedInline si prefieres en
 
 # --- Admin de Propietario con el inline ---
 @admin.register(Propietario)
-class PropietarioAdmin(admin.ModelAdmin):
+class PropietarioAdmin(BusquedaFTSMixin, admin.ModelAdmin):
     inlines = [InmuebleInline]
     list_display = ('nombre', 'dni', 'num_inmuebles')
     search_fields = ('nombre', 'dni', 'email', 'telefono')
+    busquedas_fts = [('propietario', '', None)]
+
+    def get_queryset(self, request):
+        # el nº de inmuebles en la misma consulta, no un COUNT por fila
+        return super().get_queryset(request).annotate(_num_inmuebles=Count('inmuebles'))
 
     def num_inmuebles(self, obj):
-        return obj.inmuebles.count()
+        return obj.num_inmuebles()
     num_inmuebles.short_description = "Nº inmuebles"
+    num_inmuebles.admin_order_field = '_num_inmuebles'
 
 # --- Admin de Inmueble (mejoras útiles) ---
 @admin.register(Inmueble)
-class InmuebleAdmin(admin.ModelAdmin):
+class InmuebleAdmin(BusquedaFTSMixin, admin.ModelAdmin):
     list_display = ('direccion', 'tipo', 'propietario', 'metros', 'habitaciones')
     list_filter = ('tipo',)
     search_fields = ('direccion', 'propietario__nombre', 'propietario__dni')
+    busquedas_fts = [('inmueble', '', None), ('propietario', 'propietario', ['nombre', 'dni'])]
     autocomplete_fields = ('propietario',)  # autocompletado si hay muchos propietarios
 
 # --- Resto de modelos ---
 @admin.register(Inquilino)
 class InquilinoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'dni', 'telefono', 'email', 'inmueble')
+    list_select_related = ('inmueble',)  # FK nullable: el admin no lo une por su cuenta
     search_fields = ('nombre', 'dni', 'email', 'telefono', 'inmueble__direccion')
     list_filter = ('inmueble__tipo',)
 
@@ -47,6 +76,9 @@ class InquilinoAdmin(admin.ModelAdmin):
 class ContratoAdmin(admin.ModelAdmin):
     list_display = ('id', 'get_inquilinos','get_propietario', 'inmueble')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('inmueble__propietario').prefetch_related('inquilinos')
+
     def get_inquilinos(self, obj):
         return ", ".join([i.nombre for i in obj.inquilinos.all()])
     get_inquilinos.short_description = "Inquilinos"
@@ -62,7 +94,39 @@ class TipoPagoAdmin(admin.ModelAdmin):
     search_fields = ('nombre', 'descripcion')
 
 @admin.register(Pago)
-class PagoAdmin(admin.ModelAdmin):
+class PagoAdmin(BusquedaFTSMixin, admin.ModelAdmin):
     list_display = ('fecha', 'tipo', 'inmueble', 'total', 'pagado', 'quien_paga')
     list_filter = ('pagado', 'tipo', 'quien_paga', 'fecha')
-    search_fields = ('descripcion', 'inmueble__direccion', 'tipo__nombre')
\ No newline at end of file
+    search_fields = ('descripcion', 'inmueble__direccion', 'tipo__nombre')
+    busquedas_fts = [('pago', '', None), ('inmueble', 'inmueble', None)]
+
+    def q_busqueda_extra(self, search_term):
+        # TipoPago es una tabla pequeña: basta con icontains sobre ella
+        return Q(tipo__in=TipoPago.objects.filter(nombre__icontains=search_term.strip()).values('pk'))
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'progreso', 'intentos', 'creada_por', 'creada_en', 'terminada_en')
+    list_filter = ('estado', 'tipo')
+    list_select_related = ('creada_por',)
+    readonly_fields = ('trabajador', 'latido', 'empezada_en', 'terminada_en', 'error', 'resultado')
+
+
+@admin.register(Auditoria)
+class AuditoriaAdmin(admin.ModelAdmin):
+    # solo lectura: el registro lo escribe portada/auditoria.py
+    list_display = ('en', 'modelo', 'objeto_id', 'accion', 'usuario_nombre')
+    list_filter = ('modelo', 'accion')
+    search_fields = ('=objeto_id', 'usuario_nombre')
+    date_hierarchy = 'en'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,74 @@
+# portada/almacen.py
+# Almacén de documentos direccionado por contenido: cada fichero se guarda con
+# el SHA-256 de sus bytes como nombre ('documentos/ab/ab12…ef.pdf'). El mismo
+# PDF subido para diez inmuebles ocupa disco una sola vez; los Documento que
+# lo comparten apuntan al mismo nombre.
+#
+# Al borrar un Documento no se borra su fichero (como con cualquier FileField):
+# otros pueden estar usándolo.
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+TROZO = 1024 * 1024  # se lee, resume y escribe de MB en MB: nunca el fichero entero en memoria
+_NOMBRE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def digest(nombre):
+    """SHA-256 de un fichero guardado en el almacén, sacado de su nombre."""
+    return os.path.splitext(posixpath.basename(nombre))[0]
+
+
+def direccionado(nombre):
+    """Si el nombre ya es el del contenido (las subidas anteriores al almacén no lo son)."""
+    return bool(_NOMBRE.match(digest(nombre)))
+
+
+class AlmacenContenido(FileSystemStorage):
+    """
+    FileSystemStorage cuyo nombre final lo decide el contenido. La subida se
+    copia por trozos a un temporal del mismo directorio calculando el hash a la
+    vez; si ese contenido ya estaba se descarta la copia, y si no se renombra
+    (atómico) a su nombre definitivo.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name  # nada de sufijos '_abc123': dos nombres iguales son el mismo contenido
+
+    def _save(self, name, content):
+        directorio = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()[:10]
+        os.makedirs(self.path(directorio), exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=self.path(directorio), prefix='.subida-')
+        try:
+            h = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as destino:
+                for trozo in content.chunks(TROZO):
+                    h.update(trozo)
+                    destino.write(trozo)
+            resumen = h.hexdigest()
+            final = posixpath.join(directorio, resumen[:2], resumen + extension)
+            ruta = self.path(final)
+            if os.path.exists(ruta):
+                os.remove(temporal)  # contenido repetido
+            else:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                os.chmod(temporal, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+                os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return final
+
+
+_documentos = AlmacenContenido()
+
+
+def de_documentos():
+    # callable para FileField(storage=...): la migración guarda la referencia, no la instancia
+    return _documentos
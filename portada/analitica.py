@@ -0,0 +1,177 @@
+# portada/analitica.py
+# Ocupación, días vacíos y renta media por mes, de toda la cartera, por tipo de
+# inmueble y por propietario, a lo largo de varios años.
+#
+# En vez de preguntar a la BD por cada mes qué contratos estaban vigentes, se
+# cargan los intervalos de todos los contratos con una consulta y se barren:
+# cada contrato suma su peso (1 día, o su precio por día) a los meses que
+# cubre enteros con dos eventos en un array de diferencias por mes, y se
+# corrigen los dos meses de los extremos con lo que no cubre. Una suma
+# acumulada da la serie entera. Con numpy se hace de golpe para todos los
+# contratos y grupos; sin él, el mismo barrido en Python.
+#
+# Se supone que los inmuebles existen durante todo el periodo (no hay fecha
+# de alta): los meses anteriores a su primer contrato cuentan como vacíos.
+import bisect
+import datetime
+
+from django.db.models import Q
+
+from . import versiones
+from .models import Contrato, Inmueble, Propietario
+
+try:
+    import numpy as np
+except ImportError:  # opcional: el barrido en Python da lo mismo, más despacio
+    np = None
+
+MODELOS = ['contrato', 'inmueble', 'propietario']
+
+
+def meses(desde, hasta):
+    """Primeros de mes de `desde` a `hasta`, ambos incluidos, y el siguiente a `hasta` como tope."""
+    actual, lista = desde.replace(day=1), []
+    while actual <= hasta:
+        lista.append(actual)
+        actual = (actual + datetime.timedelta(days=32)).replace(day=1)
+    return lista + [actual]
+
+
+def intervalos(inicio, fin):
+    """
+    (inmueble_id, desde, hasta, precio) de los contratos que tocan [inicio, fin),
+    en días desde `inicio` con `hasta` exclusivo. Dos contratos solapados del
+    mismo inmueble no cuentan dos veces: el posterior empieza donde acaba el otro.
+    """
+    contratos = (
+        Contrato.objects.filter(fecha_inicio__lt=fin).filter(Q(fecha_fin__gte=inicio) | Q(fecha_fin__isnull=True))
+        .order_by('inmueble_id', 'fecha_inicio', 'id')
+        .values_list('inmueble_id', 'fecha_inicio', 'fecha_fin', 'precio_mensual')
+    )
+    total = (fin - inicio).days
+    resultado, anterior, cubierto = [], None, 0
+    for inmueble_id, desde, hasta, precio in contratos.iterator(chunk_size=5000):
+        d = max((desde - inicio).days, 0)
+        h = min((hasta - inicio).days + 1, total) if hasta else total
+        if inmueble_id != anterior:
+            anterior, cubierto = inmueble_id, 0
+        d = max(d, cubierto)
+        if h > d:
+            resultado.append((inmueble_id, d, h, float(precio)))
+            cubierto = h
+    return resultado
+
+
+def _barrido_numpy(grupos, desde, hasta, pesos, cortes, num_grupos):
+    # grupos: (num_intervalos, k) con el índice de cada grupo al que suma el intervalo
+    cortes = np.asarray(cortes)
+    largo = np.diff(cortes).astype(float)
+    m = len(largo)
+    desde, hasta = np.asarray(desde), np.asarray(hasta)
+    primero = np.searchsorted(cortes, desde, 'right') - 1
+    ultimo = np.searchsorted(cortes, hasta - 1, 'right') - 1
+    series = []
+    for peso in pesos:
+        peso = np.asarray(peso, dtype=float)
+        eventos = np.zeros((num_grupos, m + 1))
+        recortes = np.zeros((num_grupos, m))
+        for columna in grupos.T:
+            # meses de primero a ultimo enteros...
+            np.add.at(eventos, (columna, primero), peso)
+            np.add.at(eventos, (columna, ultimo + 1), -peso)
+            # ...menos lo que no se cubre al principio del primero y al final del último
+            np.add.at(recortes, (columna, primero), peso * (desde - cortes[primero]))
+            np.add.at(recortes, (columna, ultimo), peso * (cortes[ultimo + 1] - hasta))
+        series.append(np.cumsum(eventos, axis=1)[:, :m] * largo - recortes)
+    return series
+
+
+def _barrido_python(grupos, desde, hasta, pesos, cortes, num_grupos):
+    m = len(cortes) - 1
+    largo = [cortes[i + 1] - cortes[i] for i in range(m)]
+    series = []
+    for peso in pesos:
+        eventos = [[0.0] * (m + 1) for _ in range(num_grupos)]
+        recortes = [[0.0] * m for _ in range(num_grupos)]
+        for fila, d, h, w in zip(grupos, desde, hasta, peso):
+            primero = bisect.bisect_right(cortes, d) - 1
+            ultimo = bisect.bisect_right(cortes, h - 1) - 1
+            for g in fila:
+                eventos[g][primero] += w
+                eventos[g][ultimo + 1] -= w
+                recortes[g][primero] += w * (d - cortes[primero])
+                recortes[g][ultimo] += w * (cortes[ultimo + 1] - h)
+        serie = []
+        for ev, rec in zip(eventos, recortes):
+            activo, fila = 0.0, []
+            for i in range(m):
+                activo += ev[i]
+                fila.append(activo * largo[i] - rec[i])
+            serie.append(fila)
+        series.append(serie)
+    return series
+
+
+def calcular(desde, hasta, usar_numpy=None):
+    """
+    Series mensuales de `desde` a `hasta` (meses incluidos). Devuelve
+    {'meses', 'cartera', 'tipos': {tipo: serie}, 'propietarios': {id: serie}}
+    donde cada serie es {'inmuebles', 'ocupacion', 'dias_ocupados',
+    'dias_vacios', 'renta_media'} con una posición por mes.
+    """
+    usar_numpy = np is not None if usar_numpy is None else usar_numpy
+    lista = meses(desde, hasta)
+    inicio, fin = lista[0], lista[-1]
+    cortes = [(m - inicio).days for m in lista]
+
+    inmuebles = dict((i, (t, p)) for i, t, p in Inmueble.objects.values_list('id', 'tipo', 'propietario_id'))
+    tipos = sorted({t for t, _ in inmuebles.values()})
+    propietarios = sorted({p for _, p in inmuebles.values()})
+    # grupo 0: la cartera; luego un grupo por tipo y otro por propietario
+    indice_tipo = {t: 1 + n for n, t in enumerate(tipos)}
+    indice_prop = {p: 1 + len(tipos) + n for n, p in enumerate(propietarios)}
+    num_grupos = 1 + len(tipos) + len(propietarios)
+
+    filas = [f for f in intervalos(inicio, fin) if f[0] in inmuebles]
+    grupos = [(0, indice_tipo[inmuebles[i][0]], indice_prop[inmuebles[i][1]]) for i, _, _, _ in filas]
+    desde_d = [f[1] for f in filas]
+    hasta_d = [f[2] for f in filas]
+    pesos = ([1.0] * len(filas), [f[3] for f in filas])
+    if usar_numpy and filas:
+        dias, renta = (s.tolist() for s in _barrido_numpy(
+            np.array(grupos, dtype=np.intp).reshape(-1, 3), desde_d, hasta_d, pesos, cortes, num_grupos))
+    elif filas:
+        dias, renta = _barrido_python(grupos, desde_d, hasta_d, pesos, cortes, num_grupos)
+    else:
+        dias = renta = [[0.0] * (len(lista) - 1) for _ in range(num_grupos)]
+
+    cuantos = [0] * num_grupos
+    cuantos[0] = len(inmuebles)
+    for t, p in inmuebles.values():
+        cuantos[indice_tipo[t]] += 1
+        cuantos[indice_prop[p]] += 1
+    largo = [cortes[i + 1] - cortes[i] for i in range(len(lista) - 1)]
+
+    def serie(g):
+        ocupados = [round(d) for d in dias[g]]
+        return {
+            'inmuebles': cuantos[g],
+            'ocupacion': [round(o / (cuantos[g] * l), 4) if cuantos[g] else 0.0 for o, l in zip(ocupados, largo)],
+            'dias_ocupados': ocupados,
+            'dias_vacios': [cuantos[g] * l - o for o, l in zip(ocupados, largo)],
+            # media de precio_mensual ponderada por los días alquilados
+            'renta_media': [round(r / d, 2) if d else None for r, d in zip(renta[g], dias[g])],
+        }
+
+    nombres = dict(Propietario.objects.filter(pk__in=propietarios).values_list('id', 'nombre'))
+    return {
+        'meses': [f'{m:%Y-%m}' for m in lista[:-1]],
+        'cartera': serie(0),
+        'tipos': {t: serie(g) for t, g in indice_tipo.items()},
+        'propietarios': {p: dict(serie(g), nombre=nombres.get(p, '')) for p, g in indice_prop.items()},
+    }
+
+
+def cacheado(desde, hasta):
+    """calcular() mientras no cambien contratos, inmuebles ni propietarios."""
+    return versiones.cacheado('ocupacion_series', MODELOS, lambda: calcular(desde, hasta), desde, hasta)
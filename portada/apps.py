@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def instalar_busqueda(sender, using, **kwargs):
+    # las migraciones que rehacen tablas en SQLite se llevan los triggers FTS
+    from django.db import connections
+    from . import busqueda
+    busqueda.instalar(connections[using])
 
 
 class PortadaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portada'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(instalar_busqueda, sender=self)
@@ -0,0 +1,273 @@
+# portada/auditoria.py
+# Registro de cambios (Auditoria) de pagos, contratos e inmuebles: quién, qué
+# campos pasaron de qué valor a cuál y cuándo. Solo se añaden filas.
+#
+# Las señales (portada/signals.py) calculan la diferencia con el estado previo
+# que ya se lee en pre_save y, al confirmarse la transacción, dejan la fila en
+# un búfer del proceso. Un hilo lo vuelca cada AUDITORIA_INTERVALO segundos (o
+# antes si se junta un LOTE) con un bulk_create, así que la petición no paga
+# ningún INSERT. Con AUDITORIA_INTERVALO = 0 se escribe en el acto. El
+# trabajador de tareas vuelca al acabar cada tarea y todo proceso al salir.
+#
+# Lo que se escribe sin señales se anota aquí a mano: las acciones masivas
+# (portada/acciones.py), la reparación de solapes (portada/solapes.py) y las
+# altas con bulk_create de las rentas (portada/rentas.py) y las importaciones
+# (portada/importacion.py), con altas() sobre las instancias ya en memoria.
+# Los datos sintéticos (portada/sintetico.py) no se anotan.
+#
+# quién: el usuario de la petición (AuditoriaMiddleware) o el que encoló la
+# tarea; como() lo fija para cualquier otro código.
+import atexit
+import datetime
+import functools
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from .models import Auditoria, Contrato
+
+logger = logging.getLogger('portada.auditoria')
+
+LOTE = 500  # filas que fuerzan un volcado sin esperar al intervalo
+MAXIMO = 100_000  # si la BD no acepta escrituras, lo más antiguo del búfer se pierde
+IGNORAR = {'contrato_vigente_id'}  # derivados: los mantiene portada/ocupacion.py
+
+# la petición (o el usuario) en nombre de quien se hacen los cambios
+_quien = ContextVar('auditoria_quien', default=None)
+
+
+@contextmanager
+def como(quien):
+    """Atribuye los cambios hechos dentro del bloque a `quien` (un usuario o una petición)."""
+    token = _quien.set(quien)
+    try:
+        yield
+    finally:
+        _quien.reset(token)
+
+
+def usuario_actual():
+    quien = _quien.get()
+    usuario = getattr(quien, 'user', quien)
+    return usuario if usuario is not None and usuario.is_authenticated else None
+
+
+@functools.cache
+def _auditados(modelo):
+    return tuple((f.attname, f) for f in modelo._meta.concrete_fields if not f.primary_key and f.attname not in IGNORAR)
+
+
+def campos(modelo):
+    """Campos auditados de un modelo, por attname (las FK como inmueble_id)."""
+    return [nombre for nombre, _ in _auditados(modelo)]
+
+
+def _valor(campo, valor):
+    # lo que se guarda en el JSON: mismos valores se escriben igual vengan de values() o del formulario
+    valor = campo.to_python(valor)
+    if isinstance(valor, Decimal):
+        return str(valor.quantize(Decimal(1).scaleb(-campo.decimal_places)))
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, FieldFile):
+        return valor.name or None
+    return valor
+
+
+def diferencias(modelo, previo, nuevo, solo=None):
+    """
+    {campo: [antes, después]} de los campos que cambian entre dos estados
+    (dicts de values() por attname, o None para un alta o una baja). `solo`
+    limita la comparación a unos campos (attnames).
+    """
+    cambios = {}
+    for nombre, campo in _auditados(modelo):
+        if solo is not None and nombre not in solo:
+            continue
+        antes = _valor(campo, previo[nombre]) if previo is not None else None
+        despues = _valor(campo, nuevo[nombre]) if nuevo is not None else None
+        if previo is None or nuevo is None or antes != despues:
+            cambios[nombre] = [antes, despues]
+    return cambios
+
+
+def estado(instancia):
+    return {nombre: getattr(instancia, nombre) for nombre in campos(type(instancia))}
+
+
+def fila(modelo, objeto_id, accion, cambios, usuario=None):
+    """La Auditoria sin guardar; la hora es la del cambio, no la del volcado."""
+    usuario = usuario or usuario_actual()
+    return Auditoria(modelo=modelo._meta.model_name, objeto_id=objeto_id, accion=accion, cambios=cambios,
+                     usuario_id=usuario.pk if usuario else None,
+                     usuario_nombre=usuario.get_username() if usuario else '', en=timezone.now())
+
+
+def anotar(filas, using=None):
+    """Deja las filas en el búfer cuando se confirme la transacción en curso (en el acto si no hay)."""
+    filas = [f for f in filas if f.cambios]
+    if filas:
+        # robust: un fallo al anotar no puede tumbar la petición cuyo cambio ya está confirmado
+        transaction.on_commit(lambda: buffer.anotar(filas), using=using, robust=True)
+
+
+def cambio(instancia, previo, update_fields=None, using=None):
+    """
+    Anota el alta (previo None) o el cambio de una instancia recién guardada.
+    Con save(update_fields=...) solo cuentan esos campos: el resto de la
+    instancia puede estar desfasado respecto a la BD.
+    """
+    modelo = type(instancia)
+    accion = Auditoria.ALTA if previo is None else Auditoria.CAMBIO
+    solo = None
+    if previo is not None and update_fields is not None:
+        solo = {modelo._meta.get_field(nombre).attname for nombre in update_fields}
+    anotar([fila(modelo, instancia.pk, accion, diferencias(modelo, previo, estado(instancia), solo))], using)
+
+
+def altas(objetos, usuario=None):
+    """Filas de alta de instancias recién creadas con bulk_create (con pk), sin volver a leerlas."""
+    usuario = usuario or usuario_actual()
+    return [fila(type(o), o.pk, Auditoria.ALTA, diferencias(type(o), None, estado(o)), usuario) for o in objetos]
+
+
+def baja(instancia, using=None):
+    modelo = type(instancia)
+    anotar([fila(modelo, instancia.pk, Auditoria.BAJA, diferencias(modelo, estado(instancia), None))], using)
+
+
+def inquilinos(contratos, cambiados, anadidos, using=None):
+    """
+    Cambio de los inquilinos de unos contratos: {'inquilinos': [antes, después]}
+    con los ids de cada uno, leídos de la tabla intermedia con una consulta.
+    """
+    if not contratos or not cambiados:
+        return
+    ahora = defaultdict(set)
+    intermedia = Contrato.inquilinos.through.objects.using(using)
+    for contrato_id, inquilino_id in intermedia.filter(contrato_id__in=list(contratos)).values_list(
+            'contrato_id', 'inquilino_id'):
+        ahora[contrato_id].add(inquilino_id)
+    filas = []
+    for contrato_id in contratos:
+        despues = ahora[contrato_id]
+        antes = despues - set(cambiados) if anadidos else despues | set(cambiados)
+        if antes != despues:
+            filas.append(fila(Contrato, contrato_id, Auditoria.CAMBIO, {'inquilinos': [sorted(antes), sorted(despues)]}))
+    anotar(filas, using)
+
+
+class Buffer:
+    """Filas pendientes de escribir en este proceso y el hilo que las vuelca."""
+
+    def __init__(self):
+        self._filas = []
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+    def anotar(self, filas):
+        intervalo = settings.AUDITORIA_INTERVALO
+        with self._lock:
+            self._filas.extend(filas)
+            sobran = len(self._filas) - MAXIMO
+            if sobran > 0:
+                del self._filas[:sobran]
+            lleno = len(self._filas) >= LOTE
+        if sobran > 0:
+            logger.error('Búfer de auditoría lleno: se pierden %d cambios.', sobran)
+        if not intervalo:
+            self.volcar()
+            return
+        self._arrancar(intervalo)
+        if lleno:
+            self._despertar.set()
+
+    def _arrancar(self, intervalo):
+        # tras un fork el hilo del padre no existe en el hijo: cada proceso arranca el suyo
+        if self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._hilo.is_alive():
+                self._pid = os.getpid()
+                self._parar.clear()
+                self._hilo = threading.Thread(target=self._bucle, args=(intervalo,), name='auditoria', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self, intervalo):
+        while not self._parar.is_set():
+            self._despertar.wait(intervalo)
+            self._despertar.clear()
+            close_old_connections()
+            try:
+                self.volcar()
+            except Exception:
+                logger.exception('No se ha podido volcar el búfer de auditoría; se reintenta.')
+            finally:
+                close_old_connections()
+        connections.close_all()
+
+    def parar(self, espera=None):
+        """Para el hilo tras un último volcado; el siguiente anotar() lo vuelve a arrancar."""
+        self._parar.set()
+        self._despertar.set()
+        hilo = self._hilo
+        if hilo is not None and hilo is not threading.current_thread():
+            hilo.join(espera)
+
+    def pendientes(self):
+        with self._lock:
+            return len(self._filas)
+
+    def volcar(self):
+        """Escribe lo pendiente con un bulk_create. Si falla, las filas vuelven al búfer. Devuelve cuántas."""
+        with self._lock:
+            filas, self._filas = self._filas, []
+        if not filas:
+            return 0
+        try:
+            Auditoria.objects.bulk_create(filas, batch_size=LOTE)
+        except Exception:
+            with self._lock:
+                self._filas[:0] = filas
+            raise
+        return len(filas)
+
+
+buffer = Buffer()
+volcar = buffer.volcar
+
+
+@atexit.register
+def _al_salir():
+    try:
+        buffer.volcar()
+    except Exception:
+        logger.exception('Cambios de auditoría sin volcar al salir.')
+
+
+# ----- consultas (por auditoria_objeto_idx y auditoria_usuario_idx) -----
+
+def historial(modelo, objeto_id=None):
+    """Cambios de un objeto, del más reciente al más antiguo: historial(pago) o historial(Pago, 5)."""
+    if objeto_id is None:
+        modelo, objeto_id = type(modelo), modelo.pk
+    return Auditoria.objects.filter(modelo=modelo._meta.model_name, objeto_id=objeto_id).order_by('-en', '-id')
+
+
+def por_usuario(usuario, desde=None):
+    qs = Auditoria.objects.filter(usuario=usuario)
+    if desde is not None:
+        qs = qs.filter(en__gte=desde)
+    return qs.order_by('-en', '-id')
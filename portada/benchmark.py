@@ -0,0 +1,250 @@
+# portada/benchmark.py
+# Banco de pruebas repetible: recorre los listados, altas y changelists del
+# admin con el cliente de pruebas de Django sobre la BD configurada (pensado
+# para una cartera de portada/sintetico.py) y mide latencia y nº de consultas.
+# Las escrituras se deshacen al terminar cada petición para que las
+# repeticiones midan siempre lo mismo.
+#
+# carga() mide en cambio el rendimiento con peticiones concurrentes a los
+# listados, por WSGI (un hilo por petición en curso) o por ASGI (un bucle de
+# eventos con las vistas async de inmuebles/asincronas.py).
+import asyncio
+import json
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .models import Contrato, Inmueble, Inquilino, Pago, Propietario, TipoPago
+
+# (nombre, método, url); la url admite {pago}, {inmueble}, {tipo}
+CASOS = [
+    ('inmuebles:lista', 'get', '/inmuebles/'),
+    ('inmuebles:lista alquilados por m2', 'get', '/inmuebles/?alquilado=si&orden=-metros'),
+    ('inmuebles:lista texto', 'get', '/inmuebles/?q=mayor'),
+    ('inmuebles:lista propietario', 'get', '/inmuebles/?prop=garcia&orden=direccion'),
+    ('inmuebles:lista cursor', 'get', '/inmuebles/?cursor='),
+    ('pagos:lista', 'get', '/pagos/'),
+    ('pagos:lista pendientes inquilino', 'get', '/pagos/?pagado=no&quien=inquilino'),
+    ('pagos:lista año', 'get', '/pagos/?desde=2024-01-01&hasta=2024-12-31'),
+    ('pagos:lista inmueble', 'get', '/pagos/?inmueble={inmueble}'),
+    ('pagos:lista tipo por total', 'get', '/pagos/?tipo={tipo}&orden=-total'),
+    ('pagos:lista texto cursor', 'get', '/pagos/?q=renta&cursor='),
+    ('pagos:nuevo', 'get', '/pagos/nuevo/'),
+    ('pagos:nuevo post', 'post', '/pagos/nuevo/'),
+    ('pagos:toggle', 'post', '/pagos/{pago}/toggle/'),
+    ('admin propietario', 'get', '/admin/portada/propietario/'),
+    ('admin inmueble', 'get', '/admin/portada/inmueble/'),
+    ('admin inquilino', 'get', '/admin/portada/inquilino/'),
+    ('admin contrato', 'get', '/admin/portada/contrato/'),
+    ('admin tipopago', 'get', '/admin/portada/tipopago/'),
+    ('admin pago', 'get', '/admin/portada/pago/'),
+]
+
+
+# urls de solo lectura para la prueba de carga
+URLS_CARGA = [
+    '/',
+    '/inmuebles/',
+    '/inmuebles/?alquilado=si&orden=-metros',
+    '/pagos/',
+    '/pagos/?pagado=no&quien=inquilino',
+    '/pagos/?q=renta&cursor=',
+]
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar) de una lista no vacía."""
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def _datos_post(nombre, ids):
+    if nombre == 'pagos:nuevo post':
+        return {
+            'inmueble': ids['inmueble'], 'tipo': ids['tipo'], 'fecha': timezone.localdate().isoformat(),
+            'descripcion': 'benchmark', 'total': '123.45', 'quien_paga': 'inquilino',
+        }
+    return {}
+
+
+def _usuario(username=None):
+    User = get_user_model()
+    if username:
+        return User.objects.get(username=username)
+    usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+    if usuario is None:
+        usuario = User(username='benchmark', is_staff=True, is_superuser=True)
+        usuario.set_unusable_password()
+        usuario.save()
+    return usuario
+
+
+def medir(client, metodo, url, datos=None):
+    """Una petición dentro de una transacción que se deshace. Devuelve (segundos, consultas, estado)."""
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            respuesta = getattr(client, metodo)(url, datos or {})
+            if getattr(respuesta, 'streaming', False):
+                b''.join(respuesta.streaming_content)
+            segundos = time.perf_counter() - inicio
+        transaction.set_rollback(True)
+    return segundos, len(ctx.captured_queries), respuesta.status_code
+
+
+def ejecutar(repeticiones=20, calentamiento=2, casos=None, usuario=None, progreso=None, en_frio=False):
+    """
+    Mide cada caso y devuelve el informe como dict serializable a JSON. Con
+    `en_frio` se vacía la caché antes de cada petición (sin listados cacheados).
+    """
+    ids = {
+        'pago': Pago.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'inmueble': Inmueble.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'tipo': TipoPago.objects.order_by('pk').values_list('pk', flat=True).first(),
+    }
+    client = Client()
+    client.force_login(_usuario(usuario))
+    resultados = {}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for nombre, metodo, url in casos or CASOS:
+            if any('{%s}' % k in url and v is None for k, v in ids.items()):
+                continue  # sin datos para este caso
+            url = url.format(**ids)
+            datos = _datos_post(nombre, ids)
+            for _ in range(calentamiento):
+                medir(client, metodo, url, datos)
+            tiempos, consultas, estados = [], [], set()
+            for _ in range(repeticiones):
+                if en_frio:
+                    cache.clear()
+                segundos, n, estado = medir(client, metodo, url, datos)
+                tiempos.append(segundos * 1000)
+                consultas.append(n)
+                estados.add(estado)
+            resultados[nombre] = {
+                'url': url,
+                'metodo': metodo.upper(),
+                'estados': sorted(estados),
+                'p50_ms': round(percentil(tiempos, 50), 2),
+                'p95_ms': round(percentil(tiempos, 95), 2),
+                'p99_ms': round(percentil(tiempos, 99), 2),
+                'media_ms': round(statistics.fmean(tiempos), 2),
+                'consultas': max(consultas),
+            }
+            if progreso:
+                progreso(nombre, resultados[nombre])
+    return {
+        'fecha': timezone.now().isoformat(timespec='seconds'),
+        'repeticiones': repeticiones,
+        'en_frio': en_frio,
+        'datos': {m.__name__.lower(): m.objects.count()
+                  for m in (Propietario, Inmueble, Inquilino, Contrato, Pago)},
+        'casos': resultados,
+    }
+
+
+def _resumen_carga(modo, concurrencia, segundos, tiempos, estados):
+    tiempos = [t * 1000 for t in tiempos]
+    return {
+        'modo': modo,
+        'concurrencia': concurrencia,
+        'peticiones': len(tiempos),
+        'segundos': round(segundos, 3),
+        'peticiones_s': round(len(tiempos) / segundos, 1),
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'estados': sorted(set(estados)),
+    }
+
+
+def _carga_wsgi(urls, concurrencia, cookies):
+    def pedir(url):
+        client = Client()
+        client.cookies = SimpleCookie(cookies)  # cliente nuevo cada vez: sin cookie CSRF no hay respuesta cacheada
+        inicio = time.perf_counter()
+        estado = client.get(url).status_code
+        return time.perf_counter() - inicio, estado
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as pool:
+        resultados = list(pool.map(pedir, urls))
+    return time.perf_counter() - inicio, resultados
+
+
+async def _carga_asgi(urls, concurrencia, cookies):
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def pedir(url):
+        client = AsyncClient()
+        client.cookies = SimpleCookie(cookies)
+        async with limite:
+            inicio = time.perf_counter()
+            respuesta = await client.get(url)
+            return time.perf_counter() - inicio, respuesta.status_code
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(pedir(url) for url in urls))
+    return time.perf_counter() - inicio, resultados
+
+
+def carga(modo, peticiones=200, concurrencia=10, urls=None, usuario=None, en_frio=False):
+    """
+    Lanza `peticiones` GET repartidas entre `urls` con `concurrencia` en curso a
+    la vez y devuelve rendimiento (peticiones/s) y latencias. Las vistas que se
+    sirven dependen de settings.VISTAS_ASYNC: para comparar, cada modo se
+    ejecuta en su propio proceso (comando benchmark_concurrencia). Con
+    `en_frio` no hay caché: conteos, totales y tipos se consultan siempre.
+    """
+    urls = urls or URLS_CARGA
+    lista = [urls[i % len(urls)] for i in range(peticiones)]
+    client = Client()
+    client.force_login(_usuario(usuario))
+    ajustes = {'ALLOWED_HOSTS': ['testserver']}
+    if en_frio:
+        ajustes['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    with override_settings(**ajustes):
+        for url in urls:
+            client.get(url)  # calentamiento: plantillas, conteos cacheados
+        if modo == 'asgi':
+            segundos, resultados = asyncio.run(_carga_asgi(lista, concurrencia, client.cookies))
+        else:
+            segundos, resultados = _carga_wsgi(lista, concurrencia, client.cookies)
+    informe = _resumen_carga(modo, concurrencia, segundos, [t for t, _ in resultados], [e for _, e in resultados])
+    informe['en_frio'] = en_frio
+    return informe
+
+
+def comparar(actual, base, tolerancia=0.25):
+    """
+    Lista de regresiones frente a un informe guardado: p95 más de un
+    `tolerancia` (fracción) por encima, o más consultas que antes.
+    """
+    regresiones = []
+    for nombre, antes in base.get('casos', {}).items():
+        ahora = actual['casos'].get(nombre)
+        if ahora is None:
+            continue
+        if ahora['p95_ms'] > antes['p95_ms'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p95 {antes['p95_ms']} → {ahora['p95_ms']} ms")
+        if ahora['consultas'] > antes['consultas']:
+            regresiones.append(f"{nombre}: consultas {antes['consultas']} → {ahora['consultas']}")
+    return regresiones
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar(informe, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
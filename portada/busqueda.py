@@ -0,0 +1,101 @@
+# portada/busqueda.py
+# Búsqueda de texto con índices FTS5 de SQLite: sin acentos, sin mayúsculas y por prefijo.
+# Los índices usan la propia tabla como contenido y se mantienen con triggers,
+# así que también cubren bulk_create/update(). Con otros motores se usa icontains.
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# nombre -> (tabla con el contenido, columnas indexadas)
+INDICES = {
+    'inmueble': ('portada_inmueble', ['direccion']),
+    'propietario': ('portada_propietario', ['nombre', 'dni', 'email', 'telefono']),
+    'pago': ('portada_pago', ['descripcion']),
+}
+TOKENIZADOR = 'unicode61 remove_diacritics 2'
+
+
+def tabla_fts(nombre):
+    return f'{INDICES[nombre][0]}_fts'
+
+
+def _sql_instalar(nombre):
+    contenido, columnas = INDICES[nombre]
+    fts = tabla_fts(nombre)
+    cols = ', '.join(columnas)
+    nuevos = ', '.join(f'new.{c}' for c in columnas)
+    viejos = ', '.join(f'old.{c}' for c in columnas)
+    borrar = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES('delete', old.id, {viejos});"
+    insertar = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {nuevos});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{contenido}', "
+        f"content_rowid='id', tokenize='{TOKENIZADOR}', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {contenido} BEGIN {insertar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {contenido} BEGIN {borrar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {contenido} "
+        f"BEGIN {borrar} {insertar} END",
+        f"INSERT INTO {fts}({fts}) VALUES('rebuild')",
+    ]
+
+
+def instalar(conn=connection):
+    """
+    Crea los índices FTS y sus triggers si faltan y los reconstruye.
+    Es idempotente: Django borra los triggers cuando rehace una tabla en
+    una migración, por eso se vuelve a llamar tras cada migrate.
+    """
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        for nombre, (contenido, _) in INDICES.items():
+            fts = tabla_fts(nombre)
+            if contenido not in existentes:
+                continue
+            if {fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au'} <= existentes:
+                continue
+            for sql in _sql_instalar(nombre):
+                cursor.execute(sql)
+
+
+def desinstalar(conn=connection):
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for nombre in INDICES:
+            fts = tabla_fts(nombre)
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def expresion(texto, columnas=None):
+    """Consulta FTS5: cada palabra como prefijo y todas obligatorias ("calle"* "mayor"*)."""
+    consulta = ' '.join(f'"{t}"*' for t in re.findall(r'\w+', texto))
+    if consulta and columnas:
+        consulta = f"{{{' '.join(columnas)}}} : ({consulta})"
+    return consulta
+
+
+def q_busqueda(nombre, texto, ruta='', columnas=None):
+    """
+    Q que deja las filas cuyo objeto `ruta` (vacío = el propio modelo, o el
+    nombre del FK, p. ej. 'inmueble') casa con `texto` en el índice `nombre`.
+    `columnas` limita la búsqueda a parte de las columnas del índice.
+    """
+    columnas = columnas or INDICES[nombre][1]
+    consulta = expresion(texto, columnas)
+    if not consulta:
+        return Q()
+    if connection.vendor != 'sqlite':
+        prefijo = f'{ruta}__' if ruta else ''
+        q = Q()
+        for columna in columnas:
+            q |= Q(**{f'{prefijo}{columna}__icontains': texto})
+        return q
+    campo = f'{ruta}_id' if ruta else 'pk'
+    fts = tabla_fts(nombre)
+    return Q(**{f'{campo}__in': RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [consulta])})
@@ -0,0 +1,289 @@
+# portada/importacion.py
+# Importación masiva desde CSV de propietarios, inquilinos, inmuebles y contratos.
+# El fichero se lee fila a fila y se valida entero antes de escribir (en memoria
+# solo quedan las instancias válidas), las FK se resuelven por DNI con mapas
+# cargados con una consulta por tabla y se inserta con bulk_create por bloques.
+# Las filas con errores se informan y se saltan; el resto se importa.
+import csv
+import datetime
+import itertools
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from . import auditoria, ocupacion, solapes, versiones
+from .models import Contrato, Inmueble, Inquilino, Propietario
+
+
+def leer_csv(lineas):
+    """
+    Dicts de las filas de un CSV con cabecera (separador ',' o ';'), leídas a
+    medida que se piden. Una fila mal formada lanza csv.Error al llegar a ella;
+    una cabecera mal formada, ValidationError.
+    """
+    lineas = iter(lineas)
+    cabecera = next(lineas, '')
+    delimitador = ';' if cabecera.count(';') > cabecera.count(',') else ','
+    reader = csv.DictReader(itertools.chain([cabecera], lineas), delimiter=delimitador, strict=True)
+    try:
+        reader.fieldnames = [c.strip().lower() for c in reader.fieldnames or []]
+    except csv.Error as e:
+        raise ValidationError(f"Cabecera no válida: {e}")
+    return reader
+
+
+def limpiar(modelo, campo, valor):
+    """Convierte y valida un valor de texto según el campo del modelo (sin consultas)."""
+    field = modelo._meta.get_field(campo)
+    valor = (valor or '').strip()
+    if valor == '':
+        if field.null:
+            return None
+        if field.blank:
+            return ''
+        raise ValidationError(f"{campo}: obligatorio")
+    if isinstance(field, (models.DecimalField, models.FloatField)) and '.' not in valor:
+        valor = valor.replace(',', '.')  # 1234,56
+    if isinstance(field, models.DateField) and '/' in valor:
+        try:
+            valor = datetime.datetime.strptime(valor, '%d/%m/%Y').date()
+        except ValueError:
+            raise ValidationError(f"{campo}: fecha no válida '{valor}'")
+    try:
+        valor = field.to_python(valor)
+        field.validate(valor, None)
+        field.run_validators(valor)
+    except ValidationError as e:
+        raise ValidationError(f"{campo}: {' '.join(e.messages)}")
+    return valor
+
+
+class Importador:
+    modelo = None
+    campos = ()  # columnas que se copian tal cual al modelo
+    auditado = False  # anota el alta de cada fila en la auditoría (portada/auditoria.py)
+
+    def __init__(self, chunk_size=2000):
+        self.chunk_size = chunk_size
+
+    def cargar_mapas(self):
+        pass
+
+    def construir(self, fila):
+        """Instancia sin guardar a partir de una fila; lanza ValidationError si no es válida."""
+        errores, datos = [], {}
+        for campo in self.campos:
+            try:
+                datos[campo] = limpiar(self.modelo, campo, fila.get(campo))
+            except ValidationError as e:
+                errores.extend(e.messages)
+        if errores:
+            raise ValidationError(errores)
+        return self.modelo(**datos)
+
+    def comprobar_conjunto(self, objetos):
+        """Errores que solo se ven con todas las filas a la vez: [(nº de línea, mensaje)]."""
+        return []
+
+    def guardar(self, objetos):
+        self.modelo.objects.bulk_create(objetos, batch_size=self.chunk_size)
+        if self.auditado:
+            auditoria.anotar(self.altas(objetos))
+
+    def altas(self, objetos):
+        return auditoria.altas(objetos)
+
+    def importar(self, filas, dry_run=False, progreso=None):
+        """
+        Devuelve {'total', 'validas', 'creados', 'errores': [(nº de línea, mensaje)]}.
+        `progreso(hechos, total)` se llama tras guardar cada bloque.
+        """
+        self.cargar_mapas()
+        validos, errores = [], []
+        filas = iter(filas)
+        for n in itertools.count(2):  # la línea 1 es la cabecera
+            try:
+                fila = next(filas)
+            except StopIteration:
+                break
+            except csv.Error as e:  # el lector sigue en la línea siguiente
+                errores.append((n, f"CSV no válido: {e}"))
+                continue
+            try:
+                obj = self.construir(fila)
+            except ValidationError as e:
+                errores.append((n, '; '.join(e.messages)))
+            else:
+                obj._linea = n
+                validos.append(obj)
+        descartadas = dict(self.comprobar_conjunto(validos))
+        if descartadas:
+            validos = [o for o in validos if o._linea not in descartadas]
+            errores = sorted(errores + list(descartadas.items()))
+        resultado = {'total': n - 2, 'validas': len(validos), 'creados': 0, 'errores': errores}
+        if dry_run:
+            return resultado
+        for i in range(0, len(validos), self.chunk_size):
+            bloque = validos[i:i + self.chunk_size]
+            with transaction.atomic():
+                self.guardar(bloque)
+                versiones.invalidar(self.modelo._meta.model_name)
+            resultado['creados'] += len(bloque)
+            if progreso:
+                progreso(resultado['creados'], len(validos))
+        self.despues_de_guardar(validos)
+        return resultado
+
+    def despues_de_guardar(self, objetos):
+        pass
+
+
+class ImportadorConDni(Importador):
+    """Propietarios e inquilinos: el DNI es único en la BD y dentro del fichero."""
+    campos = ('nombre', 'dni', 'telefono', 'email')
+
+    def cargar_mapas(self):
+        self.dnis = set(self.modelo.objects.values_list('dni', flat=True))
+
+    def construir(self, fila):
+        obj = super().construir(fila)
+        if obj.dni in self.dnis:
+            raise ValidationError(f"dni: {obj.dni} ya existe")
+        self.dnis.add(obj.dni)
+        return obj
+
+
+class ImportadorPropietarios(ImportadorConDni):
+    modelo = Propietario
+    campos = ImportadorConDni.campos + ('direccion',)
+
+
+class ImportadorInquilinos(ImportadorConDni):
+    modelo = Inquilino
+
+
+class ImportadorInmuebles(Importador):
+    """Columnas del modelo más propietario_dni."""
+    modelo = Inmueble
+    campos = ('tipo', 'direccion', 'planta', 'puerta', 'metros', 'habitaciones')
+    auditado = True
+
+    def cargar_mapas(self):
+        self.propietarios = dict(Propietario.objects.values_list('dni', 'id'))
+
+    def construir(self, fila):
+        dni = (fila.get('propietario_dni') or '').strip()
+        propietario_id = self.propietarios.get(dni)
+        try:
+            obj = super().construir(fila)
+        except ValidationError as e:
+            errores = e.messages
+        else:
+            errores = []
+        if propietario_id is None:
+            errores.append(f"propietario_dni: no existe '{dni}'")
+        if errores:
+            raise ValidationError(errores)
+        obj.propietario_id = propietario_id
+        return obj
+
+
+class ImportadorContratos(Importador):
+    """
+    Columnas: inmueble_id, o bien propietario_dni + direccion (+ planta, puerta)
+    para localizar el inmueble; inquilinos_dni separados por '|'; fecha_inicio,
+    fecha_fin, precio_mensual, condiciones. El propietario es el del inmueble.
+    """
+    modelo = Contrato
+    campos = ('fecha_inicio', 'fecha_fin', 'precio_mensual', 'condiciones')
+    auditado = True
+
+    def cargar_mapas(self):
+        self.inquilinos = dict(Inquilino.objects.values_list('dni', 'id'))
+        self.inmuebles = {}
+        self.por_direccion = {}
+        filas = Inmueble.objects.values_list('id', 'propietario_id', 'propietario__dni', 'direccion', 'planta', 'puerta')
+        for inmueble_id, propietario_id, dni, direccion, planta, puerta in filas.iterator(chunk_size=5000):
+            self.inmuebles[inmueble_id] = propietario_id
+            clave = (dni, direccion.strip().lower(), planta.strip().lower(), puerta.strip().lower())
+            self.por_direccion[clave] = inmueble_id
+
+    def _inmueble(self, fila):
+        valor = (fila.get('inmueble_id') or '').strip()
+        if valor:
+            return int(valor) if valor.isdigit() and int(valor) in self.inmuebles else None
+        clave = ((fila.get('propietario_dni') or '').strip(),) + tuple(
+            (fila.get(c) or '').strip().lower() for c in ('direccion', 'planta', 'puerta')
+        )
+        return self.por_direccion.get(clave)
+
+    def construir(self, fila):
+        try:
+            obj = super().construir(fila)
+        except ValidationError as e:
+            obj, errores = None, e.messages
+        else:
+            errores = []
+        inmueble_id = self._inmueble(fila)
+        if inmueble_id is None:
+            errores.append("inmueble: no encontrado")
+        dnis = [d.strip() for d in (fila.get('inquilinos_dni') or '').split('|') if d.strip()]
+        faltan = [d for d in dnis if d not in self.inquilinos]
+        if faltan:
+            errores.append(f"inquilinos_dni: no existen {', '.join(faltan)}")
+        if obj and obj.fecha_fin and obj.fecha_fin < obj.fecha_inicio:
+            errores.append("fecha_fin: anterior a fecha_inicio")
+        if errores:
+            raise ValidationError(errores)
+        obj.inmueble_id = inmueble_id
+        obj.propietario_id = self.inmuebles[inmueble_id]
+        obj._inquilinos_ids = [self.inquilinos[d] for d in dnis]
+        return obj
+
+    def comprobar_conjunto(self, objetos):
+        # solapes entre las filas y con los contratos que ya hay, en un solo barrido;
+        # las filas van con id negativo (-línea) para distinguirlas
+        nuevos = [solapes.Intervalo(-o._linea, o.inmueble_id, o.fecha_inicio, o.fecha_fin) for o in objetos]
+        ids = {i.inmueble_id for i in nuevos}
+        todos = sorted([*solapes.intervalos(ids if len(ids) <= 5000 else None), *nuevos],
+                       key=lambda i: (i.inmueble_id, i.inicio, i.id))
+        errores = {}
+        for a, b in solapes.pares(todos):
+            for este, otro in ((a, b), (b, a)):
+                if este.id < 0 and -este.id not in errores:
+                    con = f"la línea {-otro.id}" if otro.id < 0 else f"el contrato {otro.id}"
+                    errores[-este.id] = f"fechas: se solapa con {con} del mismo inmueble"
+        return errores.items()
+
+    def guardar(self, objetos):
+        super().guardar(objetos)
+        Relacion = Contrato.inquilinos.through
+        Relacion.objects.bulk_create(
+            [Relacion(contrato_id=c.pk, inquilino_id=i) for c in objetos for i in c._inquilinos_ids],
+            batch_size=self.chunk_size,
+        )
+
+    def altas(self, objetos):
+        # los inquilinos, como los anotaría el formulario al añadirlos
+        filas = super().altas(objetos)
+        for f, c in zip(filas, objetos):
+            if c._inquilinos_ids:
+                f.cambios['inquilinos'] = [[], sorted(c._inquilinos_ids)]
+        return filas
+
+    def despues_de_guardar(self, objetos):
+        # bulk_create no lanza señales: refrescamos aquí el contrato vigente
+        ids = {c.inmueble_id for c in objetos}
+        ocupacion.actualizar(ids if len(ids) <= 5000 else None)
+
+
+IMPORTADORES = {
+    'propietarios': ImportadorPropietarios,
+    'inquilinos': ImportadorInquilinos,
+    'inmuebles': ImportadorInmuebles,
+    'contratos': ImportadorContratos,
+}
+
+
+def importar(tipo, lineas, dry_run=False, chunk_size=2000, progreso=None):
+    return IMPORTADORES[tipo](chunk_size=chunk_size).importar(leer_csv(lineas), dry_run=dry_run, progreso=progreso)
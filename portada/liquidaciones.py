@@ -0,0 +1,207 @@
+# portada/liquidaciones.py
+# Liquidación mensual de cada propietario: lo cobrado y lo pendiente de los
+# inquilinos y los gastos a su cargo (IBI, comunidad, reparaciones...), por
+# inmueble y tipo de pago.
+#
+# calcular() saca las cifras de todos los propietarios con cuatro consultas,
+# sea cual sea su número (una agrupada sobre Pago y tres pequeñas). Lo
+# renderizado se guarda por la huella (SHA-256) de sus datos y de la
+# plantilla: una liquidación cuyos pagos no han cambiado no se vuelve a
+# generar. generar() renderiza las que falten en un pool de procesos.
+#
+# PDF con WeasyPrint, si está instalado.
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import posixpath
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+
+from .models import Inmueble, Pago, Propietario, TipoPago
+from .rentas import limites_mes
+
+PLANTILLA = 'portada/liquidacion.html'
+DIRECTORIO = 'liquidaciones'
+FORMATOS = {'html': 'text/html', 'pdf': 'application/pdf'}
+LOTE = 50  # liquidaciones por envío al pool: menos ida y vuelta de pickles
+CERO = Decimal('0.00')
+
+
+class NoDisponible(Exception):
+    """Falta la dependencia opcional para el formato pedido."""
+
+
+def mes_anterior():
+    """Por defecto se liquida el mes ya cerrado."""
+    return (timezone.localdate().replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+
+def calcular(periodo, propietarios=None):
+    """
+    {propietario_id: datos} del mes de `periodo` para todos los propietarios
+    con inmuebles (o solo los ids de `propietarios`). Los datos son dicts y
+    listas sencillos: se pasan tal cual a la plantilla y a otros procesos.
+    """
+    inicio, fin = limites_mes(periodo)
+    duenos = Propietario.objects.filter(inmuebles__isnull=False).distinct().order_by('nombre', 'id')
+    inmuebles = Inmueble.objects.order_by('direccion', 'planta', 'puerta', 'id')
+    pagos = Pago.objects.filter(fecha__range=(inicio, fin))
+    if propietarios is not None:
+        duenos = duenos.filter(pk__in=propietarios)
+        inmuebles = inmuebles.filter(propietario__in=propietarios)
+        pagos = pagos.filter(inmueble__propietario__in=propietarios)
+
+    tipos = dict(TipoPago.objects.values_list('id', 'nombre'))
+    lineas = defaultdict(dict)  # inmueble_id -> {(tipo, quien): línea}
+    grupos = (pagos.values('inmueble_id', 'tipo_id', 'quien_paga', 'pagado')
+              .annotate(suma=Sum('total'), n=Count('id')).order_by())
+    for g in grupos:
+        clave = (tipos.get(g['tipo_id'], '?'), g['quien_paga'])
+        linea = lineas[g['inmueble_id']].setdefault(clave, {
+            'tipo': clave[0], 'quien_paga': clave[1], 'pagado': CERO, 'pendiente': CERO, 'num': 0,
+        })
+        linea['pagado' if g['pagado'] else 'pendiente'] += g['suma']
+        linea['num'] += g['n']
+
+    resultado = {}
+    for p in duenos.values('id', 'nombre', 'dni', 'direccion', 'email'):
+        resultado[p['id']] = {
+            'propietario': p, 'periodo': f'{inicio:%Y-%m}', 'desde': inicio.isoformat(),
+            'hasta': fin.isoformat(), 'inmuebles': [],
+            'cobrado': CERO, 'pendiente_cobro': CERO, 'gastos': CERO, 'gastos_pendientes': CERO, 'neto': CERO,
+        }
+    for i in inmuebles.iterator(chunk_size=2000):
+        datos = resultado.get(i.propietario_id)
+        if datos is None:
+            continue
+        filas = sorted(lineas.get(i.pk, {}).values(), key=lambda l: (l['quien_paga'] != 'inquilino', l['tipo']))
+        ingresos = [l for l in filas if l['quien_paga'] == 'inquilino']
+        gastos = [l for l in filas if l['quien_paga'] == 'propietario']
+        fila = {
+            'id': i.pk, 'nombre': str(i), 'lineas': filas,
+            'cobrado': sum((l['pagado'] for l in ingresos), CERO),
+            'pendiente_cobro': sum((l['pendiente'] for l in ingresos), CERO),
+            'gastos': sum((l['pagado'] for l in gastos), CERO),
+            'gastos_pendientes': sum((l['pendiente'] for l in gastos), CERO),
+        }
+        fila['neto'] = fila['cobrado'] - fila['gastos']
+        datos['inmuebles'].append(fila)
+        for campo in ('cobrado', 'pendiente_cobro', 'gastos', 'gastos_pendientes', 'neto'):
+            datos[campo] += fila[campo]
+    return resultado
+
+
+def huella(datos, formato):
+    """SHA-256 de todo lo que decide el resultado: los datos, la plantilla y el formato."""
+    h = hashlib.sha256()
+    h.update(json.dumps(datos, sort_keys=True, default=str).encode())
+    h.update(get_template(PLANTILLA).template.source.encode())
+    h.update(formato.encode())
+    return h.hexdigest()
+
+
+def nombre(datos, formato):
+    h = huella(datos, formato)
+    return posixpath.join(DIRECTORIO, h[:2], f'{h}.{formato}')
+
+
+def nombre_descarga(datos, formato):
+    return f"liquidacion_{datos['periodo']}_{datos['propietario']['dni']}.{formato}"
+
+
+def _weasyprint():
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError):  # OSError: faltan las bibliotecas del sistema (pango...)
+        raise NoDisponible('WeasyPrint no está instalado')
+    return HTML
+
+
+def pdf_disponible():
+    try:
+        _weasyprint()
+    except NoDisponible:
+        return False
+    return True
+
+
+def renderizar(datos, formato='html'):
+    html = render_to_string(PLANTILLA, {'l': datos})
+    if formato == 'html':
+        return html.encode()
+    return _weasyprint()(string=html).write_pdf()
+
+
+def _renderizar_lote(lote):
+    # en el proceso del pool: sin BD, solo plantillas; el padre guarda los ficheros
+    return [(n, renderizar(datos, formato)) for n, datos, formato in lote]
+
+
+def guardar(n, contenido):
+    if not default_storage.exists(n):  # otra pasada pudo guardarla entre medias: es la misma
+        default_storage.save(n, ContentFile(contenido))
+
+
+def obtener(datos, formato='html'):
+    """Nombre en default_storage de la liquidación, renderizándola si no estaba."""
+    n = nombre(datos, formato)
+    if not default_storage.exists(n):
+        guardar(n, renderizar(datos, formato))
+    return n
+
+
+def generar(periodo, formatos=('html',), procesos=None, progreso=None):
+    """
+    Deja renderizadas las liquidaciones de todos los propietarios para el mes.
+    Solo se renderizan las que no estaban (por huella); con más de un lote se
+    reparten en `procesos` procesos (0 = en este; por defecto uno por CPU si
+    hay PDF, que es lo caro). `progreso(hechas, total)`
+    tras cada lote. Devuelve {'total', 'renderizadas', 'sin_cambios'}.
+    """
+    for formato in formatos:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato}")
+    todas = calcular(periodo)
+    trabajos = []
+    for datos in todas.values():
+        for formato in formatos:
+            n = nombre(datos, formato)
+            if not default_storage.exists(n):
+                trabajos.append((n, datos, formato))
+    total = len(todas) * len(formatos)
+    resultado = {'total': total, 'renderizadas': len(trabajos), 'sin_cambios': total - len(trabajos)}
+    lotes = [trabajos[i:i + LOTE] for i in range(0, len(trabajos), LOTE)]
+    if procesos is None:
+        # el HTML se renderiza en milisegundos: arrancar el pool cuesta más que lo que ahorra
+        procesos = (os.cpu_count() or 2) if 'pdf' in formatos else 0
+
+    def guardar_lote(hechas, renderizadas):
+        for n, contenido in renderizadas:
+            guardar(n, contenido)
+        if progreso:
+            progreso(hechas, len(trabajos))
+
+    if procesos <= 0 or len(lotes) < 2:
+        hechas = 0
+        for lote in lotes:
+            hechas += len(lote)
+            guardar_lote(hechas, _renderizar_lote(lote))
+    else:
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(min(procesos, len(lotes)), mp_context=contexto,
+                                 initializer=django.setup) as pool:
+            hechas = 0
+            for lote, renderizadas in zip(lotes, pool.map(_renderizar_lote, lotes)):
+                hechas += len(lote)
+                guardar_lote(hechas, renderizadas)
+    return resultado
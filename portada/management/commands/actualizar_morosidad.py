@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from portada import morosidad
+
+
+class Command(BaseCommand):
+    help = ("Recalcula la tabla de morosidad (deuda de inquilinos por tramos de antigüedad). "
+            "Pensado para ejecutarse a diario (cron), después de medianoche.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de referencia AAAA-MM-DD (por defecto hoy).")
+
+    def handle(self, *args, **options):
+        fecha = parse_date(options['fecha']) if options['fecha'] else None
+        n = morosidad.reconstruir(fecha)
+        self.stdout.write(self.style.SUCCESS(f"Morosidad recalculada: {n} contrato(s) con deuda."))
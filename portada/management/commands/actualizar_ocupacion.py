@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from portada import ocupacion
+
+
+class Command(BaseCommand):
+    help = "Recalcula Inmueble.contrato_vigente para todo el parque. Pensado para ejecutarse a diario (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de referencia AAAA-MM-DD (por defecto hoy).")
+
+    def handle(self, *args, **options):
+        fecha = parse_date(options['fecha']) if options['fecha'] else None
+        n = ocupacion.actualizar(fecha=fecha)
+        self.stdout.write(self.style.SUCCESS(f"Ocupación actualizada: {n} inmueble(s) cambiados."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from portada import solapes
+
+
+class Command(BaseCommand):
+    help = ("Busca contratos del mismo inmueble que se solapan en el tiempo (toda la tabla, de una pasada) "
+            "y, con --reparar, recorta el anterior hasta la víspera del siguiente.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inmueble', type=int, action='append', help="Solo este inmueble (se puede repetir).")
+        parser.add_argument('--reparar', action='store_true', help="Recorta los contratos solapados.")
+        parser.add_argument('--limite', type=int, default=50, help="Pares a listar como mucho (0 = todos).")
+
+    def handle(self, *args, **options):
+        lista = solapes.buscar(options['inmueble'])
+        if not lista:
+            self.stdout.write(self.style.SUCCESS("Sin solapes."))
+            return
+        limite = options['limite'] or len(lista)
+        for anterior, posterior in lista[:limite]:
+            self.stdout.write(f"inmueble {anterior.inmueble_id}: contrato {anterior.id} "
+                              f"({anterior.inicio}→{anterior.fin or 'abierto'}) y {posterior.id} "
+                              f"({posterior.inicio}→{posterior.fin or 'abierto'})")
+        if len(lista) > limite:
+            self.stdout.write(f"... y {len(lista) - limite} par(es) más.")
+        self.stdout.write(f"{len(lista)} par(es) solapado(s) en "
+                          f"{len({a.inmueble_id for a, _ in lista})} inmueble(s).")
+        if not options['reparar']:
+            return
+        recortados, sin_reparar = solapes.reparar(lista)
+        self.stdout.write(self.style.SUCCESS(f"Recortado(s) {recortados} contrato(s)."))
+        for anterior, posterior in sin_reparar:
+            self.stdout.write(self.style.WARNING(
+                f"Empiezan el mismo día, revisar a mano: contratos {anterior.id} y {posterior.id} "
+                f"(inmueble {anterior.inmueble_id})."))
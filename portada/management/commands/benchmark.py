@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portada import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Mide p50/p95/p99 y nº de consultas de listados, altas y admin sobre la BD actual; "
+            "guarda el informe en JSON y lo compara con una línea base.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=2, help="Peticiones previas sin medir.")
+        parser.add_argument('--en-frio', action='store_true', help="Vacía la caché antes de cada petición.")
+        parser.add_argument('--solo', help="Solo los casos cuyo nombre contenga este texto.")
+        parser.add_argument('--usuario', help="Usuario con el que se navega (por defecto el primer superusuario).")
+        parser.add_argument('--salida', help="Fichero JSON donde guardar el informe.")
+        parser.add_argument('--comparar', help="Informe JSON de referencia.")
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help="Margen sobre el p95 de referencia antes de contar regresión (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        casos = [c for c in benchmark.CASOS if not options['solo'] or options['solo'] in c[0]]
+        if not casos:
+            raise CommandError(f"Ningún caso coincide con '{options['solo']}'")
+
+        def progreso(nombre, r):
+            if options['verbosity'] >= 1:
+                self.stderr.write(f"{nombre:38} p50 {r['p50_ms']:>9} · p95 {r['p95_ms']:>9} · "
+                                  f"p99 {r['p99_ms']:>9} ms · {r['consultas']:>3} consultas")
+
+        informe = benchmark.ejecutar(options['repeticiones'], options['calentamiento'], casos,
+                                     options['usuario'], progreso, en_frio=options['en_frio'])
+        if options['salida']:
+            benchmark.guardar(informe, options['salida'])
+        else:
+            self.stdout.write(json.dumps(informe, ensure_ascii=False, indent=2))
+
+        if options['comparar']:
+            regresiones = benchmark.comparar(informe, benchmark.cargar(options['comparar']), options['tolerancia'])
+            for r in regresiones:
+                self.stderr.write(self.style.ERROR(r))
+            if regresiones:
+                raise CommandError(f"{len(regresiones)} regresión(es) frente a {options['comparar']}")
+            self.stderr.write(self.style.SUCCESS("Sin regresiones frente a la referencia."))
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from portada import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Compara el rendimiento con peticiones concurrentes a los listados servidos por WSGI "
+            "(vistas síncronas) y por ASGI (vistas async). Cada modo corre en su propio proceso.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200)
+        parser.add_argument('--concurrencia', type=int, default=10, help="Peticiones en curso a la vez.")
+        parser.add_argument('--en-frio', action='store_true',
+                            help="Sin caché: conteos, totales y tipos se consultan en cada petición.")
+        parser.add_argument('--usuario', help="Usuario con el que se navega (por defecto el primer superusuario).")
+        parser.add_argument('--modo', choices=['wsgi', 'asgi'],
+                            help="Mide solo este modo en el proceso actual (uso interno).")
+        parser.add_argument('--salida', help="Fichero JSON donde guardar el informe.")
+
+    def handle(self, *args, **options):
+        if options['modo']:
+            asincrono = options['modo'] == 'asgi'
+            if settings.VISTAS_ASYNC != asincrono:
+                raise CommandError(f"--modo {options['modo']} necesita DJANGO_VISTAS_ASYNC={int(asincrono)}")
+            informe = benchmark.carga(options['modo'], options['peticiones'], options['concurrencia'],
+                                      usuario=options['usuario'], en_frio=options['en_frio'])
+            self.stdout.write(json.dumps(informe))
+            return
+
+        informe = {'urls': benchmark.URLS_CARGA}
+        for modo in ('wsgi', 'asgi'):
+            informe[modo] = self.medir_en_proceso(modo, options)
+            r = informe[modo]
+            self.stderr.write(f"{modo}: {r['peticiones_s']:>8} peticiones/s · p50 {r['p50_ms']:>8} · "
+                              f"p95 {r['p95_ms']:>8} ms · estados {r['estados']}")
+        informe['aceleracion'] = round(informe['asgi']['peticiones_s'] / informe['wsgi']['peticiones_s'], 2)
+        self.stderr.write(f"ASGI / WSGI: x{informe['aceleracion']}")
+        if options['salida']:
+            benchmark.guardar(informe, options['salida'])
+        else:
+            self.stdout.write(json.dumps(informe, ensure_ascii=False, indent=2))
+
+    def medir_en_proceso(self, modo, options):
+        # las vistas se eligen al importar las urls: cada modo necesita un proceso limpio
+        orden = [sys.executable, '-m', 'django', 'benchmark_concurrencia', '--modo', modo,
+                 '--peticiones', str(options['peticiones']), '--concurrencia', str(options['concurrencia'])]
+        if options['usuario']:
+            orden += ['--usuario', options['usuario']]
+        if options['en_frio']:
+            orden.append('--en-frio')
+        entorno = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'DJANGO_VISTAS_ASYNC': '1' if modo == 'asgi' else '0',
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+        proceso = subprocess.run(orden, env=entorno, capture_output=True, text=True)
+        if proceso.returncode:
+            raise CommandError(f"Falló la medición {modo}:\n{proceso.stderr}")
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portada import sintetico
+from portada.models import Inmueble, Propietario
+
+
+class Command(BaseCommand):
+    help = ("Genera una cartera sintética determinista para pruebas de rendimiento "
+            "(por defecto 10k propietarios, 50k inmuebles, 100k contratos y 2M pagos).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factor', type=float, default=1.0,
+                            help="Multiplica los tamaños por defecto (p. ej. 0.01 para una cartera pequeña).")
+        for clave in sintetico.TAMANOS:
+            parser.add_argument(f'--{clave}', type=int, help=f"Nº de {clave} (anula --factor).")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--chunk', type=int, default=5000, help="Filas por bulk_create.")
+        parser.add_argument('--borrar', action='store_true', help="Vacía antes la cartera existente.")
+
+    def handle(self, *args, **options):
+        if options['borrar']:
+            sintetico.vaciar()
+        elif Propietario.objects.exists() or Inmueble.objects.exists():
+            raise CommandError("La BD ya tiene datos; usa --borrar para vaciarla antes.")
+
+        tamanos = sintetico.tamanos(options['factor'], **{k: options[k] for k in sintetico.TAMANOS})
+        avisar = self.stdout.write if options['verbosity'] >= 1 else None
+        creados = sintetico.generar(semilla=options['semilla'], chunk_size=options['chunk'],
+                                    progreso=avisar, **tamanos)
+        self.stdout.write(self.style.SUCCESS(', '.join(f"{v} {k}" for k, v in creados.items())))
@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portada import liquidaciones
+
+
+class Command(BaseCommand):
+    help = ("Genera las liquidaciones de un mes para todos los propietarios en un pool de procesos. "
+            "Las que no han cambiado desde la última vez no se vuelven a renderizar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help="Mes a liquidar, AAAA-MM (por defecto el anterior).")
+        parser.add_argument('--formato', nargs='+', default=['html', 'pdf'], choices=sorted(liquidaciones.FORMATOS))
+        parser.add_argument('--procesos', type=int, default=None,
+                            help="Procesos para renderizar (por defecto uno por CPU con PDF; 0 = en este).")
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                periodo = datetime.datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--mes debe tener el formato AAAA-MM")
+        else:
+            periodo = liquidaciones.mes_anterior()
+        try:
+            res = liquidaciones.generar(periodo, options['formato'], procesos=options['procesos'])
+        except liquidaciones.NoDisponible as e:
+            raise CommandError(f"{e}; usa --formato html")
+        self.stdout.write(self.style.SUCCESS(
+            f"{periodo:%m/%Y}: {res['total']} liquidación(es), {res['renderizadas']} renderizada(s), "
+            f"{res['sin_cambios']} sin cambios."
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portada import previsualizacion
+
+
+class Command(BaseCommand):
+    help = ("Genera las miniaturas de los documentos que aún no la tienen (una por contenido). "
+            "Pensado para cron o para dejarlo corriendo con --intervalo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, help="Máximo de ficheros por pasada.")
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help="Repite cada N segundos en vez de terminar tras la primera pasada.")
+
+    def handle(self, *args, **options):
+        while True:
+            hechas, fallidas = previsualizacion.generar_pendientes(options['limite'])
+            if hechas or fallidas or not options['intervalo']:
+                self.stdout.write(f"{hechas} miniatura(s) generada(s), {fallidas} sin miniatura.")
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,46 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portada import rentas
+from portada.models import TipoPago
+
+
+class Command(BaseCommand):
+    help = "Genera los pagos de renta de un mes para todos los contratos vigentes (idempotente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help="Mes a generar, AAAA-MM (por defecto el actual).")
+        parser.add_argument('--tipo', default='Renta', help="Id o nombre del TipoPago a usar (por defecto 'Renta').")
+        parser.add_argument('--chunk', type=int, default=1000, help="Contratos por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo muestra lo que se crearía.")
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                periodo = datetime.datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--mes debe tener el formato AAAA-MM")
+        else:
+            periodo = timezone.localdate().replace(day=1)
+
+        tipo_arg = options['tipo']
+        try:
+            if tipo_arg.isdigit():
+                tipo = TipoPago.objects.get(pk=int(tipo_arg))
+            else:
+                tipo = TipoPago.objects.get(nombre__iexact=tipo_arg)
+        except (TipoPago.DoesNotExist, TipoPago.MultipleObjectsReturned):
+            raise CommandError(f"No hay un único TipoPago '{tipo_arg}'")
+
+        res = rentas.generar(periodo, tipo, chunk_size=options['chunk'], dry_run=options['dry_run'])
+        if options['verbosity'] >= 2:
+            for contrato_id, inmueble_id, precio in res['nuevos']:
+                self.stdout.write(f"+ contrato {contrato_id} · inmueble {inmueble_id} · {precio}€")
+        resumen = (f"{res['periodo']:%m/%Y} · {tipo}: {len(res['nuevos'])} nuevo(s), "
+                   f"{res['existentes']} ya generado(s)")
+        if options['dry_run']:
+            self.stdout.write(f"[dry-run] {resumen}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{resumen}; creados {res['creados']}."))
@@ -0,0 +1,29 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from portada import importacion
+
+
+class Command(BaseCommand):
+    help = "Importa propietarios, inquilinos, inmuebles o contratos desde un CSV con cabecera."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(importacion.IMPORTADORES))
+        parser.add_argument('fichero')
+        parser.add_argument('--chunk', type=int, default=2000, help="Filas por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo valida, no guarda nada.")
+
+    def handle(self, *args, **options):
+        with open(options['fichero'], encoding='utf-8-sig', newline='') as f:
+            try:
+                res = importacion.importar(
+                    options['tipo'], f, dry_run=options['dry_run'], chunk_size=options['chunk']
+                )
+            except ValidationError as e:
+                raise CommandError(' '.join(e.messages))
+        for linea, mensaje in res['errores']:
+            self.stderr.write(f"línea {linea}: {mensaje}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{res['total']} fila(s): {res['validas']} válidas, {len(res['errores'])} con errores, "
+            f"{res['creados']} creadas."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from portada import resumen
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero la tabla ResumenPago (totales mensuales de pagos)."
+
+    def handle(self, *args, **options):
+        n = resumen.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Resumen reconstruido: {n} fila(s)."))
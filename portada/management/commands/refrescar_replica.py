@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from portada import replica
+
+
+class Command(BaseCommand):
+    help = ("Copia la BD SQLite principal sobre la réplica local (API de backup de SQLite, sin "
+            "bloquear a los escritores) y la sustituye de forma atómica. Pensado para cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destino', help="Fichero de la réplica (por defecto el NAME de la BD 'replica').")
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help="Repite cada N segundos en vez de terminar tras la primera copia.")
+
+    def handle(self, *args, **options):
+        principal = connections['default']
+        if principal.vendor != 'sqlite':
+            raise CommandError("Solo para SQLite: con PostgreSQL la réplica la mantiene la replicación del servidor.")
+        destino = options['destino'] or (replica.configurada() and str(connections[replica.ALIAS].settings_dict['NAME']))
+        if not destino:
+            raise CommandError("No hay BD 'replica' configurada; indica --destino.")
+
+        while True:
+            inicio = time.perf_counter()
+            self.copiar(principal, destino)
+            replica.refrescada()
+            self.stdout.write(f"Réplica {destino} refrescada en {time.perf_counter() - inicio:.1f} s")
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
+
+    def copiar(self, principal, destino):
+        temporal = f'{destino}.tmp'
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        principal.ensure_connection()
+        copia = sqlite3.connect(temporal)
+        try:
+            principal.connection.backup(copia)  # de una vez: una instantánea coherente
+            # sin WAL: los lectores de la réplica no crean -wal/-shm que sobrevivan al reemplazo
+            copia.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            copia.close()
+        os.replace(temporal, destino)
+        # una conexión abierta sigue leyendo el fichero sustituido (su inodo) mientras viva, y con
+        # CONN_MAX_AGE viven minutos: aquí se cierra la de este proceso; las de los servidores las
+        # cierra replica.al_dia() al ver el refresco en la marca
+        if replica.configurada():
+            connections[replica.ALIAS].close()
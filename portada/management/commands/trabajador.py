@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from portada import tareas
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta las tareas en cola (portada/tareas.py) en un pool de procesos. Pensado para "
+            "dejarlo corriendo junto a la web (systemd, supervisor...); SIGTERM termina lo que está en marcha.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 2,
+                            help="Tareas a la vez (0 = en este mismo proceso, una detrás de otra).")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre consultas a la cola vacía.")
+        parser.add_argument('--una-vez', action='store_true', help="Termina cuando la cola se queda vacía.")
+
+    def handle(self, *args, **options):
+        tareas.cargar()
+        self.verbosity = options['verbosity']
+        self.nombre = f'{socket.gethostname()}:{os.getpid()}'
+        self.parar = False
+        anterior = signal.signal(signal.SIGTERM, self.al_parar)
+        try:
+            if options['procesos'] <= 0:
+                self.en_linea(options)
+            else:
+                self.con_pool(options)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, anterior)
+        self.stdout.write("Trabajador detenido.")
+
+    def al_parar(self, signum, frame):
+        self.parar = True
+
+    def informar(self, pk, estado):
+        if self.verbosity >= 1:
+            self.stdout.write(f"Tarea {pk}: {estado}")
+
+    def cola(self, funcion, *args):
+        # con SQLite sin WAL una tarea que escribe mucho bloquea la BD un rato: se reintenta en la siguiente vuelta
+        try:
+            return funcion(*args)
+        except OperationalError as e:
+            self.stderr.write(f"Cola no disponible ({e}); se reintenta.")
+            return None
+
+    def en_linea(self, options):
+        while not self.parar:
+            tareas.recuperar_huerfanas()
+            pk = tareas.reclamar(self.nombre)
+            if pk is not None:
+                self.informar(pk, tareas.ejecutar(pk))
+            elif options['una_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
+
+    def con_pool(self, options):
+        procesos = options['procesos']
+        connections.close_all()  # nada de conexiones abiertas compartidas con los hijos
+        # 'spawn': procesos limpios; django.setup() como inicializador antes de recibir tareas
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(procesos, mp_context=contexto, initializer=django.setup) as pool:
+            en_marcha = {}
+            while True:
+                if not self.parar:
+                    self.cola(tareas.recuperar_huerfanas)
+                    while len(en_marcha) < procesos:
+                        pk = self.cola(tareas.reclamar, self.nombre)
+                        if pk is None:
+                            break
+                        en_marcha[pool.submit(tareas.ejecutar, pk)] = pk
+                if not en_marcha:
+                    if self.parar or options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                self.cola(tareas.latir, en_marcha.values())
+                hechas, _ = wait(en_marcha, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                for futuro in hechas:
+                    pk = en_marcha.pop(futuro)
+                    try:
+                        self.informar(pk, futuro.result())
+                    except Exception as e:  # el proceso hijo murió (memoria, señal...)
+                        self.cola(tareas.fallo_externo, pk, f"El proceso de la tarea terminó de forma anómala: {e!r}")
+                        self.informar(pk, 'error del proceso')
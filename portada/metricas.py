@@ -0,0 +1,77 @@
+# portada/metricas.py
+# Métricas por vista (latencia, nº de consultas, tiempo SQL) en memoria del proceso
+# y su exposición en formato Prometheus. Las alimenta portada.middleware.MetricasMiddleware.
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+MUESTRAS_LENTAS = 20  # consultas lentas que se guardan por vista
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.cuentas = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.suma = 0
+        self.n = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.n += 1
+
+    def lineas(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, cuenta in zip(self.buckets + ('+Inf',), self.cuentas):
+            acumulado += cuenta
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_sum{{{etiquetas}}} {self.suma:.6f}'
+        yield f'{nombre}_count{{{etiquetas}}} {self.n}'
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.latencia = defaultdict(lambda: Histograma(BUCKETS_SEGUNDOS))
+            self.sql = defaultdict(lambda: Histograma(BUCKETS_SEGUNDOS))
+            self.consultas = defaultdict(lambda: Histograma(BUCKETS_CONSULTAS))
+            self.duplicadas = defaultdict(int)
+            self.lentas = defaultdict(lambda: deque(maxlen=MUESTRAS_LENTAS))
+
+    def registrar(self, vista, segundos, n_consultas, segundos_sql, duplicadas=0, lentas=()):
+        with self._lock:
+            self.latencia[vista].observar(segundos)
+            self.sql[vista].observar(segundos_sql)
+            self.consultas[vista].observar(n_consultas)
+            self.duplicadas[vista] += duplicadas
+            self.lentas[vista].extend(lentas)
+
+    def prometheus(self):
+        with self._lock:
+            salida = []
+            for nombre, ayuda, datos in (
+                ('portada_peticion_segundos', 'Latencia de la petición por vista', self.latencia),
+                ('portada_sql_segundos', 'Tiempo total en SQL por petición', self.sql),
+                ('portada_consultas', 'Consultas SQL por petición', self.consultas),
+            ):
+                salida += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+                for vista, histograma in sorted(datos.items()):
+                    salida += histograma.lineas(nombre, f'vista="{vista}"')
+            salida += ['# HELP portada_consultas_duplicadas_total Consultas repetidas con los mismos parámetros',
+                       '# TYPE portada_consultas_duplicadas_total counter']
+            salida += [f'portada_consultas_duplicadas_total{{vista="{v}"}} {n}'
+                       for v, n in sorted(self.duplicadas.items())]
+            return '\n'.join(salida) + '\n'
+
+    def muestras_lentas(self):
+        with self._lock:
+            return {vista: list(muestras) for vista, muestras in self.lentas.items() if muestras}
+
+
+registro = Registro()
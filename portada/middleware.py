@@ -0,0 +1,254 @@
+# portada/middleware.py
+import fnmatch
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse
+
+from . import auditoria, replica
+from .metricas import registro
+
+logger = logging.getLogger('portada.metricas')
+
+# medidor de la petición en curso; es una ContextVar para que cuente también
+# las consultas que una vista async lanza en otros hilos (sync_to_async copia el contexto)
+_medidor = ContextVar('medidor', default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    medidor = _medidor.get()
+    if medidor is None:
+        return execute(sql, params, many, context)
+    return medidor(execute, sql, params, many, context)
+
+
+def _instalar(connection, **kwargs):
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+connection_created.connect(_instalar)
+
+
+class _Medidor:
+    """execute_wrapper que cuenta y cronometra cada consulta de la petición."""
+
+    def __init__(self, umbral_lenta):
+        self.umbral_lenta = umbral_lenta
+        self.n = 0
+        self.segundos = 0.0
+        self.repetidas = Counter()
+        self.lentas = []
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self.lock:
+                self._anotar(sql, params, duracion)
+
+    def _anotar(self, sql, params, duracion):
+        self.n += 1
+        self.segundos += duracion
+        clave = (sql, repr(params)[:500])
+        self.repetidas[clave] += 1
+        if duracion >= self.umbral_lenta:
+            self.lentas.append({'sql': sql[:2000], 'params': clave[1], 'ms': round(duracion * 1000, 2)})
+
+    @property
+    def duplicadas(self):
+        return sum(n - 1 for n in self.repetidas.values() if n > 1)
+
+
+def _medir_cuerpo(contenido, medidor):
+    iterador = iter(contenido)
+    while True:
+        token = _medidor.set(medidor)
+        try:
+            trozo = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _medidor.reset(token)
+        yield trozo
+
+
+async def _medir_acuerpo(contenido, medidor):
+    iterador = aiter(contenido)
+    while True:
+        token = _medidor.set(medidor)
+        try:
+            trozo = await anext(iterador)
+        except StopAsyncIteration:
+            return
+        finally:
+            _medidor.reset(token)
+        yield trozo
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición por vista resuelta (p. ej. 'pagos:lista'): latencia,
+    nº de consultas, tiempo SQL, consultas duplicadas y muestras de consultas
+    lentas. Lo acumula en portada.metricas.registro y escribe una línea JSON
+    en el logger 'portada.metricas'. Las respuestas en streaming se miden
+    hasta que se acaba de enviar el cuerpo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral_lenta = getattr(settings, 'METRICAS_CONSULTA_LENTA_MS', 100) / 1000
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+        for alias in connections:
+            _instalar(connections[alias])  # las ya abiertas no pasan por connection_created
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        medidor = _Medidor(self.umbral_lenta)
+        token = _medidor.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medidor.reset(token)
+        self.terminar(request, response, medidor, inicio)
+        return response
+
+    async def __acall__(self, request):
+        medidor = _Medidor(self.umbral_lenta)
+        token = _medidor.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medidor.reset(token)
+        self.terminar(request, response, medidor, inicio)
+        return response
+
+    def terminar(self, request, response, medidor, inicio):
+        if not response.streaming:
+            self.anotar(request, response, medidor, time.perf_counter() - inicio)
+            return
+        # el cuerpo en streaming hace sus consultas cuando el servidor lo recorre, ya fuera
+        # de __call__: se miden trozo a trozo y la petición se anota al cerrarla. Los
+        # FileResponse no consultan y se dejan tal cual para no perder wsgi.file_wrapper.
+        if not isinstance(response, FileResponse):
+            medir = _medir_acuerpo if response.is_async else _medir_cuerpo
+            response.streaming_content = medir(response.streaming_content, medidor)
+        response._resource_closers.append(
+            lambda: self.anotar(request, response, medidor, time.perf_counter() - inicio))
+
+    def anotar(self, request, response, medidor, segundos):
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else 'sin_resolver'
+        registro.registrar(vista, segundos, medidor.n, medidor.segundos, medidor.duplicadas, medidor.lentas)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'ts': round(time.time(), 3),
+                'vista': vista,
+                'metodo': request.method,
+                'estado': response.status_code,
+                'ms': round(segundos * 1000, 2),
+                'consultas': medidor.n,
+                'sql_ms': round(medidor.segundos * 1000, 2),
+                'duplicadas': medidor.duplicadas,
+                'lentas': medidor.lentas,
+            }, default=str))
+
+
+class ReplicaMiddleware:
+    """
+    Manda a la réplica (portada/replica.py) las lecturas de las vistas GET
+    cuyo nombre casa con algún patrón de settings.REPLICA_VISTAS. Tras una
+    escritura, el navegador lee de la principal durante REPLICA_RETRASO_MAX
+    segundos para ver sus propios cambios. En las respuestas en streaming la
+    réplica sigue activa hasta que se cierra la respuesta: el cuerpo se lee
+    al enviarlo.
+    """
+    cookie = 'leer_principal'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.vistas = getattr(settings, 'REPLICA_VISTAS', ())
+        self.retraso = getattr(settings, 'REPLICA_RETRASO_MAX', 60)
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD') and replica.configurada() and self.cookie not in request.COOKIES
+                and any(fnmatch.fnmatchcase(request.resolver_match.view_name, p) for p in self.vistas)):
+            replica.al_dia()
+            replica.activar()
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            replica.desactivar()  # el hilo atiende después otras peticiones
+            raise
+        return self.marcar(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            replica.desactivar()
+            raise
+        return self.marcar(request, response)
+
+    def marcar(self, request, response):
+        if response.streaming:
+            response._resource_closers.append(replica.desactivar)
+        else:
+            replica.desactivar()
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(self.cookie, '1', max_age=self.retraso, httponly=True, samesite='Lax')
+        return response
+
+
+class AuditoriaMiddleware:
+    """
+    Deja la petición a mano de portada/auditoria.py para saber quién hace
+    cada cambio. Va detrás de AuthenticationMiddleware; request.user se
+    resuelve solo si la petición cambia algo auditado.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        with auditoria.como(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with auditoria.como(request):
+            return await self.get_response(request)
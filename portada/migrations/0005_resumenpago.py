@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def rellenar_resumen(apps, schema_editor):
+    # lo mismo que resumen.reconstruir(), con los modelos de este punto de la historia
+    Pago = apps.get_model('portada', 'Pago')
+    ResumenPago = apps.get_model('portada', 'ResumenPago')
+    grupos = (
+        Pago.objects.annotate(mes=TruncMonth('fecha'))
+        .values('inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes')
+        .annotate(suma=Sum('total'), n=Count('id'))
+        .order_by()
+    )
+    ResumenPago.objects.bulk_create([
+        ResumenPago(inmueble_id=g['inmueble_id'], tipo_id=g['tipo_id'], quien_paga=g['quien_paga'],
+                    pagado=g['pagado'], mes=g['mes'], total=g['suma'], num=g['n'])
+        for g in grupos.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0004_propietario_direccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quien_paga', models.CharField(choices=[('inquilino', 'Inquilino'), ('propietario', 'Propietario')], max_length=20)),
+                ('pagado', models.BooleanField()),
+                ('mes', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num', models.PositiveIntegerField(default=0)),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_pago', to='portada.inmueble')),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_pago', to='portada.tipopago')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('inmueble', 'tipo', 'quien_paga', 'pagado', 'mes'), name='resumenpago_unico')],
+            },
+        ),
+        migrations.RunPython(rellenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0005_resumenpago'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['inmueble', 'fecha_inicio', 'fecha_fin'], name='contrato_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['direccion', 'id'], name='inmueble_direccion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['metros', 'id'], name='inmueble_metros_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['habitaciones', 'id'], name='inmueble_habitaciones_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['tipo', 'direccion'], name='inmueble_tipo_direccion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha', 'id'], name='pago_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['total', 'id'], name='pago_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['pagado', 'fecha'], name='pago_pagado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['quien_paga', 'fecha'], name='pago_quien_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['inmueble', 'fecha'], name='pago_inmueble_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['tipo', 'fecha'], name='pago_tipo_fecha_idx'),
+        ),
+    ]
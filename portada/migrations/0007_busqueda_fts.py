@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def instalar(apps, schema_editor):
+    from portada import busqueda
+    busqueda.instalar(schema_editor.connection)
+
+
+def desinstalar(apps, schema_editor):
+    from portada import busqueda
+    busqueda.desinstalar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0006_indices_listados'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, desinstalar),
+    ]
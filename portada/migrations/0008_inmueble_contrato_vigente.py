@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def rellenar_contrato_vigente(apps, schema_editor):
+    Contrato = apps.get_model('portada', 'Contrato')
+    Inmueble = apps.get_model('portada', 'Inmueble')
+    hoy = timezone.localdate()
+    vigentes = {}
+    qs = Contrato.objects.filter(fecha_inicio__lte=hoy).filter(Q(fecha_fin__gte=hoy) | Q(fecha_fin__isnull=True))
+    for inmueble_id, contrato_id in qs.order_by('inmueble_id', 'fecha_inicio', 'id').values_list('inmueble_id', 'id'):
+        vigentes[inmueble_id] = contrato_id
+    Inmueble.objects.bulk_update(
+        [Inmueble(id=i, contrato_vigente_id=c) for i, c in vigentes.items()], ['contrato_vigente'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0007_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='contrato_vigente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='portada.contrato'),
+        ),
+        migrations.RunPython(rellenar_contrato_vigente, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0008_inmueble_contrato_vigente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propietario',
+            index=models.Index(fields=['nombre', 'id'], name='propietario_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:46
+
+import os
+
+import portada.almacen
+from django.db import migrations, models
+
+
+def mover_al_almacen(apps, schema_editor):
+    # los ficheros subidos antes pasan a su nombre por contenido (los repetidos se unifican)
+    Documento = apps.get_model('portada', 'Documento')
+    almacen = portada.almacen.de_documentos()
+    for doc in Documento.objects.exclude(archivo='').iterator():
+        nombre = doc.archivo.name
+        if portada.almacen.direccionado(nombre) or not almacen.exists(nombre):
+            continue
+        with almacen.open(nombre) as f:
+            nuevo = almacen.save(nombre, f)
+        Documento.objects.filter(pk=doc.pk).update(archivo=nuevo, nombre_original=os.path.basename(nombre)[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0009_propietario_nombre_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='nombre_original',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='documento',
+            name='archivo',
+            field=models.FileField(storage=portada.almacen.de_documentos, upload_to='documentos/'),
+        ),
+        migrations.RunPython(mover_al_almacen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0010_documento_almacen_contenido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=60)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('hecha', 'Hecha'), ('fallida', 'Fallida'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20)),
+                ('progreso', models.FloatField(default=0)),
+                ('mensaje', models.CharField(blank=True, max_length=200)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3)),
+                ('cancelar', models.BooleanField(default=False)),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('latido', models.DateTimeField(blank=True, null=True)),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('empezada_en', models.DateTimeField(blank=True, null=True)),
+                ('terminada_en', models.DateTimeField(blank=True, null=True)),
+                ('creada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tareas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='tarea_cola_idx'), models.Index(fields=['creada_por', '-creada_en'], name='tarea_usuario_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import datetime
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def rellenar_morosidad(apps, schema_editor):
+    # lo mismo que morosidad.reconstruir() a hoy, con los modelos de este punto de la historia
+    Pago = apps.get_model('portada', 'Pago')
+    Morosidad = apps.get_model('portada', 'Morosidad')
+    al = timezone.localdate()
+    d30, d60, d90 = (al - datetime.timedelta(days=n) for n in (30, 60, 90))
+    filtros = {
+        'tramo_0_30': Q(fecha__gte=d30),
+        'tramo_31_60': Q(fecha__gte=d60, fecha__lt=d30),
+        'tramo_61_90': Q(fecha__gte=d90, fecha__lt=d60),
+        'tramo_90': Q(fecha__lt=d90),
+    }
+    grupos = (
+        Pago.objects.filter(pagado=False, quien_paga='inquilino', fecha__lte=al)
+        .values('inmueble_id', 'contrato_id', 'inmueble__propietario_id')
+        .annotate(**{campo: Sum('total', filter=f) for campo, f in filtros.items()}, suma=Sum('total'), n=Count('id'))
+        .order_by()
+    )
+    Morosidad.objects.bulk_create([
+        Morosidad(inmueble_id=g['inmueble_id'], contrato_id=g['contrato_id'],
+                  propietario_id=g['inmueble__propietario_id'], al=al, total=g['suma'], num=g['n'],
+                  **{campo: g[campo] or Decimal('0.00') for campo in filtros})
+        for g in grupos.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0011_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Morosidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('al', models.DateField()),
+                ('tramo_0_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tramo_31_60', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tramo_61_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tramo_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num', models.PositiveIntegerField(default=0)),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='morosidad', to='portada.contrato')),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='morosidad', to='portada.inmueble')),
+                ('propietario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='morosidad', to='portada.propietario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-tramo_90'], name='morosidad_tramo90_idx'), models.Index(fields=['-tramo_61_90'], name='morosidad_tramo61_idx'), models.Index(fields=['-total'], name='morosidad_total_idx'), models.Index(fields=['propietario', '-total'], name='morosidad_propietario_idx')],
+                'constraints': [models.UniqueConstraint(fields=('inmueble', 'contrato'), name='morosidad_unica')],
+            },
+        ),
+        migrations.RunPython(rellenar_morosidad, migrations.RunPython.noop),
+    ]
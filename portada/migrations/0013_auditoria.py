@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portada', '0012_morosidad'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Auditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('accion', models.CharField(choices=[('alta', 'Alta'), ('cambio', 'Cambio'), ('baja', 'Baja')], max_length=10)),
+                ('cambios', models.JSONField(default=dict)),
+                ('usuario_nombre', models.CharField(blank=True, max_length=150)),
+                ('en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'objeto_id', '-en'], name='auditoria_objeto_idx'), models.Index(fields=['usuario', '-en'], name='auditoria_usuario_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,11 @@
+import os
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from . import almacen
 
 User = get_user_model()
 
@@ -12,10 +18,19 @@ class Propietario(models.Model):
     direccion = models.CharField(max_length=100, blank = True)
     #codigo postal =
 
+    class Meta:
+        # orden del autocompletado (inmuebles/autocompletar.py)
+        indexes = [
+            models.Index(fields=['nombre', 'id'], name='propietario_nombre_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.dni})"
     
     def num_inmuebles(self):
+        # si viene anotado (p. ej. desde el admin) no hace falta consultar
+        if hasattr(self, '_num_inmuebles'):
+            return self._num_inmuebles
         return self.inmuebles.count()  # ← gracias a related_name en Inmueble
     num_inmuebles.short_description = "Nº inmuebles"
 
@@ -34,10 +49,27 @@ class Inmueble(models.Model):
     metros = models.FloatField()
     habitaciones = models.IntegerField(null=True, blank=True)
     propietario = models.ForeignKey(Propietario, on_delete=models.CASCADE, related_name='inmuebles')
+    # contrato en vigor hoy; lo mantiene portada/ocupacion.py (al guardar contratos y a diario)
+    contrato_vigente = models.ForeignKey(
+        'Contrato', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
+
+    class Meta:
+        # órdenes y filtros de InmuebleList
+        indexes = [
+            models.Index(fields=['direccion', 'id'], name='inmueble_direccion_idx'),
+            models.Index(fields=['metros', 'id'], name='inmueble_metros_idx'),
+            models.Index(fields=['habitaciones', 'id'], name='inmueble_habitaciones_idx'),
+            models.Index(fields=['tipo', 'direccion'], name='inmueble_tipo_direccion_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} · {self.direccion}{self.planta or ''}{self.puerta or ''}".strip()
 
+    @property
+    def alquilado(self):
+        return self.contrato_vigente_id is not None
+
 class Inquilino(models.Model):
     nombre = models.CharField(max_length=100)
     dni = models.CharField(max_length=20, blank=False, unique=True)
@@ -57,9 +89,35 @@ class Contrato(models.Model):
     condiciones = models.TextField(blank=True)
     propietario = models.ForeignKey(Propietario, on_delete=models.CASCADE, related_name='contratos')
 
+    class Meta:
+        # contrato vigente de un inmueble en una fecha (alquilado, PagoCreate)
+        indexes = [
+            models.Index(fields=['inmueble', 'fecha_inicio', 'fecha_fin'], name='contrato_vigencia_idx'),
+        ]
+
     def __str__(self):
         fin = self.fecha_fin.strftime("%Y-%m-%d") if self.fecha_fin else "abierto"
         return f"{self.inmueble} · {self.fecha_inicio:%Y-%m-%d}→{fin}"
+
+    def vigente_en(self, fecha):
+        return self.fecha_inicio <= fecha and (self.fecha_fin is None or self.fecha_fin >= fecha)
+
+    def solapados(self):
+        """Otros contratos del mismo inmueble que coinciden en algún día con este (por contrato_vigencia_idx)."""
+        qs = Contrato.objects.filter(inmueble_id=self.inmueble_id).filter(
+            models.Q(fecha_fin__gte=self.fecha_inicio) | models.Q(fecha_fin__isnull=True))
+        if self.fecha_fin:
+            qs = qs.filter(fecha_inicio__lte=self.fecha_fin)
+        return qs.exclude(pk=self.pk) if self.pk else qs
+
+    def clean(self):
+        # lo llaman los formularios (admin); la importación lo comprueba por lotes (portada/solapes.py)
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin < self.fecha_inicio:
+            raise ValidationError({'fecha_fin': "No puede ser anterior a la fecha de inicio."})
+        if self.inmueble_id and self.fecha_inicio:
+            otro = self.solapados().order_by('fecha_inicio').first()
+            if otro:
+                raise ValidationError(f"Se solapa con otro contrato del mismo inmueble: {otro}.")
     
    
 
@@ -76,11 +134,23 @@ class Incidencia (models.Model):
 class Documento(models.Model):
     inmueble = models.ForeignKey(Inmueble, on_delete=models.CASCADE, related_name='documentos')
     descripcion = models.CharField(max_length=200, blank=True)
-    archivo = models.FileField(upload_to='documentos/')
+    # guardado por contenido (portada/almacen.py): el nombre es el SHA-256
+    archivo = models.FileField(upload_to='documentos/', storage=almacen.de_documentos)
+    nombre_original = models.CharField(max_length=255, blank=True)
     fecha_subida = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.descripcion or self.archivo.name
+        return self.descripcion or self.nombre_original or self.archivo.name
+
+    @property
+    def digest(self):
+        return almacen.digest(self.archivo.name)
+
+    def save(self, *args, **kwargs):
+        if self.archivo and not self.archivo._committed:
+            # subida nueva: el nombre con el que llegó, para descargarlo con él
+            self.nombre_original = os.path.basename(self.archivo.name)[:255]
+        super().save(*args, **kwargs)
 
 class TipoPago(models.Model):
     QUIEN_CHOICES = [
@@ -122,7 +192,139 @@ class Pago(models.Model):
         ('propietario', 'Propietario'),
     ]
     quien_paga = models.CharField(max_length=20 , choices = QUIEN_CHOICES)
-    
+
+    class Meta:
+        # filtros y órdenes de PagoList; el id final desempata la paginación por cursor
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='pago_fecha_idx'),
+            models.Index(fields=['total', 'id'], name='pago_total_idx'),
+            models.Index(fields=['pagado', 'fecha'], name='pago_pagado_fecha_idx'),
+            models.Index(fields=['quien_paga', 'fecha'], name='pago_quien_fecha_idx'),
+            models.Index(fields=['inmueble', 'fecha'], name='pago_inmueble_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha'], name='pago_tipo_fecha_idx'),
+        ]
+
     def __str__(self):
         estado = "Pagado" if self.pagado else "Pendiente"
         return f"{self.tipo} · {self.total}€ · {estado} · {self.fecha:%Y-%m-%d}"
+
+
+class ResumenPago(models.Model):
+    # acumulado mensual de Pago; lo mantienen las señales de portada/signals.py
+    inmueble = models.ForeignKey(Inmueble, on_delete=models.CASCADE, related_name='resumenes_pago')
+    tipo = models.ForeignKey(TipoPago, on_delete=models.CASCADE, related_name='resumenes_pago')
+    quien_paga = models.CharField(max_length=20, choices=Pago.QUIEN_CHOICES)
+    pagado = models.BooleanField()
+    mes = models.DateField()  # primer día del mes
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['inmueble', 'tipo', 'quien_paga', 'pagado', 'mes'], name='resumenpago_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.inmueble_id} · {self.tipo_id} · {self.mes:%Y-%m} · {self.total}€"
+
+
+
+class Morosidad(models.Model):
+    # deuda pendiente de los inquilinos por contrato, en tramos de antigüedad a
+    # fecha `al`; la mantiene portada/morosidad.py (señales de Pago y recálculo diario)
+    inmueble = models.ForeignKey(Inmueble, on_delete=models.CASCADE, related_name='morosidad')
+    contrato = models.ForeignKey(Contrato, null=True, blank=True, on_delete=models.SET_NULL, related_name='morosidad')
+    propietario = models.ForeignKey(Propietario, on_delete=models.CASCADE, related_name='morosidad')
+    al = models.DateField()
+    tramo_0_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tramo_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tramo_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tramo_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inmueble', 'contrato'], name='morosidad_unica'),
+        ]
+        indexes = [
+            # alertas y listados de deudores, de mayor a menor
+            models.Index(fields=['-tramo_90'], name='morosidad_tramo90_idx'),
+            models.Index(fields=['-tramo_61_90'], name='morosidad_tramo61_idx'),
+            models.Index(fields=['-total'], name='morosidad_total_idx'),
+            models.Index(fields=['propietario', '-total'], name='morosidad_propietario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.inmueble_id} · {self.contrato_id or '-'} · {self.total}€ al {self.al:%Y-%m-%d}"
+
+class Tarea(models.Model):
+    # trabajo pesado en segundo plano (portada/tareas.py); lo ejecuta el comando `trabajador`
+    PENDIENTE, EN_CURSO, HECHA, FALLIDA, CANCELADA = 'pendiente', 'en_curso', 'hecha', 'fallida', 'cancelada'
+    ESTADO_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (HECHA, 'Hecha'),
+        (FALLIDA, 'Fallida'),
+        (CANCELADA, 'Cancelada'),
+    ]
+    tipo = models.CharField(max_length=60)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+    progreso = models.FloatField(default=0)  # 0..1
+    mensaje = models.CharField(max_length=200, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    cancelar = models.BooleanField(default=False)  # pedida la cancelación de una en curso
+    trabajador = models.CharField(max_length=100, blank=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # reintentos con espera
+    latido = models.DateTimeField(null=True, blank=True)
+    creada_por = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='tareas')
+    creada_en = models.DateTimeField(auto_now_add=True)
+    empezada_en = models.DateTimeField(null=True, blank=True)
+    terminada_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # la cola: pendientes por orden de llegada
+            models.Index(fields=['estado', 'id'], name='tarea_cola_idx'),
+            models.Index(fields=['creada_por', '-creada_en'], name='tarea_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} · {self.get_estado_display()}"
+
+    @property
+    def terminada(self):
+        return self.estado in (self.HECHA, self.FALLIDA, self.CANCELADA)
+
+
+class Auditoria(models.Model):
+    # registro de cambios de pagos, contratos e inmuebles (portada/auditoria.py); solo se añaden filas
+    ALTA, CAMBIO, BAJA = 'alta', 'cambio', 'baja'
+    ACCION_CHOICES = [
+        (ALTA, 'Alta'),
+        (CAMBIO, 'Cambio'),
+        (BAJA, 'Baja'),
+    ]
+    modelo = models.CharField(max_length=30)  # model_name: 'pago', 'contrato', 'inmueble'
+    objeto_id = models.BigIntegerField()  # sin FK: el historial sobrevive a la baja
+    accion = models.CharField(max_length=10, choices=ACCION_CHOICES)
+    cambios = models.JSONField(default=dict)  # {campo: [antes, después]}
+    usuario = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    usuario_nombre = models.CharField(max_length=150, blank=True)  # por si se borra el usuario
+    en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # historial de un objeto, del más reciente al más antiguo
+            models.Index(fields=['modelo', 'objeto_id', '-en'], name='auditoria_objeto_idx'),
+            models.Index(fields=['usuario', '-en'], name='auditoria_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} · {self.get_accion_display()} · {self.en:%Y-%m-%d %H:%M}"
@@ -0,0 +1,227 @@
+# portada/morosidad.py
+# Antigüedad de la deuda de los inquilinos: lo pendiente (pagado=False,
+# quien_paga='inquilino') por contrato e inmueble, repartido en tramos de
+# 0-30, 31-60, 61-90 y más de 90 días desde la fecha del pago.
+#
+# Se materializa en Morosidad a una fecha de referencia (`al`): reconstruir()
+# la rehace con una sola consulta agrupada sobre Pago y las señales de Pago
+# (portada/signals.py) la mantienen pago a pago con esa misma referencia.
+# Como los tramos se mueven con los días, se rehace a diario fuera de las
+# peticiones (comando actualizar_morosidad o la tarea del mismo nombre); el
+# informe muestra la fecha a la que está calculada.
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Inmueble, Morosidad, Pago
+from .resumen import importe
+
+TRAMOS = ('tramo_0_30', 'tramo_31_60', 'tramo_61_90', 'tramo_90')
+LIMITES = (30, 60, 90)  # último día de cada tramo; el resto, al último
+CERO = Decimal('0.00')
+
+
+def tramo(fecha, al):
+    dias = (al - fecha).days
+    for campo, limite in zip(TRAMOS, LIMITES):
+        if dias <= limite:
+            return campo
+    return TRAMOS[-1]
+
+
+def _campos(pago):
+    # los pagos llegan como instancias o como dicts de values()
+    return pago.get if isinstance(pago, dict) else lambda c: getattr(pago, c)
+
+
+def es_deuda(pago):
+    get = _campos(pago)
+    return not get('pagado') and get('quien_paga') == 'inquilino'
+
+
+def aporte(pago, al):
+    """((inmueble_id, contrato_id), campo del tramo) de un pago (o dict), o None si no es deuda vencida."""
+    if pago is None or not es_deuda(pago):
+        return None
+    get = _campos(pago)
+    fecha = get('fecha')
+    if isinstance(fecha, str):
+        fecha = datetime.date.fromisoformat(fecha)
+    if fecha > al:
+        return None  # aún no ha vencido: entra con el recálculo del día que toque
+    return (get('inmueble_id'), get('contrato_id')), tramo(fecha, al)
+
+
+def referencia():
+    """Fecha a la que está calculada la tabla (None si está vacía)."""
+    return Morosidad.objects.values_list('al', flat=True).first()
+
+
+def _filtro(clave):
+    inmueble_id, contrato_id = clave
+    return {'inmueble_id': inmueble_id, 'contrato_id': contrato_id}
+
+
+def sumar(clave, campo, total, num, al):
+    """Suma (o resta) un importe en el tramo de la fila de un contrato, creándola o borrándola."""
+    total = importe(total)
+    cambios = {campo: F(campo) + total, 'total': F('total') + total, 'num': F('num') + num}
+    with transaction.atomic():
+        filas = Morosidad.objects.filter(**_filtro(clave)).update(**cambios)
+        if not filas and num > 0:
+            propietario_id = Inmueble.objects.values_list('propietario_id', flat=True).get(pk=clave[0])
+            try:
+                with transaction.atomic():
+                    Morosidad.objects.create(**_filtro(clave), propietario_id=propietario_id, al=al,
+                                             total=total, num=num, **{campo: total})
+            except IntegrityError:
+                Morosidad.objects.filter(**_filtro(clave)).update(**cambios)
+        elif num < 0:
+            Morosidad.objects.filter(**_filtro(clave), num__lte=0).delete()
+
+
+def cambio(previo, nuevo):
+    """
+    Lleva a la tabla el cambio de un pago: `previo` (sus campos de antes, o
+    None si es nuevo) y `nuevo` (el pago guardado, o None si se ha borrado).
+    """
+    if not (previo is not None and es_deuda(previo)) and not (nuevo is not None and es_deuda(nuevo)):
+        return  # lo normal al tocar pagos cobrados o del propietario: ni una consulta
+    al = referencia() or timezone.localdate()
+    antes, despues = aporte(previo, al), aporte(nuevo, al)
+    total_antes = importe(_campos(previo)('total')) if antes else CERO
+    if antes and antes == despues:
+        diferencia = importe(nuevo.total) - total_antes
+        if diferencia:
+            sumar(*despues, diferencia, 0, al)
+        return
+    if antes:
+        sumar(*antes, -total_antes, -1, al)
+    if despues:
+        sumar(*despues, nuevo.total, 1, al)
+
+
+def lote(pagos, signo=1, quitar=()):
+    """
+    cambio() para muchos pagos a la vez (bulk_create, acciones masivas): suma
+    (signo=1) o resta (signo=-1) la deuda de `pagos`, y resta la de `quitar`
+    (lo que eran antes), leyendo las filas afectadas con una consulta y
+    escribiendo con bulk_update/bulk_create.
+    """
+    movimientos = [(p, signo) for p in pagos if es_deuda(p)] + [(p, -1) for p in quitar if es_deuda(p)]
+    if not movimientos:
+        return
+    al = referencia() or timezone.localdate()
+    deltas = defaultdict(lambda: dict.fromkeys(TRAMOS + ('total',), CERO) | {'num': 0})
+    for pago, s in movimientos:
+        a = aporte(pago, al)
+        if a is None:
+            continue
+        clave, campo = a
+        total = importe(_campos(pago)('total')) * s
+        deltas[clave][campo] += total
+        deltas[clave]['total'] += total
+        deltas[clave]['num'] += s
+    deltas = {clave: d for clave, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        inmuebles = {i for i, _ in deltas}
+        existentes = {(m.inmueble_id, m.contrato_id): m
+                      for m in Morosidad.objects.filter(inmueble_id__in=inmuebles)}
+        faltan = {i for i, c in deltas if (i, c) not in existentes}
+        duenos = dict(Inmueble.objects.filter(pk__in=faltan).values_list('id', 'propietario_id')) if faltan else {}
+        cambiados, nuevos, vacios = [], [], []
+        for clave, d in deltas.items():
+            fila = existentes.get(clave)
+            if fila is None:
+                if d['num'] > 0:
+                    nuevos.append(Morosidad(**_filtro(clave), propietario_id=duenos[clave[0]], al=al, **d))
+                continue
+            for campo, valor in d.items():
+                setattr(fila, campo, getattr(fila, campo) + valor)
+            (cambiados if fila.num > 0 else vacios).append(fila)
+        # solo los tramos que cambian: cada campo es un CASE con una rama por fila
+        campos = [c for c in TRAMOS if any(d[c] for d in deltas.values())]
+        Morosidad.objects.bulk_update(cambiados, [*campos, 'total', 'num'], batch_size=1000)
+        Morosidad.objects.bulk_create(nuevos, batch_size=1000)
+        if vacios:
+            Morosidad.objects.filter(pk__in=[f.pk for f in vacios]).delete()
+
+
+def reconstruir(al=None, inmueble_ids=None):
+    """
+    Recalcula la tabla (o las filas de unos inmuebles) a fecha `al` con una
+    única consulta agrupada sobre Pago. Devuelve el nº de filas.
+    """
+    al = al or timezone.localdate()
+    desde = {campo: al - datetime.timedelta(days=limite) for campo, limite in zip(TRAMOS, LIMITES)}
+    # de cada tramo: desde el día siguiente al límite del anterior hasta el suyo
+    filtros = {
+        'tramo_0_30': Q(fecha__gte=desde['tramo_0_30']),
+        'tramo_31_60': Q(fecha__gte=desde['tramo_31_60'], fecha__lt=desde['tramo_0_30']),
+        'tramo_61_90': Q(fecha__gte=desde['tramo_61_90'], fecha__lt=desde['tramo_31_60']),
+        'tramo_90': Q(fecha__lt=desde['tramo_61_90']),
+    }
+    pagos = Pago.objects.filter(pagado=False, quien_paga='inquilino', fecha__lte=al)
+    actuales = Morosidad.objects.all()
+    if inmueble_ids is not None:
+        pagos = pagos.filter(inmueble_id__in=inmueble_ids)
+        actuales = actuales.filter(inmueble_id__in=inmueble_ids)
+    grupos = (
+        pagos.values('inmueble_id', 'contrato_id', 'inmueble__propietario_id')
+        .annotate(**{campo: Sum('total', filter=f) for campo, f in filtros.items()},
+                  suma=Sum('total'), n=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        actuales.delete()
+        filas = [
+            Morosidad(
+                inmueble_id=g['inmueble_id'], contrato_id=g['contrato_id'],
+                propietario_id=g['inmueble__propietario_id'], al=al, total=g['suma'], num=g['n'],
+                **{campo: g[campo] or CERO for campo in TRAMOS},
+            )
+            for g in grupos.iterator(chunk_size=2000)
+        ]
+        Morosidad.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+# ----- consultas -----
+
+SUMAS = {campo: Sum(campo) for campo in (*TRAMOS, 'total', 'num')}
+
+
+def por_contrato():
+    return (Morosidad.objects.select_related('inmueble', 'propietario', 'contrato')
+            .prefetch_related('contrato__inquilinos').order_by('-total', 'id'))
+
+
+def por_propietario():
+    return (Morosidad.objects.values('propietario_id', 'propietario__nombre', 'propietario__dni')
+            .annotate(**SUMAS).order_by('-total'))
+
+
+def por_inquilino():
+    # un contrato con dos inquilinos cuenta entera para los dos: los dos responden de ella
+    return (Morosidad.objects.filter(contrato__isnull=False)
+            .values('contrato__inquilinos', 'contrato__inquilinos__nombre', 'contrato__inquilinos__dni')
+            .annotate(**SUMAS).order_by('-total'))
+
+
+def alertas(minimo=0, campo='tramo_90'):
+    """Contratos con más de `minimo` € en un tramo (por defecto, más de 90 días), de mayor a menor."""
+    if campo not in TRAMOS:
+        raise ValueError(f"Tramo desconocido: {campo}")
+    return (Morosidad.objects.filter(**{f'{campo}__gt': minimo}).order_by(f'-{campo}', 'id')
+            .select_related('inmueble', 'propietario'))
+
+
+def totales():
+    return {k: v or 0 for k, v in Morosidad.objects.aggregate(**SUMAS).items()}
@@ -0,0 +1,60 @@
+# portada/ocupacion.py
+# Puntero Inmueble.contrato_vigente: qué contrato está en vigor hoy en cada inmueble
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import versiones
+from .models import Contrato, Inmueble
+
+
+def vigentes_en(fecha):
+    return Contrato.objects.filter(fecha_inicio__lte=fecha).filter(
+        Q(fecha_fin__gte=fecha) | Q(fecha_fin__isnull=True)
+    )
+
+
+def contratos_vigentes(fecha, inmueble_ids=None):
+    """{inmueble_id: contrato_id} de los contratos en vigor en `fecha` (el más reciente si hay varios)."""
+    qs = vigentes_en(fecha)
+    if inmueble_ids is not None:
+        qs = qs.filter(inmueble_id__in=inmueble_ids)
+    vigentes = {}
+    for inmueble_id, contrato_id in qs.order_by('inmueble_id', 'fecha_inicio', 'id').values_list('inmueble_id', 'id'):
+        vigentes[inmueble_id] = contrato_id  # el último de cada inmueble gana
+    return vigentes
+
+
+def actualizar(inmueble_ids=None, fecha=None, batch_size=1000):
+    """
+    Recalcula contrato_vigente para los inmuebles dados (todos si None) y
+    escribe solo los que cambian. Devuelve el nº de inmuebles actualizados.
+    """
+    fecha = fecha or timezone.localdate()
+    if inmueble_ids is not None:
+        inmueble_ids = set(inmueble_ids)
+        if not inmueble_ids:
+            return 0
+    vigentes = contratos_vigentes(fecha, inmueble_ids)
+
+    actuales = Inmueble.objects.all()
+    if inmueble_ids is not None:
+        actuales = actuales.filter(id__in=inmueble_ids)
+
+    cambios = [
+        Inmueble(id=inmueble_id, contrato_vigente_id=vigentes.get(inmueble_id))
+        for inmueble_id, actual in actuales.values_list('id', 'contrato_vigente_id').iterator(chunk_size=5000)
+        if vigentes.get(inmueble_id) != actual
+    ]
+    with transaction.atomic():
+        Inmueble.objects.bulk_update(cambios, ['contrato_vigente'], batch_size=batch_size)
+        if cambios:
+            versiones.invalidar('inmueble')
+    return len(cambios)
+
+
+def contrato_para(inmueble, fecha):
+    """Contrato en vigor de un inmueble en una fecha: el puntero si la cubre, si no una consulta por rango."""
+    if inmueble.contrato_vigente_id and inmueble.contrato_vigente.vigente_en(fecha):
+        return inmueble.contrato_vigente
+    return vigentes_en(fecha).filter(inmueble=inmueble).order_by('-fecha_inicio').first()
@@ -0,0 +1,115 @@
+# portada/previsualizacion.py
+# Miniaturas PNG de los documentos, generadas fuera de la petición (comando
+# generar_previsualizaciones) y guardadas por digest: los Documento que
+# comparten contenido comparten también miniatura, y no se regenera nunca.
+#
+# Imágenes con Pillow y PDF con pdftoppm (poppler-utils), si están instalados.
+# Los tipos sin generador y los ficheros que fallan se marcan como sin
+# miniatura para no reintentarlos en cada pasada.
+import logging
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+
+from . import almacen
+from .models import Documento
+
+logger = logging.getLogger(__name__)
+
+ANCHO = 320
+DIRECTORIO = 'previsualizaciones'
+
+
+class NoDisponible(Exception):
+    """Falta la dependencia opcional para este tipo de fichero."""
+
+
+def _imagen(origen, destino):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise NoDisponible('Pillow no está instalado')
+    with Image.open(origen) as img:
+        img.thumbnail((ANCHO, ANCHO * 2))
+        img.convert('RGB').save(destino, 'PNG')
+
+
+def _pdf(origen, destino):
+    pdftoppm = shutil.which('pdftoppm')
+    if not pdftoppm:
+        raise NoDisponible('pdftoppm no está instalado')
+    # primera página; pdftoppm añade él la extensión .png
+    subprocess.run([pdftoppm, '-png', '-singlefile', '-f', '1', '-l', '1', '-scale-to', str(ANCHO),
+                    origen, os.path.splitext(destino)[0]], check=True, capture_output=True, timeout=60)
+
+
+# extensión -> función (ruta del original, ruta del PNG a escribir)
+GENERADORES = {
+    '.pdf': _pdf,
+    '.png': _imagen, '.jpg': _imagen, '.jpeg': _imagen, '.gif': _imagen, '.webp': _imagen, '.tif': _imagen,
+}
+
+
+def nombre(digest):
+    return posixpath.join(DIRECTORIO, digest[:2], f'{digest}.png')
+
+
+def _marca(digest):
+    # fichero vacío: este contenido no tiene (ni tendrá) miniatura
+    return posixpath.join(DIRECTORIO, digest[:2], f'{digest}.sin')
+
+
+def disponible(documento):
+    return almacen.de_documentos().exists(nombre(documento.digest))
+
+
+def pendientes():
+    """Nombres de fichero (uno por contenido) que aún no tienen miniatura ni marca."""
+    storage = almacen.de_documentos()
+    nombres = Documento.objects.exclude(archivo='').order_by().values_list('archivo', flat=True).distinct()
+    for n in nombres.iterator():
+        d = almacen.digest(n)
+        if not storage.exists(nombre(d)) and not storage.exists(_marca(d)):
+            yield n
+
+
+def generar(nombre_archivo):
+    """Genera la miniatura de un fichero del almacén. Devuelve si se generó."""
+    storage = almacen.de_documentos()
+    d = almacen.digest(nombre_archivo)
+    destino = storage.path(nombre(d))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    generador = GENERADORES.get(os.path.splitext(nombre_archivo)[1].lower())
+    if generador is None:
+        open(storage.path(_marca(d)), 'w').close()
+        return False
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.previa-', suffix='.png')
+    os.close(fd)
+    try:
+        generador(storage.path(nombre_archivo), temporal)
+        os.replace(temporal, destino)
+        return True
+    except NoDisponible:
+        return False  # se reintenta cuando se instale la dependencia
+    except Exception as e:
+        logger.warning("Sin miniatura para %s: %s", nombre_archivo, e)
+        open(storage.path(_marca(d)), 'w').close()
+        return False
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def generar_pendientes(limite=None):
+    """Una pasada sobre lo pendiente: (generadas, sin miniatura)."""
+    hechas = fallidas = 0
+    for i, n in enumerate(pendientes()):
+        if limite is not None and i >= limite:
+            break
+        if generar(n):
+            hechas += 1
+        else:
+            fallidas += 1
+    return hechas, fallidas
@@ -0,0 +1,97 @@
+# portada/rentas.py
+# Generación en lote de los pagos de renta mensuales de todos los contratos vigentes
+import calendar
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import auditoria, morosidad, resumen, versiones
+from .models import Contrato, Pago, TipoPago
+
+
+def limites_mes(periodo):
+    inicio = periodo.replace(day=1)
+    fin = inicio.replace(day=calendar.monthrange(inicio.year, inicio.month)[1])
+    return inicio, fin
+
+
+def pendientes(periodo, tipo):
+    """
+    Contratos vigentes en algún día del mes sin pago de `tipo` ese mes.
+    Devuelve (lista de (contrato_id, inmueble_id, precio_mensual), nº de contratos que ya lo tienen).
+    """
+    inicio, fin = limites_mes(periodo)
+    ya_generados = set(
+        Pago.objects.filter(tipo=tipo, fecha__range=(inicio, fin), contrato__isnull=False)
+        .values_list('contrato_id', flat=True)
+    )
+    vigentes = Contrato.objects.filter(fecha_inicio__lte=fin).filter(
+        Q(fecha_fin__gte=inicio) | Q(fecha_fin__isnull=True)
+    ).order_by('id').values_list('id', 'inmueble_id', 'precio_mensual')
+    nuevos, existentes = [], 0
+    for fila in vigentes.iterator(chunk_size=2000):
+        if fila[0] in ya_generados:
+            existentes += 1
+        else:
+            nuevos.append(fila)
+    return nuevos, existentes
+
+
+def generar(periodo, tipo, chunk_size=1000, dry_run=False, progreso=None):
+    """
+    Crea los pagos de renta del mes de `periodo` con bulk_create, un bloque de
+    `chunk_size` contratos por transacción. Es idempotente: los contratos que
+    ya tienen un pago de `tipo` en el mes se saltan. `progreso(hechos, total)`
+    se llama tras cada bloque.
+
+    Dos generaciones a la vez del mismo tipo (una tarea y el comando, o dos
+    tareas) no duplican pagos: cada bloque bloquea la fila del TipoPago antes
+    de volver a mirar qué contratos del bloque tienen ya el pago, así que los
+    bloques de una y otra se escriben por turno y el segundo se salta lo que
+    ha creado el primero.
+    """
+    inicio, fin = limites_mes(periodo)
+    nuevos, existentes = pendientes(periodo, tipo)
+    resultado = {'periodo': inicio, 'nuevos': nuevos, 'existentes': existentes, 'creados': 0}
+    if dry_run:
+        return resultado
+
+    quien = tipo.quien_por_defecto or 'inquilino'
+    descripcion = f"Renta {inicio:%m/%Y}"
+    # 'nuevos' acaba siendo lo creado de verdad: lo que otra generación crea antes pasa a 'existentes'
+    resultado['nuevos'] = []
+    for i in range(0, len(nuevos), chunk_size):
+        filas = nuevos[i:i + chunk_size]
+        with transaction.atomic():
+            # UPDATE sin cambios: bloquea la fila en PostgreSQL y toma el bloqueo de escritura en SQLite
+            TipoPago.objects.filter(pk=tipo.pk).update(activo=F('activo'))
+            hechos = set(Pago.objects.filter(
+                tipo=tipo, fecha__range=(inicio, fin), contrato_id__in=[f[0] for f in filas],
+            ).values_list('contrato_id', flat=True))
+            if hechos:
+                filas = [f for f in filas if f[0] not in hechos]
+                resultado['existentes'] += len(hechos)
+            bloque = [
+                Pago(
+                    contrato_id=contrato_id, inmueble_id=inmueble_id, tipo=tipo, fecha=inicio,
+                    descripcion=descripcion, total=precio, pagado=False, quien_paga=quien,
+                )
+                for contrato_id, inmueble_id, precio in filas
+            ]
+            # bulk_create no lanza señales: el resumen se actualiza aquí, agrupado
+            sumas = defaultdict(lambda: [0, 0])
+            for pago in bloque:
+                dims = tuple(resumen.clave(pago).items())
+                sumas[dims][0] += pago.total
+                sumas[dims][1] += 1
+            Pago.objects.bulk_create(bloque, batch_size=chunk_size)
+            resumen.sumar_lote(sumas)
+            morosidad.lote(bloque)
+            versiones.invalidar('pago')
+            auditoria.anotar(auditoria.altas(bloque))
+        resultado['nuevos'] += filas
+        resultado['creados'] += len(bloque)
+        if progreso:
+            progreso(min(i + chunk_size, len(nuevos)), len(nuevos))
+    return resultado
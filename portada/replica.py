@@ -0,0 +1,98 @@
+# portada/replica.py
+# Lecturas pesadas contra una réplica: la BD 'replica' (si está configurada)
+# atiende las consultas a los modelos de portada mientras esté activo el
+# contexto en_replica(); lo activa ReplicaMiddleware para las vistas de
+# settings.REPLICA_VISTAS. Escrituras, sesiones y usuarios van siempre a 'default'.
+#
+# La réplica puede ir retrasada (copia SQLite refrescada con refrescar_replica,
+# o una réplica de PostgreSQL): quien acaba de escribir lee de la principal
+# durante REPLICA_RETRASO_MAX segundos.
+import contextlib
+import os
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+ALIAS = 'replica'
+APPS = {'portada'}
+CLAVE_REFRESCO = 'replica:refrescada'
+
+_activa = ContextVar('replica_activa', default=False)
+
+
+def configurada():
+    return ALIAS in settings.DATABASES
+
+
+def activa():
+    return _activa.get() and configurada()
+
+
+def activar():
+    return _activa.set(True)
+
+
+def desactivar(token=None):
+    # sin token se apaga sin más: el hook que la activó (process_view) puede
+    # haber corrido en otro contexto, p. ej. adaptado con sync_to_async en ASGI
+    if token is None:
+        _activa.set(False)
+    else:
+        _activa.reset(token)
+
+
+@contextlib.contextmanager
+def en_replica():
+    token = activar()
+    try:
+        yield
+    finally:
+        desactivar(token)
+
+
+def marca():
+    """Momento del último refresco de la réplica: forma parte de las claves de caché leídas de ella."""
+    valor = cache.get(CLAVE_REFRESCO)
+    if valor is None:
+        nombre = str(settings.DATABASES[ALIAS].get('NAME', ''))
+        valor = os.path.getmtime(nombre) if os.path.exists(nombre) else 0
+        cache.add(CLAVE_REFRESCO, valor, None)
+    return valor
+
+
+def refrescada():
+    cache.set(CLAVE_REFRESCO, time.time(), None)
+
+
+def al_dia():
+    """
+    Cierra la conexión de este hilo a la réplica si es de antes del último
+    refresco. refrescar_replica sustituye el fichero con os.replace y una
+    conexión persistente (CONN_MAX_AGE) seguiría leyendo el inodo viejo.
+    """
+    conexion = connections[ALIAS]
+    actual = marca()
+    if getattr(conexion, 'marca_replica', None) != actual:
+        conexion.close()
+        conexion.marca_replica = actual
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        if not activa() or model._meta.app_label not in APPS:
+            return None
+        if connections['default'].in_atomic_block:
+            return None  # dentro de una transacción se lee lo que se está escribiendo
+        return ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # son los mismos datos
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS  # la réplica es una copia, no se migra
@@ -0,0 +1,128 @@
+# portada/resumen.py
+# Mantenimiento incremental de ResumenPago (totales mensuales de pagos)
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import versiones
+from .models import Pago, ResumenPago
+
+# totales que muestra el listado de pagos, en una sola consulta
+SUMAS = {
+    'total_listado': Sum('total'),
+    'total_pagado': Sum('total', filter=Q(pagado=True)),
+    'total_pendiente': Sum('total', filter=Q(pagado=False)),
+}
+
+
+def clave(pago):
+    """Dimensiones del resumen a las que pertenece un pago (o un dict con sus campos)."""
+    get = pago.get if isinstance(pago, dict) else lambda c: getattr(pago, c)
+    fecha = get('fecha')
+    if isinstance(fecha, str):
+        fecha = datetime.date.fromisoformat(fecha)
+    return {
+        'inmueble_id': get('inmueble_id'),
+        'tipo_id': get('tipo_id'),
+        'quien_paga': get('quien_paga'),
+        'pagado': get('pagado'),
+        'mes': fecha.replace(day=1),
+    }
+
+
+def importe(valor):
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def sumar(dims, total, num=1):
+    """Suma (o resta, con total/num negativos) un importe en la fila del resumen."""
+    total = importe(total)
+    with transaction.atomic():
+        filas = ResumenPago.objects.filter(**dims).update(total=F('total') + total, num=F('num') + num)
+        if not filas and num > 0:
+            try:
+                with transaction.atomic():
+                    ResumenPago.objects.create(**dims, total=total, num=num)
+            except IntegrityError:
+                # otra petición creó la fila entre medias
+                ResumenPago.objects.filter(**dims).update(total=F('total') + total, num=F('num') + num)
+        elif num < 0:
+            ResumenPago.objects.filter(**dims, num__lte=0).delete()
+
+
+def sumar_lote(sumas, batch_size=1000):
+    """
+    Como sumar() para muchas filas a la vez: `sumas` es {tuple(dims.items()): [total, num]}.
+    Busca las filas existentes con una consulta por (tipo, quien_paga, pagado, mes),
+    les suma las diferencias con un bulk_update de F('total') + x (no se pierde
+    lo que otro escriba entre medias) y crea las que faltan con bulk_create.
+    """
+    grupos = defaultdict(dict)
+    for dims, (total, num) in sumas.items():
+        dims = dict(dims)
+        inmueble_id = dims.pop('inmueble_id')
+        grupos[tuple(dims.items())][inmueble_id] = (importe(total), num)
+
+    with transaction.atomic():
+        cambiados, nuevos, restan = [], [], []
+        for resto, por_inmueble in grupos.items():
+            existentes = dict(ResumenPago.objects.filter(**dict(resto), inmueble_id__in=list(por_inmueble))
+                              .values_list('inmueble_id', 'pk'))
+            for inmueble_id, (total, num) in por_inmueble.items():
+                pk = existentes.get(inmueble_id)
+                if pk is None:
+                    if num > 0:
+                        nuevos.append(ResumenPago(inmueble_id=inmueble_id, total=total, num=num, **dict(resto)))
+                    continue
+                cambiados.append(ResumenPago(pk=pk, total=F('total') + total, num=F('num') + num))
+                if num < 0:
+                    restan.append(pk)
+        ResumenPago.objects.bulk_update(cambiados, ['total', 'num'], batch_size=batch_size)
+        try:
+            with transaction.atomic():
+                ResumenPago.objects.bulk_create(nuevos, batch_size=batch_size)
+        except IntegrityError:
+            # otro proceso ha creado alguna entre medias: una a una, que sumar() lo resuelve
+            for fila in nuevos:
+                dims = {c: getattr(fila, c) for c in ('inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes')}
+                sumar(dims, fila.total, fila.num)
+        if restan:
+            ResumenPago.objects.filter(pk__in=restan, num__lte=0).delete()
+
+
+def reconstruir():
+    """Recalcula el resumen completo desde Pago. Devuelve el nº de filas generadas."""
+    grupos = (
+        Pago.objects.annotate(mes=TruncMonth('fecha'))
+        .values('inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes')
+        .annotate(suma=Sum('total'), n=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        ResumenPago.objects.all().delete()
+        filas = [
+            ResumenPago(
+                inmueble_id=g['inmueble_id'], tipo_id=g['tipo_id'], quien_paga=g['quien_paga'],
+                pagado=g['pagado'], mes=g['mes'], total=g['suma'], num=g['n'],
+            )
+            for g in grupos.iterator(chunk_size=2000)
+        ]
+        ResumenPago.objects.bulk_create(filas, batch_size=1000)
+        versiones.invalidar('pago')  # los totales de los listados salen del resumen
+    return len(filas)
+
+
+def totales(qs=None, dims=None):
+    """
+    Total, pagado y pendiente. Con `dims` (filtros sobre las columnas del
+    resumen) se leen de ResumenPago; si no, un único aggregate condicional sobre qs.
+    """
+    if dims is not None:
+        res = ResumenPago.objects.filter(**dims).aggregate(**SUMAS)
+    else:
+        res = qs.order_by().aggregate(**SUMAS)
+    return {k: v or 0 for k, v in res.items()}
@@ -0,0 +1,146 @@
+# portada/signals.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import auditoria, morosidad, ocupacion, resumen, versiones
+from .models import Contrato, Inmueble, Morosidad, Pago, Propietario, TipoPago
+
+# modelos cuyos borrados ignoran los receptores de aquí (ver silenciar())
+_silenciados = ContextVar('senales_silenciadas', default=frozenset())
+
+
+@contextmanager
+def silenciar(*modelos):
+    """
+    Dentro del bloque, los receptores de borrado de este módulo no hacen nada
+    con los modelos dados: quien borra ajusta el resumen, la morosidad, la
+    auditoría y las versiones de una vez (portada/acciones.py).
+    """
+    token = _silenciados.set(_silenciados.get() | set(modelos))
+    try:
+        yield
+    finally:
+        _silenciados.reset(token)
+
+
+@receiver(pre_save, sender=Pago)
+def pago_guardando(sender, instance, raw=False, **kwargs):
+    # guardamos la clave y el importe previos para restarlos del resumen y de la morosidad;
+    # la misma lectura trae todos los campos para la auditoría
+    instance._resumen_previo = instance._morosidad_previo = instance._auditoria_previo = None
+    if raw or instance.pk is None:
+        return
+    previo = Pago.objects.filter(pk=instance.pk).values(*auditoria.campos(Pago)).first()
+    if previo:
+        instance._resumen_previo = (resumen.clave(previo), previo['total'])
+        instance._morosidad_previo = instance._auditoria_previo = previo
+
+
+@receiver(post_save, sender=Pago)
+def pago_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    morosidad.cambio(getattr(instance, '_morosidad_previo', None), instance)
+    previo = getattr(instance, '_resumen_previo', None)
+    nuevo = resumen.clave(instance)
+    if previo:
+        dims, total = previo
+        if dims == nuevo:
+            diferencia = resumen.importe(instance.total) - total
+            if diferencia:
+                resumen.sumar(nuevo, diferencia, num=0)
+            return
+        resumen.sumar(dims, -total, num=-1)
+    resumen.sumar(nuevo, instance.total)
+
+
+@receiver(post_delete, sender=Pago)
+def pago_borrado(sender, instance, **kwargs):
+    if sender in _silenciados.get():
+        return
+    resumen.sumar(resumen.clave(instance), -instance.total, num=-1)
+    morosidad.cambio(instance, None)
+
+
+@receiver(pre_save, sender=Contrato)
+@receiver(pre_save, sender=Inmueble)
+def auditado_guardando(sender, instance, raw=False, **kwargs):
+    instance._auditoria_previo = None
+    if not raw and instance.pk is not None:
+        instance._auditoria_previo = sender.objects.filter(pk=instance.pk).values(*auditoria.campos(sender)).first()
+
+
+@receiver(post_save, sender=Pago)
+@receiver(post_save, sender=Contrato)
+@receiver(post_save, sender=Inmueble)
+def auditado_guardado(sender, instance, raw=False, update_fields=None, using=None, **kwargs):
+    if not raw:
+        auditoria.cambio(instance, getattr(instance, '_auditoria_previo', None), update_fields, using)
+
+
+@receiver(post_delete, sender=Pago)
+@receiver(post_delete, sender=Contrato)
+@receiver(post_delete, sender=Inmueble)
+def auditado_borrado(sender, instance, using=None, **kwargs):
+    if sender not in _silenciados.get():
+        auditoria.baja(instance, using)
+
+
+@receiver(post_save, sender=Contrato)
+def contrato_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # también el inmueble que apuntaba a este contrato, por si ha cambiado de inmueble
+    ids = {instance.inmueble_id}
+    ids.update(Inmueble.objects.filter(contrato_vigente=instance).values_list('id', flat=True))
+    ocupacion.actualizar(ids)
+
+
+@receiver(post_delete, sender=Contrato)
+def contrato_borrado(sender, instance, **kwargs):
+    ocupacion.actualizar([instance.inmueble_id])
+    # sus pagos se han quedado sin contrato (SET_NULL, sin señales): la deuda pasa a la fila sin contrato
+    if Morosidad.objects.filter(inmueble_id=instance.inmueble_id).exists():
+        morosidad.reconstruir(morosidad.referencia(), [instance.inmueble_id])
+
+
+@receiver(post_save, sender=Inmueble)
+def inmueble_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # si ha cambiado de propietario, su deuda también
+        Morosidad.objects.filter(inmueble=instance).exclude(propietario_id=instance.propietario_id).update(
+            propietario_id=instance.propietario_id)
+
+
+@receiver(post_save, sender=Inmueble)
+@receiver(post_save, sender=Pago)
+@receiver(post_save, sender=TipoPago)
+@receiver(post_save, sender=Contrato)
+@receiver(post_save, sender=Propietario)
+@receiver(post_delete, sender=Inmueble)
+@receiver(post_delete, sender=Pago)
+@receiver(post_delete, sender=TipoPago)
+@receiver(post_delete, sender=Contrato)
+@receiver(post_delete, sender=Propietario)
+def modelo_cambiado(sender, raw=False, **kwargs):
+    # invalida lo cacheado con portada/versiones.py que dependa de este modelo
+    if not raw and sender not in _silenciados.get():
+        versiones.invalidar(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Contrato.inquilinos.through)
+def inquilinos_cambiados(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == 'pre_clear':
+        # clear() no dice qué quita: lo leemos antes
+        relacion = instance.contratos if reverse else instance.inquilinos
+        instance._inquilinos_previos = set(relacion.values_list('pk', flat=True))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versiones.invalidar('contrato')
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_inquilinos_previos', set())
+        # desde el inquilino (inquilino.contratos.add()) pk_set son contratos
+        contratos, inquilinos = (pk_set, {instance.pk}) if reverse else ({instance.pk}, pk_set)
+        auditoria.inquilinos(contratos, inquilinos, action == 'post_add', using)
@@ -0,0 +1,220 @@
+# portada/sintetico.py
+# Cartera sintética determinista para medir rendimiento: misma semilla y mismos
+# tamaños => mismos datos. Escala hasta ~10k propietarios, 50k inmuebles,
+# 100k contratos y 2M pagos insertando con bulk_create por bloques (memoria
+# acotada) y reconstruyendo al final el resumen de pagos, la ocupación y la morosidad.
+import datetime
+import random
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from . import morosidad, ocupacion, resumen, versiones
+from .models import (Contrato, Documento, Incidencia, Inmueble, Inquilino, Morosidad, Pago, Propietario,
+                     ResumenPago, TipoPago)
+
+TAMANOS = {
+    'propietarios': 10_000,
+    'inmuebles': 50_000,
+    'inquilinos': 100_000,
+    'contratos': 100_000,
+    'pagos': 2_000_000,
+}
+FECHA_REFERENCIA = datetime.date(2025, 1, 1)  # "hoy" de los datos; fija para que sean reproducibles
+AÑOS = 5  # antigüedad máxima de contratos y pagos
+
+TIPOS = [  # (nombre, quien_por_defecto, peso, importe mínimo, máximo)
+    ('Renta', 'inquilino', 60, 350, 1500),
+    ('Luz', 'inquilino', 10, 20, 150),
+    ('Agua', 'inquilino', 8, 10, 80),
+    ('Comunidad', 'propietario', 10, 30, 200),
+    ('IBI', 'propietario', 6, 150, 900),
+    ('Seguro', 'propietario', 6, 100, 400),
+]
+CALLES = ['Mayor', 'Real', 'Alcalá', 'Gran Vía', 'Colón', 'San Juan', 'Cervantes', 'Goya', 'La Paz', 'Sol',
+          'Castilla', 'Aragón', 'Valencia', 'Sevilla', 'Toledo', 'Príncipe', 'Libertad', 'Constitución']
+VIAS = ['C/', 'Avda.', 'Pza.', 'Paseo']
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Antonio', 'Lucía', 'Javier', 'Elena', 'Pablo',
+           'Laura', 'Manuel', 'Sara', 'David', 'Marta', 'Sergio', 'Paula', 'Jorge', 'Nuria', 'Raúl']
+APELLIDOS = ['García', 'Fernández', 'González', 'Rodríguez', 'López', 'Martínez', 'Sánchez', 'Pérez',
+             'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero']
+LETRAS_DNI = 'TRWAGMYFPDXBNJZSQVHLCKE'
+
+
+def dni(numero):
+    return f"{numero:08d}{LETRAS_DNI[numero % 23]}"
+
+
+def _persona(rnd):
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+
+
+def _crear(modelo, bloque, ids):
+    with transaction.atomic():
+        modelo.objects.bulk_create(bloque)
+    return [o.pk for o in bloque] if ids else len(bloque)
+
+
+def _por_bloques(modelo, objetos, chunk_size, ids=False):
+    """
+    bulk_create de un generador sin materializarlo entero. Devuelve cuántas
+    filas ha creado o, con ids=True, la lista de sus ids: solo para las tablas
+    a las que apuntan las siguientes, no para los pagos.
+    """
+    creados, bloque = [] if ids else 0, []
+    for obj in objetos:
+        bloque.append(obj)
+        if len(bloque) >= chunk_size:
+            creados += _crear(modelo, bloque, ids)
+            bloque = []
+    if bloque:
+        creados += _crear(modelo, bloque, ids)
+    return creados
+
+
+def vaciar():
+    """
+    Borra la cartera (pagos, contratos, inquilinos, inmuebles, propietarios y
+    lo que cuelga de ellos) con un DELETE directo por tabla, sin Collector ni
+    señales: con millones de pagos el borrado fila a fila tarda horas y
+    desbordaría el búfer de auditoría. Las tablas derivadas se vacían con el
+    resto y las versiones se suben una vez. Devuelve {tabla: filas borradas}.
+    """
+    Relacion = Contrato.inquilinos.through
+    borrados = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        Inmueble.objects.exclude(contrato_vigente=None).update(contrato_vigente=None)  # ciclo Inmueble <-> Contrato
+        for modelo in (Pago, ResumenPago, Morosidad, Relacion, Incidencia, Documento, Contrato, Inquilino, Inmueble,
+                       Propietario):
+            tabla = modelo._meta.db_table
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(tabla)}')
+            borrados[tabla] = cursor.rowcount
+        versiones.invalidar(*versiones.MODELOS)
+    return borrados
+
+
+def tamanos(factor=1.0, **fijos):
+    """TAMANOS multiplicados por `factor`; los que se pasen explícitamente mandan."""
+    return {k: fijos.get(k) if fijos.get(k) is not None else max(1, round(v * factor)) for k, v in TAMANOS.items()}
+
+
+def generar(semilla=42, chunk_size=5000, hoy=FECHA_REFERENCIA, progreso=None, **cuantos):
+    """
+    Crea la cartera en una BD sin propietarios/inmuebles previos. `cuantos`
+    admite las claves de TAMANOS. Devuelve {modelo: nº de filas creadas}.
+    """
+    rnd = random.Random(semilla)
+    n = {**TAMANOS, **{k: v for k, v in cuantos.items() if v is not None}}
+    avisar = progreso or (lambda texto: None)
+    inicio_datos = hoy - datetime.timedelta(days=365 * AÑOS)
+
+    tipos = {}
+    for nombre, quien, *_ in TIPOS:
+        tipos[nombre], _ = TipoPago.objects.get_or_create(nombre=nombre, defaults={'quien_por_defecto': quien})
+
+    avisar(f"propietarios: {n['propietarios']}")
+    propietarios = _por_bloques(Propietario, (
+        Propietario(nombre=_persona(rnd), dni=dni(i), telefono=f"6{rnd.randrange(10**8):08d}",
+                    email=f"propietario{i}@example.com" if rnd.random() < 0.7 else '')
+        for i in range(n['propietarios'])
+    ), chunk_size, ids=True)
+
+    avisar(f"inmuebles: {n['inmuebles']}")
+    tipos_inmueble = [t for t, _ in Inmueble.TIPO_CHOICES]
+    duenos = []  # propietario de cada inmueble, en orden de creación
+
+    def inmuebles_():
+        for _ in range(n['inmuebles']):
+            # reparto sesgado: unos pocos propietarios concentran muchos inmuebles
+            if rnd.random() < 0.3:
+                propietario_id = propietarios[min(int(rnd.paretovariate(1.2)) - 1, len(propietarios) - 1)]
+            else:
+                propietario_id = rnd.choice(propietarios)
+            duenos.append(propietario_id)
+            yield Inmueble(
+                tipo=rnd.choices(tipos_inmueble, weights=[70, 12, 12, 6])[0],
+                direccion=f"{rnd.choice(VIAS)} {rnd.choice(CALLES)} {rnd.randint(1, 200)}",
+                planta=str(rnd.randint(0, 9)), puerta=rnd.choice('ABCD'),
+                metros=float(rnd.randint(8, 180)), habitaciones=rnd.choice([None, 1, 2, 3, 4, 5]),
+                propietario_id=propietario_id,
+            )
+
+    inmuebles = _por_bloques(Inmueble, inmuebles_(), chunk_size, ids=True)
+
+    avisar(f"inquilinos: {n['inquilinos']}")
+    inquilinos = _por_bloques(Inquilino, (
+        Inquilino(nombre=_persona(rnd), dni=dni(50_000_000 + i), telefono=f"7{rnd.randrange(10**8):08d}",
+                  inmueble_id=rnd.choice(inmuebles) if rnd.random() < 0.5 else None)
+        for i in range(n['inquilinos'])
+    ), chunk_size, ids=True)
+
+    # contratos consecutivos por inmueble, sin solapes; el último puede seguir abierto
+    avisar(f"contratos: {n['contratos']}")
+    periodos = []  # (inmueble, inicio, fin) de cada contrato, en orden de creación
+
+    def contratos():
+        # todos los inmuebles tienen al menos uno si hay contratos suficientes; el resto, al azar
+        por_inmueble = [0] * len(inmuebles)
+        for i in range(n['contratos']):
+            por_inmueble[i if i < len(inmuebles) else rnd.randrange(len(inmuebles))] += 1
+        for idx, cuantos_aqui in enumerate(por_inmueble):
+            fecha = inicio_datos + datetime.timedelta(days=rnd.randrange(365))
+            for k in range(cuantos_aqui):
+                restantes = cuantos_aqui - k
+                hueco = max((hoy - fecha).days // restantes - 30, 2)
+                fin = fecha + datetime.timedelta(days=rnd.randint(hueco // 2, hueco))
+                if restantes == 1 and rnd.random() < 0.7:
+                    fin = None  # vigente
+                periodos.append((inmuebles[idx], fecha, fin))
+                yield Contrato(
+                    inmueble_id=inmuebles[idx], propietario_id=duenos[idx], fecha_inicio=fecha, fecha_fin=fin,
+                    precio_mensual=Decimal(rnd.randrange(350, 1500)),
+                )
+                if fin is not None:
+                    fecha = fin + datetime.timedelta(days=rnd.randint(1, 30))
+
+    contratos_ids = _por_bloques(Contrato, contratos(), chunk_size, ids=True)
+    Relacion = Contrato.inquilinos.through
+    _por_bloques(Relacion, (
+        Relacion(contrato_id=c, inquilino_id=inquilinos[(i * 7919 + j) % len(inquilinos)])
+        for i, c in enumerate(contratos_ids) for j in range(1 if rnd.random() < 0.7 else 2)
+    ), chunk_size)
+
+    avisar(f"pagos: {n['pagos']}")
+    pesos = [t[2] for t in TIPOS]
+    dias_datos = (hoy - inicio_datos).days
+
+    def pagos():
+        for i in range(n['pagos']):
+            nombre, quien, _, minimo, maximo = rnd.choices(TIPOS, weights=pesos)[0]
+            contrato_id = None
+            if quien == 'inquilino' and periodos:
+                k = rnd.randrange(len(contratos_ids))
+                inmueble_id, inicio, fin = periodos[k]
+                dias = ((fin or hoy) - inicio).days
+                fecha = inicio + datetime.timedelta(days=rnd.randrange(max(dias, 1)))
+                contrato_id = contratos_ids[k]
+            else:
+                inmueble_id = rnd.choice(inmuebles)
+                fecha = inicio_datos + datetime.timedelta(days=rnd.randrange(dias_datos))
+            antiguedad = (hoy - fecha).days
+            yield Pago(
+                inmueble_id=inmueble_id, contrato_id=contrato_id, tipo_id=tipos[nombre].pk, fecha=fecha,
+                descripcion=f"{nombre} {fecha:%m/%Y}", total=Decimal(rnd.randrange(minimo * 100, maximo * 100)) / 100,
+                # lo antiguo casi siempre está cobrado; lo reciente, a medias
+                pagado=rnd.random() < (0.98 if antiguedad > 90 else 0.6), quien_paga=quien,
+            )
+            if i and i % 100_000 == 0:
+                avisar(f"  {i} pagos")
+
+    creados_pagos = _por_bloques(Pago, pagos(), chunk_size)
+
+    avisar("resumen de pagos, ocupación y morosidad")
+    resumen.reconstruir()
+    ocupacion.actualizar(fecha=hoy)  # a la fecha de los datos, no a la de hoy
+    morosidad.reconstruir(al=hoy)
+    versiones.invalidar(*versiones.MODELOS)
+    return {
+        'propietarios': len(propietarios), 'inmuebles': len(inmuebles), 'inquilinos': len(inquilinos),
+        'contratos': len(contratos_ids), 'pagos': creados_pagos,
+    }
@@ -0,0 +1,82 @@
+# portada/solapes.py
+# Contratos del mismo inmueble que se solapan en el tiempo. Al guardar uno,
+# Contrato.clean() pregunta por el índice de vigencia si choca con otro; aquí
+# se buscan todos los solapes de la tabla (o de un lote por importar) de una
+# pasada: se ordenan los contratos por inmueble y fecha de inicio y se barren
+# con un montículo de los que siguen abiertos, O(n log n) más el nº de pares,
+# en lugar de cruzar la tabla consigo misma.
+#
+# Reparar recorta el contrato anterior hasta la víspera del siguiente: es el
+# posterior el que cuenta como vigente (portada/ocupacion.py, PagoCreate).
+import datetime
+import heapq
+from collections import namedtuple
+
+from django.db import transaction
+
+from . import auditoria, ocupacion, versiones
+from .models import Auditoria, Contrato
+
+Intervalo = namedtuple('Intervalo', 'id inmueble_id inicio fin')
+SIN_FIN = datetime.date.max
+
+
+def intervalos(inmueble_ids=None):
+    """Intervalo de cada contrato (de todos o de unos inmuebles), en el orden del barrido."""
+    qs = Contrato.objects.order_by('inmueble_id', 'fecha_inicio', 'id')
+    if inmueble_ids is not None:
+        qs = qs.filter(inmueble_id__in=list(inmueble_ids))
+    return (Intervalo(*fila) for fila in
+            qs.values_list('id', 'inmueble_id', 'fecha_inicio', 'fecha_fin').iterator(chunk_size=5000))
+
+
+def pares(ordenados):
+    """
+    (anterior, posterior) de cada par de intervalos que se solapan, a partir
+    de intervalos ordenados por (inmueble_id, inicio). Las fechas de fin son
+    inclusivas; None es abierto.
+    """
+    abiertos, inmueble = [], None
+    for actual in ordenados:
+        if actual.inmueble_id != inmueble:
+            abiertos, inmueble = [], actual.inmueble_id
+        # fuera los que acabaron antes de que empiece este: el resto lo solapa
+        while abiertos and abiertos[0][0] < actual.inicio:
+            heapq.heappop(abiertos)
+        for _, _, anterior in abiertos:
+            yield anterior, actual
+        heapq.heappush(abiertos, (actual.fin or SIN_FIN, actual.id, actual))
+
+
+def buscar(inmueble_ids=None):
+    """Lista de pares (anterior, posterior) de contratos solapados en toda la tabla (o en unos inmuebles)."""
+    return list(pares(intervalos(inmueble_ids)))
+
+
+def reparar(lista):
+    """
+    Recorta el contrato anterior de cada par hasta la víspera del posterior,
+    con un bulk_update. Los que empiezan el mismo día no se pueden recortar:
+    se devuelven para revisarlos a mano. Devuelve (recortados, sin_reparar).
+    """
+    fines, sin_reparar = {}, []
+    for anterior, posterior in lista:
+        fin = posterior.inicio - datetime.timedelta(days=1)
+        if fin < anterior.inicio:
+            sin_reparar.append((anterior, posterior))
+        elif fin < fines.get(anterior.id, (anterior, SIN_FIN))[1]:
+            fines[anterior.id] = (anterior, fin)
+    if not fines:
+        return 0, sin_reparar
+    objetos = [Contrato(pk=pk, fecha_fin=fin) for pk, (_, fin) in fines.items()]
+    with transaction.atomic():
+        Contrato.objects.bulk_update(objetos, ['fecha_fin'], batch_size=1000)
+        versiones.invalidar('contrato')
+        auditoria.anotar([
+            auditoria.fila(Contrato, pk, Auditoria.CAMBIO, auditoria.diferencias(
+                Contrato, {'fecha_fin': anterior.fin}, {'fecha_fin': fin}, solo={'fecha_fin'}))
+            for pk, (anterior, fin) in fines.items()
+        ])
+        ids = {a.inmueble_id for a, _ in fines.values()}
+        ocupacion.actualizar(ids if len(ids) <= 5000 else None)
+    return len(objetos), sin_reparar
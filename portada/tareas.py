@@ -0,0 +1,272 @@
+# portada/tareas.py
+# Cola de tareas en la BD para lo que no cabe en una petición: exportaciones,
+# importaciones, generación de rentas, recálculos. La web encola (encolar()) y
+# consulta el estado; el comando `trabajador` las reclama y las ejecuta en un
+# pool de procesos. Cada tarea informa de su progreso, se puede cancelar y, si
+# falla, se reintenta con una espera que se dobla en cada intento.
+#
+# Las tareas se registran con @tarea('nombre') en el módulo tareas.py de
+# cualquier app; cargar() los importa todos.
+import inspect
+import io
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.core.files.storage import default_storage
+from django.db import OperationalError
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from . import auditoria, importacion, liquidaciones, morosidad, ocupacion, previsualizacion, rentas, resumen
+from .models import Tarea, TipoPago
+
+ESPERA_REINTENTO = 30  # segundos antes del 2º intento; se dobla en cada uno
+LATIDO_MAX = 300  # una tarea en curso sin latido en este tiempo se da por huérfana
+INTERVALO_PROGRESO = 1.0  # como mucho una escritura de progreso por segundo
+
+# funcion(ctx, **parametros) -> resultado serializable a JSON; parametros: los nombres que acepta
+# web: se puede encolar desde la interfaz; solo_staff: y solo por staff
+# max_intentos: 1 para las que no se pueden repetir sin duplicar lo que ya hicieron
+# validar(**parametros): lanza ValueError con el motivo si no valen; se comprueba al encolar
+Definicion = namedtuple('Definicion', 'funcion web solo_staff titulo parametros max_intentos validar')
+REGISTRO = {}
+
+
+class Cancelada(Exception):
+    """Se ha pedido cancelar la tarea: la lanza Contexto.progreso() para cortar el trabajo."""
+
+
+def tarea(nombre, web=False, solo_staff=True, titulo='', max_intentos=3, validar=None):
+    def registrar(funcion):
+        parametros = tuple(inspect.signature(funcion).parameters)[1:]  # sin ctx
+        REGISTRO[nombre] = Definicion(funcion, web, solo_staff, titulo or nombre, parametros, max_intentos, validar)
+        return funcion
+    return registrar
+
+
+def cargar():
+    autodiscover_modules('tareas')
+
+
+class Contexto:
+    """Lo que recibe la función de la tarea para informar de cómo va."""
+
+    def __init__(self, tarea):
+        self.tarea = tarea
+        self._ultimo = 0.0
+
+    def progreso(self, hechos, total=None, mensaje=''):
+        """
+        Anota el avance (hechos de total) y comprueba si se ha pedido cancelar,
+        en cuyo caso lanza Cancelada. Se puede llamar en cada vuelta de un
+        bucle: solo escribe en la BD una vez por INTERVALO_PROGRESO.
+        """
+        ahora = time.monotonic()
+        if ahora - self._ultimo < INTERVALO_PROGRESO:
+            return
+        self._ultimo = ahora
+        valor = min(hechos / total, 1.0) if total else 0.0
+        # la condición sobre `cancelar` hace de comprobación en la misma consulta
+        try:
+            actualizada = Tarea.objects.filter(pk=self.tarea.pk, cancelar=False).update(
+                progreso=valor, mensaje=mensaje[:200], latido=timezone.now())
+        except OperationalError:
+            return  # BD ocupada por otro escritor (SQLite): el progreso puede esperar a la siguiente vuelta
+        if not actualizada:
+            raise Cancelada
+
+    def fichero(self, nombre):
+        """Ruta (en default_storage) para un fichero de resultado de esta tarea."""
+        return f'tareas/{self.tarea.pk}/{nombre}'
+
+
+def encolar(tipo, parametros=None, usuario=None, max_intentos=None):
+    """Crea la tarea pendiente. Lanza ValueError si su validar() rechaza los parámetros."""
+    cargar()
+    if tipo not in REGISTRO:
+        raise LookupError(f"Tarea desconocida: {tipo}")
+    if REGISTRO[tipo].validar:
+        REGISTRO[tipo].validar(**(parametros or {}))
+    max_intentos = max_intentos or REGISTRO[tipo].max_intentos
+    return Tarea.objects.create(tipo=tipo, parametros=parametros or {}, max_intentos=max_intentos,
+                                creada_por=usuario if usuario and usuario.is_authenticated else None)
+
+
+def reclamar(trabajador):
+    """Pasa a en curso la siguiente tarea disponible y devuelve su id (None si no hay)."""
+    ahora = timezone.now()
+    candidatas = Tarea.objects.filter(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora).order_by('id')
+    for pk in candidatas.values_list('pk', flat=True)[:20]:
+        # UPDATE condicional: si otro trabajador se la ha llevado antes, 0 filas
+        if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+                estado=Tarea.EN_CURSO, trabajador=trabajador[:100], empezada_en=ahora, latido=ahora,
+                intentos=F('intentos') + 1):
+            return pk
+    return None
+
+
+def _insistiendo(funcion, *args, **kwargs):
+    # el estado final no se puede perder porque SQLite esté ocupado con la escritura de otra tarea
+    for intento in range(20):
+        try:
+            return funcion(*args, **kwargs)
+        except OperationalError:
+            if intento == 19:
+                raise
+            time.sleep(min(0.5 * 2 ** intento, 30))
+
+
+def _fallo(tarea, error):
+    # otro intento más tarde, o fallida si ya no quedan
+    if tarea.intentos < tarea.max_intentos:
+        espera = ESPERA_REINTENTO * 2 ** (tarea.intentos - 1)
+        cambios = {'estado': Tarea.PENDIENTE, 'disponible_desde': timezone.now() + timedelta(seconds=espera)}
+    else:
+        cambios = {'estado': Tarea.FALLIDA, 'terminada_en': timezone.now()}
+    Tarea.objects.filter(pk=tarea.pk, estado=Tarea.EN_CURSO).update(error=error, **cambios)
+
+
+def fallo_externo(pk, error):
+    """Falló el proceso que ejecutaba la tarea, no la tarea misma."""
+    tarea = Tarea.objects.filter(pk=pk).first()
+    if tarea is not None:
+        _fallo(tarea, error)
+
+
+def ejecutar(pk):
+    """Ejecuta una tarea ya reclamada (en el proceso del pool) y deja su estado final."""
+    cargar()
+    tarea = _insistiendo(Tarea.objects.get, pk=pk)
+    definicion = REGISTRO.get(tarea.tipo)
+    en_curso = Tarea.objects.filter(pk=pk, estado=Tarea.EN_CURSO)
+    try:
+        if definicion is None:
+            raise LookupError(f"Tarea desconocida: {tarea.tipo}")
+        # los cambios que haga la tarea se auditan a nombre de quien la encoló
+        with auditoria.como(tarea.creada_por if tarea.creada_por_id else None):
+            resultado = definicion.funcion(Contexto(tarea), **tarea.parametros)
+    except Cancelada:
+        _insistiendo(en_curso.update, estado=Tarea.CANCELADA, terminada_en=timezone.now())
+    except Exception:
+        _insistiendo(_fallo, tarea, traceback.format_exc())
+    else:
+        _insistiendo(en_curso.update, estado=Tarea.HECHA, progreso=1.0, resultado=resultado, error='',
+                     terminada_en=timezone.now())
+    # el proceso del pool puede quedarse parado un buen rato: lo auditado se escribe ya
+    _insistiendo(auditoria.volcar)
+    return _insistiendo(Tarea.objects.values_list('estado', flat=True).get, pk=pk)
+
+
+def cancelar(pk):
+    """Cancela una pendiente en el acto; a una en curso se le pide que pare. Devuelve si había algo que cancelar."""
+    if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+            estado=Tarea.CANCELADA, terminada_en=timezone.now()):
+        return True
+    return bool(Tarea.objects.filter(pk=pk, estado=Tarea.EN_CURSO).update(cancelar=True))
+
+
+def reintentar(pk):
+    """Vuelve a poner en cola una tarea fallida o cancelada, con los intentos a cero."""
+    return bool(Tarea.objects.filter(pk=pk, estado__in=[Tarea.FALLIDA, Tarea.CANCELADA]).update(
+        estado=Tarea.PENDIENTE, intentos=0, cancelar=False, progreso=0, mensaje='', error='',
+        resultado=None, disponible_desde=timezone.now(), terminada_en=None,
+    ))
+
+
+def latir(pks):
+    """El trabajador mantiene vivas las tareas que tiene en marcha."""
+    Tarea.objects.filter(pk__in=list(pks), estado=Tarea.EN_CURSO).update(latido=timezone.now())
+
+
+def recuperar_huerfanas():
+    """Tareas en curso de un trabajador que murió: cuentan como intento fallido."""
+    limite = timezone.now() - timedelta(seconds=LATIDO_MAX)
+    huerfanas = list(Tarea.objects.filter(estado=Tarea.EN_CURSO, latido__lt=limite))
+    for t in huerfanas:
+        _fallo(t, f"El trabajador {t.trabajador} dejó de responder.")
+    return len(huerfanas)
+
+
+def visibles_para(usuario):
+    qs = Tarea.objects.order_by('-creada_en', '-id')
+    return qs if usuario.is_staff else qs.filter(creada_por=usuario)
+
+
+# ----- tareas de portada -----
+
+def _mes(mes, defecto):
+    if not mes:
+        return defecto
+    try:
+        return datetime.strptime(mes, '%Y-%m').date()
+    except (TypeError, ValueError):
+        raise ValueError("El mes debe tener el formato AAAA-MM.")
+
+
+def _rentas(mes=None, tipo='Renta'):
+    """(periodo, TipoPago) de los parámetros de generar_rentas."""
+    periodo = _mes(mes, timezone.localdate().replace(day=1))
+    tipos = TipoPago.objects.filter(pk=int(tipo)) if str(tipo).isdigit() else TipoPago.objects.filter(
+        nombre__iexact=tipo)
+    tipos = list(tipos[:2])
+    if len(tipos) != 1:
+        raise ValueError(f"No hay un único tipo de pago '{tipo}'.")
+    return periodo, tipos[0]
+
+
+def _liquidaciones(mes=None, formato='pdf'):
+    if formato not in liquidaciones.FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato}.")
+    return _mes(mes, liquidaciones.mes_anterior())
+
+
+@tarea('generar_rentas', web=True, titulo='Generar rentas del mes', validar=_rentas)
+def _generar_rentas(ctx, mes=None, tipo='Renta'):
+    periodo, tipo = _rentas(mes, tipo)
+    res = rentas.generar(periodo, tipo, progreso=lambda h, t: ctx.progreso(h, t, f'{h} de {t} contratos'))
+    return {'periodo': f'{res["periodo"]:%Y-%m}', 'creados': res['creados'], 'existentes': res['existentes']}
+
+
+@tarea('reconstruir_resumen', web=True, titulo='Reconstruir el resumen de pagos')
+def _reconstruir_resumen(ctx):
+    return {'filas': resumen.reconstruir()}
+
+
+@tarea('actualizar_ocupacion', web=True, titulo='Recalcular la ocupación')
+def _actualizar_ocupacion(ctx):
+    return {'inmuebles': ocupacion.actualizar()}
+
+
+@tarea('actualizar_morosidad', web=True, titulo='Recalcular la morosidad')
+def _actualizar_morosidad(ctx):
+    return {'contratos': morosidad.reconstruir()}
+
+
+@tarea('generar_previsualizaciones', web=True, titulo='Generar miniaturas de documentos')
+def _generar_previsualizaciones(ctx):
+    hechas, fallidas = previsualizacion.generar_pendientes()
+    return {'generadas': hechas, 'sin_miniatura': fallidas}
+
+
+@tarea('generar_liquidaciones', web=True, titulo='Generar liquidaciones del mes', validar=_liquidaciones)
+def _generar_liquidaciones(ctx, mes=None, formato='pdf'):
+    periodo = _liquidaciones(mes, formato)
+    if formato == 'pdf' and not liquidaciones.pdf_disponible():
+        formato = 'html'  # sin WeasyPrint en el trabajador: al menos las HTML
+    res = liquidaciones.generar(periodo, [formato], progreso=lambda h, t: ctx.progreso(h, t, f'{h} de {t} liquidaciones'))
+    return dict(res, periodo=f'{periodo:%Y-%m}', formato=formato)
+
+
+# confirma bloque a bloque: un reintento volvería a crear las filas de los bloques ya hechos
+@tarea('importar_csv', max_intentos=1)
+def _importar_csv(ctx, tipo, fichero, dry_run=False):
+    with default_storage.open(fichero, 'rb') as f:
+        texto = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+        res = importacion.importar(tipo, texto, dry_run=dry_run,
+                                   progreso=lambda h, t: ctx.progreso(h, t, f'{h} de {t} filas'))
+    default_storage.delete(fichero)  # si falla se conserva para reintentarla a mano con lo que falte
+    return {'total': res['total'], 'validas': res['validas'], 'creados': res['creados'],
+            'errores': res['errores'][:500], 'dry_run': dry_run}
@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (acciones, almacen, analitica, auditoria, benchmark, busqueda, importacion, liquidaciones, morosidad,
+               ocupacion, rentas, previsualizacion, replica, resumen, sintetico, solapes, tareas)
+from .metricas import registro
+from .middleware import ReplicaMiddleware
+from .models import (Auditoria, Contrato, Documento, Inmueble, Inquilino, Morosidad, Pago, Propietario, ResumenPago,
+                     Tarea, TipoPago)
+
+
+# compartida entre procesos como la de producción, pero sin consultas: no cuenta en los presupuestos
+CACHE_COMPARTIDA = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                'LOCATION': os.path.join(tempfile.gettempdir(), 'gestor-pruebas-cache')}}
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def cargar_datos(escala=1):
+    """Cartera sintética pequeña pero con varias filas por relación; `escala` la multiplica."""
+    hoy = datetime.date.today()
+    tipos = TipoPago.objects.bulk_create([
+        TipoPago(nombre='Renta', quien_por_defecto='inquilino'),
+        TipoPago(nombre='IBI', quien_por_defecto='propietario'),
+        TipoPago(nombre='Comunidad', quien_por_defecto='propietario'),
+    ])
+    propietarios = Propietario.objects.bulk_create(
+        [Propietario(nombre=f'Propietario {n}', dni=f'P{n:05d}') for n in range(10 * escala)]
+    )
+    inmuebles = Inmueble.objects.bulk_create([
+        Inmueble(tipo=Inmueble.TIPO_CHOICES[n % 4][0], direccion=f'Calle {n}', planta=str(n % 5),
+                 metros=40 + n % 60, habitaciones=n % 4 or None, propietario=propietarios[n % len(propietarios)])
+        for n in range(30 * escala)
+    ])
+    inquilinos = Inquilino.objects.bulk_create(
+        [Inquilino(nombre=f'Inquilino {n}', dni=f'I{n:05d}', inmueble=inmuebles[n]) for n in range(20 * escala)]
+    )
+    contratos = Contrato.objects.bulk_create([
+        Contrato(inmueble=i, propietario=i.propietario, fecha_inicio=hoy - datetime.timedelta(days=365),
+                 precio_mensual=Decimal(500 + n)) for n, i in enumerate(inmuebles[:20 * escala])
+    ])
+    Relacion = Contrato.inquilinos.through
+    Relacion.objects.bulk_create(
+        [Relacion(contrato=c, inquilino=inquilinos[n]) for n, c in enumerate(contratos)]
+        + [Relacion(contrato=c, inquilino=inquilinos[(n + 1) % len(inquilinos)]) for n, c in enumerate(contratos)]
+    )
+    Pago.objects.bulk_create([
+        Pago(inmueble=inmuebles[n % len(inmuebles)], tipo=tipos[n % 3], fecha=hoy - datetime.timedelta(days=n),
+             total=Decimal(100 + n), pagado=n % 2 == 0, quien_paga='inquilino' if n % 3 == 0 else 'propietario',
+             descripcion=f'Pago {n}')
+        for n in range(100 * escala)
+    ])
+    resumen.reconstruir()
+    ocupacion.actualizar()
+
+
+class PresupuestoConsultasMixin:
+    """
+    Comprueba que cada página hace un nº fijo de consultas, sin depender de
+    cuántas filas haya: se mide con la cartera a escala 1 y a escala 3 y ambas
+    deben quedar dentro del presupuesto. Las subclases definen `presupuestos`
+    = {url: máximo de consultas}; incluye sesión y usuario.
+    """
+    presupuestos = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+
+    def consultas(self, url):
+        self.client.force_login(self.usuario)
+        cache.clear()  # se mide en frío, sin conteos cacheados
+        ContentType.objects.clear_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(ctx.captured_queries), [q['sql'] for q in ctx.captured_queries]
+
+    def test_presupuestos(self):
+        medidas = {}
+        for escala in (1, 3):
+            if escala > 1:
+                for modelo in (Pago, Contrato, Inquilino, Inmueble, Propietario, TipoPago):
+                    modelo.objects.all().delete()
+            cargar_datos(escala)
+            for url, maximo in self.presupuestos.items():
+                n, sql = self.consultas(url.format(**self.ids()))
+                medidas.setdefault(url, []).append(n)
+                with self.subTest(url=url, escala=escala):
+                    self.assertLessEqual(n, maximo, f"{url}: {n} consultas (máx. {maximo})\n" + '\n'.join(sql))
+        for url, (n1, n3) in medidas.items():
+            with self.subTest(url=url):
+                self.assertEqual(n1, n3, f"{url}: las consultas crecen con los datos ({n1} → {n3})")
+
+    def ids(self):
+        return {
+            'inmueble': Inmueble.objects.order_by('id').values_list('id', flat=True).first(),
+            'pago': Pago.objects.order_by('id').values_list('id', flat=True).first(),
+            'contrato': Contrato.objects.order_by('id').values_list('id', flat=True).first(),
+            'propietario': Propietario.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA)
+class PresupuestoAdminTests(PresupuestoConsultasMixin, TestCase):
+    presupuestos = {
+        '/admin/portada/propietario/': 5,
+        '/admin/portada/inmueble/': 5,
+        '/admin/portada/inquilino/': 5,
+        '/admin/portada/contrato/': 6,
+        '/admin/portada/tipopago/': 5,
+        '/admin/portada/pago/': 6,
+        '/admin/portada/propietario/{propietario}/change/': 5,
+        '/admin/portada/contrato/{contrato}/change/': 8,
+    }
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA)
+class PresupuestoVistasTests(PresupuestoConsultasMixin, TestCase):
+    presupuestos = {
+        '/': 2,
+        '/inmuebles/': 4,
+        '/inmuebles/?alquilado=si&orden=-metros': 4,
+        '/inmuebles/?cursor=': 4,
+        '/inmuebles/nuevo/': 3,
+        '/inmuebles/{inmueble}/editar/': 4,
+        '/pagos/': 6,
+        '/pagos/?pagado=no&quien=inquilino': 6,
+        '/pagos/?q=pago&orden=total&cursor=': 5,
+        '/pagos/nuevo/': 4,
+        '/pagos/{pago}/editar/': 5,
+    }
+
+
+class ResumenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.pisos = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=ana)
+                     for n in range(2)]
+        cls.renta, cls.ibi = TipoPago.objects.create(nombre='Renta'), TipoPago.objects.create(nombre='IBI')
+
+    def tabla(self):
+        return list(ResumenPago.objects.order_by('inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes').values(
+            'inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes', 'total', 'num'))
+
+    def assertIgualQueReconstruido(self):
+        incremental = self.tabla()
+        resumen.reconstruir()
+        self.assertEqual(incremental, self.tabla())
+
+    def test_alta_cambio_toggle_y_baja(self):
+        pagos = [Pago.objects.create(inmueble=self.pisos[n % 2], tipo=self.renta, total=Decimal(100 + n),
+                                     quien_paga='inquilino', fecha=datetime.date(2025, 1 + n % 3, 5))
+                 for n in range(6)]
+        self.assertIgualQueReconstruido()
+        # el mismo grupo (solo el importe) y otro grupo (mes, tipo, inmueble)
+        pagos[0].total = Decimal('250.50')
+        pagos[0].save()
+        pagos[1].fecha, pagos[1].tipo, pagos[1].inmueble = datetime.date(2025, 7, 1), self.ibi, self.pisos[0]
+        pagos[1].save()
+        self.assertIgualQueReconstruido()
+        # como PagoTogglePagado
+        for pago in pagos[2:4]:
+            pago.pagado = not pago.pagado
+            pago.save(update_fields=['pagado'])
+        self.assertIgualQueReconstruido()
+        pagos[4].delete()
+        pagos[2].delete()  # el último de su fila: la fila desaparece
+        self.assertIgualQueReconstruido()
+        self.assertEqual(sum(f['num'] for f in self.tabla()), 4)
+        self.assertEqual(resumen.totales(dims={})['total_listado'],
+                         Pago.objects.aggregate(s=models.Sum('total'))['s'])
+
+    def test_rentas_en_lote(self):
+        ana = self.pisos[0].propietario
+        for n, piso in enumerate(self.pisos * 3):
+            Contrato.objects.create(inmueble=piso, propietario=ana, precio_mensual=Decimal(500 + n),
+                                    fecha_inicio=datetime.date(2024, 1, 1))
+        Pago.objects.create(inmueble=self.pisos[0], tipo=self.renta, total=Decimal(1), quien_paga='inquilino',
+                            fecha=datetime.date(2025, 3, 9))  # la fila de marzo ya existe
+        res = rentas.generar(datetime.date(2025, 3, 1), self.renta, chunk_size=4)
+        self.assertEqual(res['creados'], 6)
+        self.assertIgualQueReconstruido()
+
+    def test_rentas_concurrentes_no_duplican(self):
+        ana = self.pisos[0].propietario
+        for n, piso in enumerate(self.pisos * 2):
+            Contrato.objects.create(inmueble=piso, propietario=ana, precio_mensual=Decimal(500 + n),
+                                    fecha_inicio=datetime.date(2024, 1, 1))
+        marzo = datetime.date(2025, 3, 1)
+        # otra generación leyó los pendientes antes de que esta escribiera los suyos
+        leidos = rentas.pendientes(marzo, self.renta)
+        self.assertEqual(rentas.generar(marzo, self.renta, chunk_size=3)['creados'], 4)
+        with mock.patch.object(rentas, 'pendientes', return_value=leidos):
+            res = rentas.generar(marzo, self.renta, chunk_size=3)
+        self.assertEqual((res['creados'], len(res['nuevos']), res['existentes']), (0, 0, 4))
+        self.assertEqual(Pago.objects.filter(tipo=self.renta).count(), 4)
+        self.assertIgualQueReconstruido()
+
+    def test_lote_no_pisa_escrituras_concurrentes(self):
+        pago = Pago.objects.create(inmueble=self.pisos[0], tipo=self.renta, total=Decimal(100),
+                                   quien_paga='inquilino', fecha=datetime.date(2025, 3, 1))
+        dims = tuple(resumen.clave(pago).items())
+        original = models.QuerySet.bulk_update
+
+        def con_carrera(qs, objs, campos, **kwargs):
+            # otra petición suma su pago entre la lectura del lote y su escritura
+            resumen.sumar(dict(dims), Decimal(5))
+            return original(qs, objs, campos, **kwargs)
+        with mock.patch.object(models.QuerySet, 'bulk_update', con_carrera):
+            resumen.sumar_lote({dims: [Decimal(50), 2]})
+        self.assertEqual(ResumenPago.objects.values_list('total', 'num').get(), (Decimal(155), 4))
+
+
+class MigracionesTests(TransactionTestCase):
+    """Las tablas derivadas nacen con los datos que ya había, no vacías."""
+
+    def migrar(self, *destino):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.loader.build_graph()
+        ejecutor.migrate([destino])
+        return ejecutor.loader.project_state([destino]).apps
+
+    def test_resumen_y_morosidad_con_los_pagos_previos(self):
+        apps = self.migrar('portada', '0004_propietario_direccion')
+        self.addCleanup(call_command, 'migrate', verbosity=0)
+        ana = apps.get_model('portada', 'Propietario').objects.create(nombre='Ana', dni='1')
+        piso = apps.get_model('portada', 'Inmueble').objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50,
+                                                                    propietario=ana)
+        renta = apps.get_model('portada', 'TipoPago').objects.create(nombre='Renta')
+        apps.get_model('portada', 'Pago').objects.bulk_create([
+            apps.get_model('portada', 'Pago')(inmueble=piso, tipo=renta, total=Decimal(t), pagado=p,
+                                              quien_paga='inquilino', fecha=datetime.date(2025, m, 5))
+            for t, p, m in [(1000, True, 1), (200, False, 1), (36, False, 2)]
+        ])
+        call_command('migrate', verbosity=0)
+        totales = resumen.totales(dims={})
+        self.assertEqual((totales['total_listado'], totales['total_pagado'], totales['total_pendiente']),
+                         (Decimal('1236'), Decimal('1000'), Decimal('236')))
+        # la morosidad también, igual que si se reconstruyera hoy
+        migrada = list(Morosidad.objects.values('inmueble_id', 'contrato_id', 'al', *morosidad.TRAMOS, 'total', 'num'))
+        self.assertEqual(migrada[0]['total'], Decimal('236'))
+        morosidad.reconstruir()
+        self.assertEqual(
+            list(Morosidad.objects.values('inmueble_id', 'contrato_id', 'al', *morosidad.TRAMOS, 'total', 'num')),
+            migrada)
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jose = Propietario.objects.create(nombre='José Pérez', dni='12345678Z')
+        cls.piso = Inmueble.objects.create(tipo='piso', direccion='Avenida de Andalucía 3', metros=50,
+                                           propietario=cls.jose)
+
+    def encontrados(self, modelo, indice, texto):
+        return set(modelo.objects.filter(busqueda.q_busqueda(indice, texto)).values_list('pk', flat=True))
+
+    def test_prefijos_sin_acentos(self):
+        for texto in ('jose', 'JOSÉ pér', 'pe jo', '1234'):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.encontrados(Propietario, 'propietario', texto), {self.jose.pk})
+        self.assertFalse(self.encontrados(Propietario, 'propietario', 'josefa'))
+        self.assertEqual(self.encontrados(Inmueble, 'inmueble', 'andaluc'), {self.piso.pk})
+        # por columnas y desde el modelo relacionado
+        self.assertFalse(Propietario.objects.filter(busqueda.q_busqueda('propietario', '1234', columnas=['nombre'])))
+        self.assertTrue(Inmueble.objects.filter(busqueda.q_busqueda('propietario', 'perez', 'propietario')))
+
+    def test_triggers_al_cambiar_y_borrar(self):
+        self.piso.direccion = 'Calle Mayor 1'
+        self.piso.save()
+        self.assertFalse(self.encontrados(Inmueble, 'inmueble', 'andalucia'))
+        self.assertEqual(self.encontrados(Inmueble, 'inmueble', 'mayor'), {self.piso.pk})
+        # update() y bulk_create no pasan por save(): los cubren los triggers igual
+        Inmueble.objects.filter(pk=self.piso.pk).update(direccion='Plaza Nueva 2')
+        self.assertEqual(self.encontrados(Inmueble, 'inmueble', 'nuev'), {self.piso.pk})
+        tipo = TipoPago.objects.create(nombre='IBI')
+        Pago.objects.bulk_create([Pago(inmueble=self.piso, tipo=tipo, total=1, fecha=datetime.date(2025, 1, 1),
+                                       quien_paga='propietario', descripcion='Recibo de agua')])
+        self.assertEqual(len(self.encontrados(Pago, 'pago', 'recib agu')), 1)
+        self.piso.delete()
+        self.assertFalse(self.encontrados(Inmueble, 'inmueble', 'nuev'))
+        self.assertFalse(self.encontrados(Pago, 'pago', 'recibo'))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {busqueda.tabla_fts('inmueble')} WHERE "
+                           f"{busqueda.tabla_fts('inmueble')} MATCH 'nueva'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class OcupacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.pisos = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=cls.ana)
+                     for n in range(2)]
+
+    def vigente(self, piso=0):
+        return Inmueble.objects.values_list('contrato_vigente', flat=True).get(pk=self.pisos[piso].pk)
+
+    def contrato(self, dias_inicio, dias_fin=None, piso=0):
+        hoy = timezone.localdate()
+        return Contrato.objects.create(
+            inmueble=self.pisos[piso], propietario=self.ana, precio_mensual=Decimal('500'),
+            fecha_inicio=hoy + datetime.timedelta(days=dias_inicio),
+            fecha_fin=None if dias_fin is None else hoy + datetime.timedelta(days=dias_fin))
+
+    def test_puntero_al_crear_editar_y_borrar(self):
+        self.contrato(-400, -10)  # ya vencido
+        self.assertIsNone(self.vigente())
+        antiguo = self.contrato(-200)
+        self.assertEqual(self.vigente(), antiguo.pk)
+        nuevo = self.contrato(-30, 300)  # el más reciente de los que cubren hoy
+        self.assertEqual(self.vigente(), nuevo.pk)
+        self.contrato(10)  # aún no ha empezado
+        self.assertEqual(self.vigente(), nuevo.pk)
+
+        nuevo.fecha_fin = timezone.localdate() - datetime.timedelta(days=1)
+        nuevo.save()
+        self.assertEqual(self.vigente(), antiguo.pk)
+        # cambiar de inmueble actualiza los dos
+        antiguo.inmueble = self.pisos[1]
+        antiguo.save()
+        self.assertEqual((self.vigente(0), self.vigente(1)), (None, antiguo.pk))
+        antiguo.delete()
+        self.assertIsNone(self.vigente(1))
+
+    def test_contrato_para_otra_fecha(self):
+        actual, anterior = self.contrato(-30), self.contrato(-400, -31)
+        piso = Inmueble.objects.select_related('contrato_vigente').get(pk=self.pisos[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(ocupacion.contrato_para(piso, timezone.localdate()), actual)
+        self.assertEqual(ocupacion.contrato_para(piso, timezone.localdate() - datetime.timedelta(days=100)), anterior)
+        self.assertIsNone(ocupacion.contrato_para(piso, timezone.localdate() - datetime.timedelta(days=500)))
+
+
+class ImportacionTests(TestCase):
+    def test_por_tipo(self):
+        res = importacion.importar('propietarios', ['nombre;dni;direccion', 'Ana;P1;Sol 1', 'Luis;P1;', 'Eva;;'])
+        self.assertEqual((res['total'], res['creados']), (3, 1))
+        self.assertEqual([m for _, m in res['errores']], ['dni: P1 ya existe', 'dni: obligatorio'])
+        importacion.importar('inquilinos', ['Nombre,DNI', 'Bea,I1', 'Juan,I2'])
+        res = importacion.importar('inmuebles', [
+            'tipo,direccion,planta,puerta,metros,habitaciones,propietario_dni',
+            'piso,Mayor 1,2,B,"75,5",3,P1',
+            'piso,Mayor 2,,,80,,P9',
+        ])
+        self.assertEqual(res['errores'], [(3, "propietario_dni: no existe 'P9'")])
+        piso = Inmueble.objects.get(direccion='Mayor 1')
+        self.assertEqual(piso.metros, Decimal('75.5'))
+        res = importacion.importar('contratos', [
+            'propietario_dni,direccion,planta,puerta,inquilinos_dni,fecha_inicio,fecha_fin,precio_mensual',
+            'P1,mayor 1,2,b,I1|I2,01/01/2020,,650',
+        ])
+        self.assertEqual(res['creados'], 1)
+        contrato = Contrato.objects.get()
+        self.assertEqual((contrato.inmueble, contrato.propietario.dni), (piso, 'P1'))
+        self.assertEqual(sorted(contrato.inquilinos.values_list('dni', flat=True)), ['I1', 'I2'])
+        piso.refresh_from_db()
+        self.assertEqual(piso.contrato_vigente, contrato)
+
+    def test_dry_run(self):
+        res = importacion.importar('inquilinos', ['nombre,dni', 'Bea,I1'], dry_run=True)
+        self.assertEqual((res['validas'], res['creados']), (1, 0))
+        self.assertFalse(Inquilino.objects.exists())
+
+    def test_lee_a_medida(self):
+        leidas = []
+
+        def lineas():
+            for linea in ['nombre,dni', *(f'Inquilino {n},I{n}' for n in range(5))]:
+                leidas.append(linea)
+                yield linea
+
+        filas = importacion.leer_csv(lineas())
+        self.assertEqual(next(filas), {'nombre': 'Inquilino 0', 'dni': 'I0'})
+        self.assertEqual(len(leidas), 2)
+        res = importacion.ImportadorInquilinos(chunk_size=2).importar(filas)
+        self.assertEqual((res['total'], res['creados']), (4, 4))
+
+    def test_csv_mal_formado(self):
+        res = importacion.importar('inquilinos', ['nombre,dni', 'Bea,I1', '"Juan"x,I2', 'Eva,"I3', 'Ana,I4'])
+        # la comilla sin cerrar se traga el resto del fichero: error y fin
+        self.assertEqual([n for n, _ in res['errores']], [3, 4])
+        self.assertIn('CSV no válido', res['errores'][0][1])
+        self.assertEqual(list(Inquilino.objects.values_list('dni', flat=True)), ['I1'])
+        with self.assertRaisesMessage(ValidationError, 'Cabecera no válida'):
+            importacion.importar('inquilinos', ['nombre,"dni', 'Bea,I1'])
+
+    def test_vista(self):
+        staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('inmuebles:importar')
+        for contenido, mensaje in [(b'nombre,dni\nBea,\xff\n', 'no está en UTF-8'),
+                                   (b'nombre,"dni\nBea,I1\n', 'Cabecera no válida')]:
+            with self.subTest(mensaje=mensaje):
+                archivo = ContentFile(contenido, name='inquilinos.csv')
+                respuesta = self.client.post(url, {'tipo': 'inquilinos', 'archivo': archivo})
+                self.assertContains(respuesta, mensaje)
+        respuesta = self.client.post(url, {'tipo': 'inquilinos', 'archivo': ContentFile(
+            'nombre;dni\nBea;I1\n"Juan"x;I2\n'.encode(), name='inquilinos.csv')})
+        self.assertContains(respuesta, 'CSV no válido')
+        self.assertEqual(Inquilino.objects.get().dni, 'I1')
+
+    def test_en_segundo_plano_sin_reintentos(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='x', is_staff=True))
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with self.settings(MEDIA_ROOT=media.name):
+            archivo = ContentFile(b'nombre,dni\nBea,I1\n', name='inquilinos.csv')
+            self.client.post(reverse('inmuebles:importar'),
+                             {'tipo': 'inquilinos', 'archivo': archivo, 'segundo_plano': 'on'})
+        # confirma por bloques: repetirla tras un fallo duplicaría los ya creados
+        self.assertEqual(Tarea.objects.get(tipo='importar_csv').max_intentos, 1)
+
+
+class SinteticoTests(TestCase):
+    TAMANOS = {'propietarios': 5, 'inmuebles': 20, 'inquilinos': 30, 'contratos': 35, 'pagos': 300}
+
+    def foto(self):
+        return (
+            list(Inmueble.objects.order_by('pk').values_list('direccion', 'metros', 'propietario__dni',
+                                                           'contrato_vigente__fecha_inicio')),
+            list(Contrato.objects.order_by('pk').values_list('inmueble__direccion', 'fecha_inicio', 'fecha_fin')),
+            list(Pago.objects.order_by('pk').values_list('tipo__nombre', 'fecha', 'total', 'pagado')),
+        )
+
+    def test_determinista(self):
+        creados = sintetico.generar(semilla=7, chunk_size=8, **self.TAMANOS)
+        self.assertEqual(creados, self.TAMANOS)
+        primera = self.foto()
+        # un DELETE por tabla, sin señales: ni auditoría ni ajustes fila a fila
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(13):
+            sintetico.vaciar()
+        self.assertEqual(len(callbacks), 1)  # la subida de versiones, una vez
+        self.assertFalse(Pago.objects.exists() or ResumenPago.objects.exists() or Morosidad.objects.exists())
+        sintetico.generar(semilla=7, chunk_size=8, **self.TAMANOS)
+        self.assertEqual(self.foto(), primera)
+
+    def test_contratos_sin_solapes(self):
+        sintetico.generar(semilla=3, **self.TAMANOS)
+        por_inmueble = {}
+        for inmueble, inicio, fin in Contrato.objects.order_by('inmueble', 'fecha_inicio').values_list(
+                'inmueble', 'fecha_inicio', 'fecha_fin'):
+            anterior = por_inmueble.get(inmueble)
+            if anterior is not None:
+                self.assertLess(anterior, inicio)
+            por_inmueble[inmueble] = fin or datetime.date.max
+        self.assertEqual(resumen.totales(dims={})['total_listado'],
+                         Pago.objects.aggregate(s=models.Sum('total'))['s'])
+        # el puntero es el de la fecha de los datos
+        self.assertEqual(ocupacion.actualizar(fecha=sintetico.FECHA_REFERENCIA), 0)
+
+
+class BenchmarkTests(TestCase):
+    def test_informe_y_comparacion(self):
+        sintetico.generar(semilla=1, propietarios=3, inmuebles=6, inquilinos=6, contratos=8, pagos=40)
+        informe = benchmark.ejecutar(repeticiones=2, calentamiento=0)
+        self.assertEqual(set(informe['casos']), {c[0] for c in benchmark.CASOS})
+        for nombre, caso in informe['casos'].items():
+            with self.subTest(caso=nombre):
+                self.assertTrue(all(e in (200, 302) for e in caso['estados']), caso)
+                self.assertLessEqual(caso['p50_ms'], caso['p99_ms'])
+        # las escrituras medidas se deshacen
+        self.assertEqual(informe['datos']['pago'], 40)
+        self.assertEqual(Pago.objects.count(), 40)
+
+        peor = {'casos': {'pagos:lista': {**informe['casos']['pagos:lista'], 'consultas': 1, 'p95_ms': 0.001}}}
+        self.assertEqual(len(benchmark.comparar(informe, peor)), 2)
+        self.assertEqual(benchmark.comparar(informe, informe), [])
+
+    def test_percentil(self):
+        valores = list(range(1, 101))
+        self.assertEqual([benchmark.percentil(valores, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(benchmark.percentil([7], 99), 7)
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cargar_datos()
+        cls.staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        cls.usuario = get_user_model().objects.create_user('usuario', password='x')
+
+    def setUp(self):
+        registro.reiniciar()
+        self.addCleanup(registro.reiniciar)
+
+    def test_cuenta_las_consultas_de_la_peticion(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('pagos:lista'), {'pagado': 'si'})
+        self.assertEqual(registro.consultas['pagos:lista'].n, 1)
+        self.assertEqual(registro.consultas['pagos:lista'].suma, len(consultas))
+        self.assertGreater(registro.sql['pagos:lista'].suma, 0)
+
+    def test_streaming_hasta_el_final_del_cuerpo(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('pagos:exportar'))
+            self.assertNotIn('pagos:exportar', registro.consultas)  # aún no se ha enviado
+            b''.join(respuesta.streaming_content)
+            respuesta.close()
+        self.assertEqual(registro.consultas['pagos:exportar'].suma, len(consultas))
+
+    @override_settings(METRICAS_CONSULTA_LENTA_MS=0)
+    def test_muestras_lentas(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('pagos:lista'))
+        muestras = registro.muestras_lentas()['pagos:lista']
+        self.assertTrue(all(m.keys() == {'sql', 'params', 'ms'} for m in muestras))
+        self.assertTrue(any('portada_pago' in m['sql'] for m in muestras))
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_solo_staff_o_token(self):
+        url = reverse('portada:metricas')
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 302)
+        respuesta = self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertContains(respuesta, 'portada_consultas_bucket')
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url, {'formato': 'json'})['Content-Type'], 'application/json')
+
+
+@mock.patch.object(replica, 'configurada', lambda: True)
+class ReplicaTests(SimpleTestCase):
+    def test_router(self):
+        router = replica.RouterReplica()
+        self.assertIsNone(router.db_for_read(Pago))
+        with replica.en_replica():
+            self.assertEqual(router.db_for_read(Pago), 'replica')
+            self.assertIsNone(router.db_for_read(Session))  # sesiones y usuarios, siempre de la principal
+            self.assertEqual(router.db_for_write(Pago), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'portada'))
+
+    def middleware(self, request, vista='pagos:lista'):
+        visto = {}
+
+        def get_response(request):
+            m.process_view(request, None, (), {})
+            visto['replica'] = replica.activa()
+            return HttpResponse(status=302 if request.method == 'POST' else 200)
+
+        m = ReplicaMiddleware(get_response)
+        request.resolver_match = mock.Mock(view_name=vista)
+        with self.settings(REPLICA_VISTAS=['pagos:lista', 'admin:*_changelist']), \
+                mock.patch.object(replica, 'al_dia'):
+            m.__init__(get_response)
+            response = m(request)
+        self.assertFalse(replica.activa())
+        return visto['replica'], response
+
+    def test_middleware(self):
+        rf = RequestFactory()
+        self.assertTrue(self.middleware(rf.get('/pagos/'))[0])
+        self.assertTrue(self.middleware(rf.get('/admin/'), 'admin:portada_pago_changelist')[0])
+        self.assertFalse(self.middleware(rf.get('/pagos/nuevo/'), 'pagos:nuevo')[0])
+        en_replica, response = self.middleware(rf.post('/pagos/1/toggle/'), 'pagos:toggle')
+        self.assertFalse(en_replica)
+        self.assertIn(ReplicaMiddleware.cookie, response.cookies)
+        # quien acaba de escribir lee de la principal
+        request = rf.get('/pagos/')
+        request.COOKIES[ReplicaMiddleware.cookie] = '1'
+        self.assertFalse(self.middleware(request)[0])
+
+    def test_streaming_lee_de_la_replica_hasta_cerrar(self):
+        visto = []
+
+        def cuerpo():
+            visto.append(replica.activa())
+            yield b'fila'
+
+        def get_response(request):
+            m.process_view(request, None, (), {})
+            return StreamingHttpResponse(cuerpo())
+
+        m = ReplicaMiddleware(get_response)
+        request = RequestFactory().get('/pagos/exportar/')
+        request.resolver_match = mock.Mock(view_name='pagos:exportar')
+        with self.settings(REPLICA_VISTAS=['pagos:*']), mock.patch.object(replica, 'al_dia'):
+            m.__init__(get_response)
+            response = m(request)
+        self.assertTrue(replica.activa())
+        self.assertEqual(b''.join(response), b'fila')
+        response.close()
+        self.assertEqual(visto, [True])
+        self.assertFalse(replica.activa())
+
+    def test_al_dia_cierra_la_conexion_anterior_al_refresco(self):
+        conexion = mock.Mock(spec=['close'])
+        with mock.patch.object(replica, 'connections', {replica.ALIAS: conexion}), \
+                mock.patch.object(replica, 'marca', side_effect=[1, 1, 2]):
+            replica.al_dia()
+            replica.al_dia()
+            self.assertEqual(conexion.close.call_count, 1)
+            replica.al_dia()  # refrescada: la conexión abierta lee el fichero sustituido
+            self.assertEqual(conexion.close.call_count, 2)
+
+
+@override_settings(AUDITORIA_INTERVALO=0)
+class RefrescarReplicaTests(TransactionTestCase):
+    # la copia (API de backup) necesita los datos confirmados
+    def test_copia(self):
+        cargar_datos()
+        with tempfile.TemporaryDirectory() as tmp:
+            destino = os.path.join(tmp, 'replica.sqlite3')
+            call_command('refrescar_replica', destino=destino, stdout=open(os.devnull, 'w'))
+            copia = sqlite3.connect(destino)
+            try:
+                self.assertEqual(copia.execute('SELECT count(*) FROM portada_pago').fetchone()[0], Pago.objects.count())
+                self.assertEqual(copia.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            finally:
+                copia.close()
+
+
+class AlmacenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.inmuebles = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=prop)
+                         for n in range(3)]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.media = media.name
+
+    def subir(self, inmueble, contenido, nombre='contrato.PDF'):
+        doc = Documento(inmueble=inmueble, archivo=ContentFile(contenido, name=nombre))  # como un formulario
+        doc.save()
+        return doc
+
+    def test_mismo_contenido_un_solo_fichero(self):
+        contenido = b'%PDF-1.4 contrato' * 100000  # más de un trozo
+        docs = [self.subir(i, contenido, f'copia{n}.pdf') for n, i in enumerate(self.inmuebles)]
+        otro = self.subir(self.inmuebles[0], b'otra cosa')
+        self.assertEqual(len({d.archivo.name for d in docs}), 1)
+        self.assertEqual(docs[0].digest, hashlib.sha256(contenido).hexdigest())
+        self.assertTrue(docs[0].archivo.name.startswith(f'documentos/{docs[0].digest[:2]}/'))
+        self.assertEqual([d.nombre_original for d in docs], ['copia0.pdf', 'copia1.pdf', 'copia2.pdf'])
+        self.assertNotEqual(otro.archivo.name, docs[0].archivo.name)
+        ficheros = [f for _, _, fs in os.walk(self.media) for f in fs]
+        self.assertEqual(len(ficheros), 2)  # sin temporales sueltos
+
+    def test_miniaturas_por_contenido(self):
+        pdf = [self.subir(i, b'%PDF mismo') for i in self.inmuebles[:2]]
+        self.subir(self.inmuebles[2], b'texto', 'notas.txt')
+        generadas = []
+
+        def falso(origen, destino):
+            generadas.append(origen)
+            with open(destino, 'wb') as f:
+                f.write(b'png')
+
+        with mock.patch.dict(previsualizacion.GENERADORES, {'.pdf': falso}):
+            self.assertEqual(previsualizacion.generar_pendientes(), (1, 1))  # .txt: sin miniatura
+            self.assertEqual(previsualizacion.generar_pendientes(), (0, 0))  # nada se repite
+        self.assertEqual(len(generadas), 1)
+        self.assertTrue(all(previsualizacion.disponible(d) for d in pdf))
+        self.assertTrue(almacen.direccionado(pdf[0].archivo.name))
+        self.assertFalse(almacen.direccionado('documentos/contrato.pdf'))
+
+
+class TareasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+        cls.usuario = User.objects.create_user('ana', password='x')
+        prop = Propietario.objects.create(nombre='Ana', dni='1')
+        for n in range(3):
+            Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=prop)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        tareas.cargar()  # antes de copiar el registro, o las de inmuebles se perderían al restaurarlo
+        registro = mock.patch.dict(tareas.REGISTRO)
+        registro.start()
+        self.addCleanup(registro.stop)
+
+    def registrar(self, funcion):
+        tareas.tarea('prueba')(funcion)
+
+    def test_encolar_reclamar_ejecutar(self):
+        self.registrar(lambda ctx, n: ctx.progreso(1, 2, 'mitad') or {'doble': n * 2})
+        t = tareas.encolar('prueba', {'n': 21}, self.usuario)
+        self.assertEqual(tareas.reclamar('w1'), t.pk)
+        self.assertIsNone(tareas.reclamar('w2'))  # ya no está pendiente
+        self.assertEqual(tareas.ejecutar(t.pk), Tarea.HECHA)
+        t.refresh_from_db()
+        self.assertEqual((t.resultado, t.progreso, t.intentos, t.trabajador), ({'doble': 42}, 1.0, 1, 'w1'))
+        with self.assertRaises(LookupError):
+            tareas.encolar('no_existe')
+
+    def test_reintentos_con_espera_y_fallida(self):
+        def falla(ctx):
+            raise ValueError('mal')
+        self.registrar(falla)
+        t = tareas.encolar('prueba', max_intentos=2)
+        tareas.reclamar('w')
+        self.assertEqual(tareas.ejecutar(t.pk), Tarea.PENDIENTE)
+        t.refresh_from_db()
+        self.assertIn('ValueError: mal', t.error)
+        self.assertGreater(t.disponible_desde, timezone.now() + datetime.timedelta(seconds=25))
+        self.assertIsNone(tareas.reclamar('w'))  # aún esperando
+        Tarea.objects.filter(pk=t.pk).update(disponible_desde=timezone.now())
+        tareas.reclamar('w')
+        self.assertEqual(tareas.ejecutar(t.pk), Tarea.FALLIDA)
+        self.assertTrue(tareas.reintentar(t.pk))
+        t.refresh_from_db()
+        self.assertEqual((t.estado, t.intentos, t.error), (Tarea.PENDIENTE, 0, ''))
+
+    def test_cancelar(self):
+        self.registrar(lambda ctx: ctx.progreso(1, 10))
+        pendiente = tareas.encolar('prueba')
+        self.assertTrue(tareas.cancelar(pendiente.pk))
+        self.assertIsNone(tareas.reclamar('w'))
+        en_curso = tareas.encolar('prueba')
+        tareas.reclamar('w')
+        self.assertTrue(tareas.cancelar(en_curso.pk))
+        self.assertEqual(tareas.ejecutar(en_curso.pk), Tarea.CANCELADA)  # la corta progreso()
+        self.assertFalse(tareas.cancelar(en_curso.pk))
+
+    def test_huerfanas(self):
+        self.registrar(lambda ctx: None)
+        t = tareas.encolar('prueba', max_intentos=1)
+        tareas.reclamar('w')
+        self.assertEqual(tareas.recuperar_huerfanas(), 0)
+        Tarea.objects.filter(pk=t.pk).update(latido=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(tareas.recuperar_huerfanas(), 1)
+        t.refresh_from_db()
+        self.assertEqual(t.estado, Tarea.FALLIDA)
+        self.assertIn('dejó de responder', t.error)
+
+    def test_exportar_en_segundo_plano(self):
+        self.client.force_login(self.usuario)
+        r = self.client.post(reverse('portada:tarea_encolar'),
+                             {'tipo': 'exportar', 'listado': 'inmuebles', 'query': 'q=Mayor', 'formato': 'csv',
+                              'otro': 'x'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(r.status_code, 202)
+        pk = r.json()['id']
+        # lo que la tarea no acepta no se guarda
+        self.assertEqual(Tarea.objects.get(pk=pk).parametros,
+                         {'listado': 'inmuebles', 'query': 'q=Mayor', 'formato': 'csv'})
+        # el resto de tareas web son solo para staff
+        r = self.client.post(reverse('portada:tarea_encolar'), {'tipo': 'reconstruir_resumen'})
+        self.assertEqual(r.status_code, 403)
+
+        call_command('trabajador', procesos=0, una_vez=True, verbosity=0, stdout=io.StringIO())
+        estado = self.client.get(reverse('portada:tarea', args=[pk])).json()
+        self.assertEqual((estado['estado'], estado['resultado']['filas']), (Tarea.HECHA, 3), estado['error'])
+        r = self.client.get(estado['descarga'])
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('attachment', r['Content-Disposition'])
+        self.assertEqual(b''.join(r.streaming_content).count(b'C/ Mayor'), 3)
+
+        # las tareas de otro usuario no se ven
+        self.client.force_login(get_user_model().objects.create_user('otro', password='x'))
+        self.assertEqual(self.client.get(reverse('portada:tarea', args=[pk])).status_code, 404)
+
+    def test_mes_invalido_no_se_encola(self):
+        TipoPago.objects.create(nombre='Renta')
+        self.client.force_login(self.staff)
+        url = reverse('portada:tarea_encolar')
+        r = self.client.post(url, {'tipo': 'generar_rentas', 'mes': '2025-13'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('AAAA-MM', r.json()['error'])
+        r = self.client.post(url, {'tipo': 'generar_liquidaciones', 'mes': 'marzo'}, follow=True)
+        self.assertContains(r, 'AAAA-MM')
+        r = self.client.post(url, {'tipo': 'generar_rentas', 'tipo_pago': 'x', 'mes': '2025-03'},
+                             HTTP_ACCEPT='application/json')
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(Tarea.objects.get().parametros, {'mes': '2025-03'})
+
+
+class LiquidacionesTests(TestCase):
+    MES = datetime.date(2025, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        renta = TipoPago.objects.create(nombre='Renta', quien_por_defecto='inquilino')
+        ibi = TipoPago.objects.create(nombre='IBI', quien_por_defecto='propietario')
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.luis = Propietario.objects.create(nombre='Luis', dni='2')
+        Propietario.objects.create(nombre='Sin pisos', dni='3')
+        piso, local = [Inmueble.objects.create(tipo=t, direccion=f'C/ Mayor {n}', metros=50, propietario=cls.ana)
+                       for n, t in enumerate(['piso', 'local'])]
+        garaje = Inmueble.objects.create(tipo='garaje', direccion='C/ Sol 1', metros=12, propietario=cls.luis)
+        fecha = datetime.date(2025, 3, 5)
+        cls.pago = Pago.objects.create(inmueble=piso, tipo=renta, fecha=fecha, total=Decimal('700'), pagado=True,
+                                       quien_paga='inquilino')
+        Pago.objects.create(inmueble=local, tipo=renta, fecha=fecha, total=Decimal('500'), quien_paga='inquilino')
+        Pago.objects.create(inmueble=piso, tipo=ibi, fecha=fecha, total=Decimal('120'), pagado=True,
+                            quien_paga='propietario')
+        Pago.objects.create(inmueble=garaje, tipo=renta, fecha=fecha, total=Decimal('80'), pagado=True,
+                            quien_paga='inquilino')
+        Pago.objects.create(inmueble=piso, tipo=renta, fecha=datetime.date(2025, 4, 5), total=Decimal('700'),
+                            pagado=True, quien_paga='inquilino')  # otro mes
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_cifras_con_consultas_agrupadas(self):
+        with self.assertNumQueries(4):
+            datos = liquidaciones.calcular(self.MES)
+        self.assertEqual(set(datos), {self.ana.pk, self.luis.pk})
+        ana = datos[self.ana.pk]
+        self.assertEqual((ana['cobrado'], ana['pendiente_cobro'], ana['gastos'], ana['neto']),
+                         (Decimal('700'), Decimal('500'), Decimal('120'), Decimal('580')))
+        self.assertEqual([len(i['lineas']) for i in ana['inmuebles']], [2, 1])
+        self.assertEqual(datos[self.luis.pk]['neto'], Decimal('80'))
+        self.assertEqual(liquidaciones.calcular(self.MES, [self.luis.pk])[self.luis.pk], datos[self.luis.pk])
+
+    def test_solo_se_renderiza_lo_que_cambia(self):
+        self.assertEqual(liquidaciones.generar(self.MES, procesos=0),
+                         {'total': 2, 'renderizadas': 2, 'sin_cambios': 0})
+        self.assertEqual(liquidaciones.generar(self.MES, procesos=0)['renderizadas'], 0)
+        Pago.objects.filter(pk=self.pago.pk).update(total=Decimal('750'))
+        self.assertEqual(liquidaciones.generar(self.MES, procesos=0)['renderizadas'], 1)
+        html = default_storage.open(liquidaciones.nombre(liquidaciones.calcular(self.MES)[self.ana.pk], 'html')).read()
+        self.assertIn(b'630,00', html)  # 750 - 120
+
+    def test_pool_de_procesos(self):
+        progreso = []
+        with mock.patch.object(liquidaciones, 'LOTE', 1):
+            res = liquidaciones.generar(self.MES, procesos=2, progreso=lambda h, t: progreso.append((h, t)))
+        self.assertEqual(res['renderizadas'], 2)
+        self.assertEqual(progreso, [(1, 2), (2, 2)])
+        for datos in liquidaciones.calcular(self.MES).values():
+            self.assertTrue(default_storage.exists(liquidaciones.nombre(datos, 'html')))
+
+
+@override_settings(CACHES=CACHE_COMPARTIDA)
+class AnaliticaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        luis = Propietario.objects.create(nombre='Luis', dni='2')
+        a, b = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=cls.ana)
+                for n in range(2)]
+        c = Inmueble.objects.create(tipo='local', direccion='C/ Sol 1', metros=80, propietario=luis)
+        d = datetime.date
+        for inmueble, inicio, fin, precio in [
+            (a, d(2025, 1, 15), d(2025, 2, 10), 600),
+            (a, d(2025, 2, 5), None, 700),  # se solapa con el anterior: cuenta desde el 11
+            (c, d(2025, 2, 20), d(2025, 3, 5), 1000),
+            (c, d(2024, 1, 1), d(2024, 6, 30), 900),  # fuera del periodo
+        ]:
+            Contrato.objects.create(inmueble=inmueble, propietario=inmueble.propietario, fecha_inicio=inicio,
+                                    fecha_fin=fin, precio_mensual=Decimal(precio))
+
+    def calcular(self, **kwargs):
+        return analitica.calcular(datetime.date(2025, 1, 1), datetime.date(2025, 3, 1), **kwargs)
+
+    def test_series(self):
+        with self.assertNumQueries(3):
+            datos = self.calcular(usar_numpy=False)
+        self.assertEqual(datos['meses'], ['2025-01', '2025-02', '2025-03'])
+        cartera = datos['cartera']
+        self.assertEqual(cartera['dias_ocupados'], [17, 37, 36])
+        self.assertEqual(cartera['dias_vacios'], [93 - 17, 84 - 37, 93 - 36])
+        self.assertEqual(cartera['ocupacion'][1], round(37 / 84, 4))
+        self.assertEqual(cartera['renta_media'][1], round((10 * 600 + 18 * 700 + 9 * 1000) / 37, 2))
+        self.assertEqual(datos['tipos']['piso']['dias_ocupados'], [17, 28, 31])
+        self.assertEqual(datos['tipos']['local']['renta_media'], [None, 1000, 1000])
+        self.assertEqual(datos['propietarios'][self.ana.pk]['ocupacion'][2], 0.5)
+        self.assertEqual(datos['propietarios'][self.ana.pk]['nombre'], 'Ana')
+
+    @skipIf(analitica.np is None, "numpy no está instalado")
+    def test_numpy_da_lo_mismo(self):
+        self.assertEqual(self.calcular(usar_numpy=True), self.calcular(usar_numpy=False))
+
+    def test_cache_por_versiones(self):
+        desde, hasta = datetime.date(2025, 1, 1), datetime.date(2025, 3, 1)
+        analitica.cacheado(desde, hasta)
+        with self.assertNumQueries(0):
+            analitica.cacheado(desde, hasta)
+        Contrato.objects.filter(precio_mensual=1000).get().delete()
+        self.assertEqual(analitica.cacheado(desde, hasta)['cartera']['dias_ocupados'], [17, 28, 31])
+
+
+class MorosidadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.piso = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=cls.ana)
+        cls.contrato = Contrato.objects.create(inmueble=cls.piso, propietario=cls.ana,
+                                               fecha_inicio=datetime.date(2020, 1, 1), precio_mensual=Decimal('700'))
+        cls.renta = TipoPago.objects.create(nombre='Renta', quien_por_defecto='inquilino')
+
+    def pago(self, dias, total=100, **kwargs):
+        datos = dict(inmueble=self.piso, contrato=self.contrato, tipo=self.renta, total=Decimal(total),
+                     fecha=timezone.localdate() - datetime.timedelta(days=dias), quien_paga='inquilino')
+        return Pago.objects.create(**{**datos, **kwargs})
+
+    def tabla(self):
+        return list(Morosidad.objects.order_by('inmueble_id', 'contrato_id').values(
+            'inmueble_id', 'contrato_id', 'propietario_id', *morosidad.TRAMOS, 'total', 'num'))
+
+    def assertIgualQueReconstruida(self):
+        incremental = self.tabla()
+        morosidad.reconstruir(morosidad.referencia())
+        self.assertEqual(incremental, self.tabla())
+
+    def test_tramos_e_incremental(self):
+        pagos = [self.pago(d, 100 + d) for d in (0, 30, 31, 60, 61, 90, 91, 400)]
+        self.pago(10, pagado=True)
+        self.pago(10, quien_paga='propietario')
+        self.pago(-5)  # aún no vence
+        fila = Morosidad.objects.get()
+        self.assertEqual(
+            [fila.tramo_0_30, fila.tramo_31_60, fila.tramo_61_90, fila.tramo_90, fila.num],
+            [Decimal(100 + 130), Decimal(131 + 160), Decimal(161 + 190), Decimal(191 + 500), 8],
+        )
+        self.assertIgualQueReconstruida()
+
+        pagos[0].pagado = True
+        pagos[0].save(update_fields=['pagado'])  # como PagoTogglePagado
+        pagos[1].fecha -= datetime.timedelta(days=100)
+        pagos[1].total = Decimal('1')
+        pagos[1].save()
+        pagos[2].total = Decimal('5')
+        pagos[2].save()
+        pagos[3].delete()
+        self.assertIgualQueReconstruida()
+        for p in pagos[4:]:
+            p.delete()
+        Pago.objects.get(pk=pagos[1].pk).delete()
+        Pago.objects.get(pk=pagos[2].pk).delete()
+        self.assertFalse(Morosidad.objects.exists())
+
+    def test_sin_consultas_para_pagos_que_no_son_deuda(self):
+        pagado = self.pago(10, pagado=True)
+        pagado.total = Decimal('50')
+        with self.assertNumQueries(0):
+            morosidad.cambio({'pagado': True, 'quien_paga': 'inquilino'}, pagado)
+
+    def test_lote_rentas_y_contrato_borrado(self):
+        self.pago(45)
+        mes = timezone.localdate().replace(day=1)
+        rentas.generar(mes, self.renta)
+        self.assertIgualQueReconstruida()
+        self.assertEqual(Morosidad.objects.get().num, 2)
+        self.contrato.delete()  # los pagos se quedan sin contrato
+        self.assertEqual(self.tabla()[0]['contrato_id'], None)
+        self.assertIgualQueReconstruida()
+
+    def test_alertas_y_recalculo_diario(self):
+        self.pago(120, 900)
+        otro = Inmueble.objects.create(tipo='local', direccion='C/ Sol 2', metros=80, propietario=self.ana)
+        self.pago(100, 300, inmueble=otro, contrato=None)
+        self.pago(91, 50)
+        self.assertEqual([m.tramo_90 for m in morosidad.alertas()], [Decimal('950'), Decimal('300')])
+        self.assertEqual(len(morosidad.alertas(minimo=500)), 1)
+        # calculada hace dos días, el pago de 91 días tenía 89: los tramos se mueven al recalcular
+        morosidad.reconstruir(timezone.localdate() - datetime.timedelta(days=2))
+        self.assertEqual(Morosidad.objects.get(inmueble=self.piso).tramo_61_90, Decimal('50'))
+        call_command('actualizar_morosidad', stdout=io.StringIO())
+        self.assertEqual(morosidad.referencia(), timezone.localdate())
+        self.assertEqual(Morosidad.objects.get(inmueble=self.piso).tramo_90, Decimal('950'))
+
+
+class AccionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.piso = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=ana)
+        cls.renta = TipoPago.objects.create(nombre='Renta')
+        cls.ibi = TipoPago.objects.create(nombre='IBI')
+        hoy = timezone.localdate()
+        for n in range(6):
+            Pago.objects.create(inmueble=cls.piso, tipo=cls.renta, total=Decimal(100 + n), quien_paga='inquilino',
+                                fecha=hoy - datetime.timedelta(days=40 * n), pagado=n % 2 == 0)
+
+    def derivados(self):
+        return (list(ResumenPago.objects.order_by('tipo_id', 'quien_paga', 'pagado', 'mes').values(
+                    'inmueble_id', 'tipo_id', 'quien_paga', 'pagado', 'mes', 'total', 'num')),
+                list(Morosidad.objects.order_by('id').values(*morosidad.TRAMOS, 'total', 'num')))
+
+    def assertIgualQueReconstruidos(self):
+        incrementales = self.derivados()
+        resumen.reconstruir()
+        morosidad.reconstruir(morosidad.referencia())
+        self.assertEqual(incrementales, self.derivados())
+
+    def test_acciones_con_un_update(self):
+        todos = Pago.objects.all()
+        with CaptureQueriesContext(connection) as consultas:
+            res = acciones.aplicar(todos, 'pagado', num=6)
+        # sobre los pagos, una lectura y un UPDATE sean cuantos sean
+        self.assertEqual(len([c for c in consultas if '"portada_pago"' in c['sql']]), 2)
+        self.assertEqual(res, {'seleccionados': 6, 'cambiados': 3})
+        self.assertFalse(Pago.objects.filter(pagado=False).exists())
+        self.assertIgualQueReconstruidos()
+        acciones.aplicar(todos.filter(total__gte=103), 'pendiente')
+        self.assertIgualQueReconstruidos()
+        acciones.aplicar(todos.filter(total__lte=101), 'quien', 'propietario')
+        acciones.aplicar(todos.filter(total=104), 'tipo', str(self.ibi.pk))
+        self.assertEqual(Pago.objects.filter(tipo=self.ibi).count(), 1)
+        self.assertIgualQueReconstruidos()
+        res = acciones.aplicar(todos.filter(total__gte=104), 'borrar', total=Decimal('209'))
+        self.assertEqual(res['cambiados'], 2)
+        self.assertEqual(Pago.objects.count(), 4)
+        self.assertIgualQueReconstruidos()
+
+    def test_conflictos_y_valores(self):
+        with self.assertRaises(acciones.Conflicto):
+            acciones.aplicar(Pago.objects.filter(pk__in=[1, 2, 10 ** 6]), 'pagado', num=3)
+        with self.assertRaises(acciones.Conflicto):
+            acciones.aplicar(Pago.objects.all(), 'borrar', total=Decimal('1'))
+        self.assertEqual(Pago.objects.count(), 6)
+        # otro usuario cambia una fila entre la lectura y el UPDATE: se deshace todo
+        original = models.QuerySet.update
+        primero = Pago.objects.filter(pagado=False).order_by('id')[0].pk
+        def con_carrera(qs, **cambios):
+            with connection.cursor() as cursor:
+                cursor.execute('UPDATE portada_pago SET pagado = 1 WHERE id = %s', [primero])
+            return original(qs, **cambios)
+        with mock.patch.object(models.QuerySet, 'update', con_carrera), self.assertRaises(acciones.Conflicto):
+            acciones.aplicar(Pago.objects.all(), 'pagado')
+        self.assertEqual(Pago.objects.filter(pagado=False).count(), 3)
+        for accion, valor in [('tipo', '999'), ('quien', 'nadie'), ('x', None)]:
+            with self.assertRaises(ValueError):
+                acciones.aplicar(Pago.objects.all(), accion, valor)
+
+    def test_borrado_con_receptores_ajenos(self):
+        borrados = []
+
+        def receptor(sender, instance, **kwargs):
+            borrados.append(instance.pk)
+        models.signals.post_delete.connect(receptor, sender=Pago)
+        self.addCleanup(models.signals.post_delete.disconnect, receptor, sender=Pago)
+        ids = sorted(Pago.objects.values_list('pk', flat=True))
+        # los de signals.py no: el resumen no se resta dos veces
+        self.assertEqual(acciones.aplicar(Pago.objects.all(), 'borrar')['cambiados'], 6)
+        self.assertEqual(sorted(borrados), ids)
+        self.assertIgualQueReconstruidos()
+
+
+
+class SolapesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.pisos = [Inmueble.objects.create(tipo='piso', direccion=f'C/ Mayor {n}', metros=50, propietario=cls.ana)
+                     for n in range(3)]
+
+    def contrato(self, inicio, fin=None, piso=0):
+        return Contrato.objects.create(inmueble=self.pisos[piso], propietario=self.ana, precio_mensual=Decimal('500'),
+                                       fecha_inicio=datetime.date.fromisoformat(inicio),
+                                       fecha_fin=fin and datetime.date.fromisoformat(fin))
+
+    def test_clean(self):
+        primero = self.contrato('2024-01-01', '2024-12-31')
+        primero.full_clean()  # no choca consigo mismo
+        for inicio, fin in [('2024-12-31', None), ('2023-01-01', '2024-01-01'), ('2024-03-01', '2024-04-01')]:
+            with self.subTest(inicio=inicio, fin=fin), self.assertRaisesMessage(ValidationError, 'Se solapa'):
+                Contrato(inmueble=self.pisos[0], propietario=self.ana, precio_mensual=1, fecha_inicio=inicio,
+                         fecha_fin=fin).full_clean()
+        Contrato(inmueble=self.pisos[0], propietario=self.ana, precio_mensual=1, fecha_inicio='2025-01-01').full_clean()
+        Contrato(inmueble=self.pisos[1], propietario=self.ana, precio_mensual=1, fecha_inicio='2024-06-01').full_clean()
+        with self.assertRaisesMessage(ValidationError, 'anterior a la fecha de inicio'):
+            Contrato(inmueble=self.pisos[2], propietario=self.ana, precio_mensual=1, fecha_inicio='2024-06-01',
+                     fecha_fin='2024-05-01').full_clean()
+
+    def test_buscar_como_fuerza_bruta_y_reparar(self):
+        rnd = random.Random(7)
+        for _ in range(60):
+            inicio = datetime.date(2020, 1, 1) + datetime.timedelta(days=rnd.randrange(1500))
+            fin = None if rnd.random() < 0.2 else inicio + datetime.timedelta(days=rnd.randrange(400))
+            self.contrato(inicio.isoformat(), fin and fin.isoformat(), piso=rnd.randrange(3))
+        todos = list(Contrato.objects.all())
+        esperados = {
+            tuple(sorted((a.pk, b.pk))) for a in todos for b in todos
+            if a.pk < b.pk and a.inmueble_id == b.inmueble_id
+            and a.fecha_inicio <= (b.fecha_fin or datetime.date.max) and b.fecha_inicio <= (a.fecha_fin or datetime.date.max)
+        }
+        with self.assertNumQueries(1):
+            lista = solapes.buscar()
+        self.assertEqual({tuple(sorted((a.id, b.id))) for a, b in lista}, esperados)
+
+        recortados, sin_reparar = solapes.reparar(lista)
+        self.assertTrue(recortados)
+        restantes = {(a.id, b.id) for a, b in solapes.buscar()}
+        self.assertEqual(restantes, {(a.id, b.id) for a, b in sin_reparar})
+        # el posterior es el vigente: el puntero de ocupación no cambia de criterio
+        self.assertEqual(ocupacion.actualizar(), 0)
+
+    def test_importacion_y_comando(self):
+        self.contrato('2024-01-01', '2024-12-31')
+        csv = [
+            'inmueble_id,fecha_inicio,fecha_fin,precio_mensual',
+            f'{self.pisos[0].pk},2024-06-01,,700',  # choca con el existente
+            f'{self.pisos[1].pk},2024-01-01,2024-06-30,700',
+            f'{self.pisos[1].pk},2024-06-30,,700',  # choca con la línea anterior (fines inclusivos)
+            f'{self.pisos[2].pk},2024-01-01,,700',
+        ]
+        res = importacion.importar('contratos', csv)
+        self.assertEqual(res['creados'], 1)
+        self.assertEqual([n for n, _ in res['errores']], [2, 3, 4])
+        self.assertIn('el contrato', res['errores'][0][1])
+        self.assertIn('la línea 4', res['errores'][1][1])
+
+        self.contrato('2024-06-01', piso=0)
+        self.contrato('2024-01-01', '2024-02-01', piso=0)
+        salida = io.StringIO()
+        call_command('auditar_contratos', stdout=salida)
+        self.assertIn('2 par(es) solapado(s) en 1 inmueble(s)', salida.getvalue())
+        call_command('auditar_contratos', '--reparar', stdout=salida)
+        self.assertIn('Empiezan el mismo día', salida.getvalue())
+        self.assertEqual(len(solapes.buscar()), 1)
+
+
+# con AUDITORIA_INTERVALO = 0 se escribe al confirmar, sin otro hilo escribiendo en la BD de las pruebas
+@override_settings(AUDITORIA_INTERVALO=0)
+class AuditoriaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('ana')
+        cls.ana = Propietario.objects.create(nombre='Ana', dni='1')
+        cls.piso = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=cls.ana)
+        cls.renta = TipoPago.objects.create(nombre='Renta')
+
+    def cambios(self, obj):
+        return [(a.accion, a.cambios) for a in auditoria.historial(obj).order_by('id')]
+
+    def test_diferencias_por_campo(self):
+        with self.captureOnCommitCallbacks(execute=True), auditoria.como(self.usuario):
+            pago = Pago.objects.create(inmueble=self.piso, tipo=self.renta, total=Decimal('100'),
+                                       quien_paga='inquilino', fecha=datetime.date(2025, 1, 1))
+            pago.total, pago.descripcion = Decimal('150'), 'enero'
+            pago.save()
+            pago.save()  # sin cambios: sin fila
+            Pago.objects.filter(pk=pago.pk).update(descripcion='otra')  # la instancia queda desfasada
+            pago.pagado = True
+            pago.save(update_fields=['pagado'])
+            pk = pago.pk
+            pago.delete()
+        alta, cambio, toggle, baja = self.cambios(Pago(pk=pk))
+        self.assertEqual(alta[0], Auditoria.ALTA)
+        self.assertEqual(alta[1]['total'], [None, '100.00'])
+        self.assertEqual(alta[1]['fecha'], [None, '2025-01-01'])
+        self.assertEqual(cambio, (Auditoria.CAMBIO, {'total': ['100.00', '150.00'], 'descripcion': ['', 'enero']}))
+        self.assertEqual(toggle, (Auditoria.CAMBIO, {'pagado': [False, True]}))
+        self.assertEqual(baja[0], Auditoria.BAJA)
+        self.assertEqual(baja[1]['total'], ['150.00', None])
+        self.assertEqual({a.usuario_nombre for a in auditoria.historial(Pago, pk)}, {'ana'})
+        self.assertEqual(auditoria.por_usuario(self.usuario).count(), 4)
+
+    def test_altas_en_bloque(self):
+        juan = Inquilino.objects.create(nombre='Juan', dni='I1')
+        with self.captureOnCommitCallbacks(execute=True), auditoria.como(self.usuario):
+            importacion.importar('inmuebles', ['tipo,direccion,metros,propietario_dni', 'local,C/ Sol 2,80,1'])
+            local = Inmueble.objects.get(direccion='C/ Sol 2')
+            importacion.importar('contratos', [
+                'inmueble_id,inquilinos_dni,fecha_inicio,precio_mensual', f'{local.pk},I1,01/01/2025,700'])
+            rentas.generar(datetime.date(2025, 3, 1), self.renta)
+        (accion, cambios), = self.cambios(local)
+        self.assertEqual((accion, cambios['direccion']), (Auditoria.ALTA, [None, 'C/ Sol 2']))
+        contrato = Contrato.objects.get()
+        (accion, cambios), = self.cambios(contrato)
+        self.assertEqual((cambios['precio_mensual'], cambios['inquilinos']), ([None, '700.00'], [[], [juan.pk]]))
+        pago = Pago.objects.get()
+        (accion, cambios), = self.cambios(pago)
+        self.assertEqual((accion, cambios['contrato_id'], cambios['total']), (Auditoria.ALTA, [None, contrato.pk],
+                                                                               [None, '700.00']))
+        self.assertEqual(auditoria.por_usuario(self.usuario).count(), 3)
+
+    def test_sin_confirmar_no_se_anota(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.piso.metros = 60
+                    self.piso.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(Auditoria.objects.exists())
+
+    def test_bufer_en_lotes(self):
+        bufer = auditoria.Buffer()
+        self.addCleanup(bufer.parar, 5)
+        with mock.patch.object(auditoria, 'buffer', bufer), override_settings(AUDITORIA_INTERVALO=3600):
+            with self.captureOnCommitCallbacks(execute=True):
+                for n in range(5):
+                    self.piso.metros = 51 + n
+                    self.piso.save()
+            # la petición no escribe: las filas esperan al hilo
+            self.assertEqual(bufer.pendientes(), 5)
+            self.assertFalse(Auditoria.objects.exists())
+            with self.assertNumQueries(1):
+                self.assertEqual(bufer.volcar(), 5)
+        self.assertEqual([c['metros'] for _, c in self.cambios(self.piso)], [[50.0 + n, 51.0 + n] for n in range(5)])
+
+    def test_masivos_e_inquilinos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pagos = [Pago.objects.create(inmueble=self.piso, tipo=self.renta, total=Decimal(100), quien_paga='inquilino',
+                                         fecha=datetime.date(2025, mes, 1)) for mes in (1, 2, 3)]
+            acciones.aplicar(Pago.objects.all(), 'pagado')
+            acciones.aplicar(Pago.objects.filter(pk=pagos[0].pk), 'borrar')
+        self.assertEqual(self.cambios(pagos[1])[1:], [(Auditoria.CAMBIO, {'pagado': [False, True]})])
+        self.assertEqual(self.cambios(pagos[0])[-1][0], Auditoria.BAJA)
+
+        juan, eva = (Inquilino.objects.create(nombre=n, dni=n) for n in ('juan', 'eva'))
+        contrato = Contrato.objects.create(inmueble=self.piso, propietario=self.ana, precio_mensual=Decimal('500'),
+                                           fecha_inicio=datetime.date(2024, 1, 1), fecha_fin=datetime.date(2025, 12, 31))
+        posterior = Contrato.objects.create(inmueble=self.piso, propietario=self.ana, precio_mensual=Decimal('600'),
+                                            fecha_inicio=datetime.date(2025, 6, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            contrato.inquilinos.add(juan, eva)
+            juan.contratos.remove(contrato)
+            contrato.inquilinos.clear()
+            solapes.reparar(solapes.buscar())
+        self.assertEqual([c for _, c in self.cambios(contrato)], [
+            {'inquilinos': [[], sorted([juan.pk, eva.pk])]},
+            {'inquilinos': [sorted([juan.pk, eva.pk]), [eva.pk]]},
+            {'inquilinos': [[eva.pk], []]},
+            {'fecha_fin': ['2025-12-31', '2025-05-31']},
+        ])
+        self.assertFalse(self.cambios(posterior))
+
+
+class AuditoriaHiloTests(TransactionTestCase):
+    # el hilo escribe con su propia conexión: los cambios tienen que estar confirmados
+    def setUp(self):
+        self.bufer = auditoria.Buffer()
+        self.addCleanup(self.bufer.parar, 5)  # ningún hilo sigue escribiendo en la BD de otra prueba
+        parche = mock.patch.object(auditoria, 'buffer', self.bufer)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def esperar(self, filas):
+        for _ in range(100):
+            if Auditoria.objects.count() >= filas:
+                break
+            time.sleep(0.05)
+
+    def test_el_hilo_vuelca(self):
+        ana = Propietario.objects.create(nombre='Ana', dni='1')
+        with override_settings(AUDITORIA_INTERVALO=0.05):
+            piso = Inmueble.objects.create(tipo='piso', direccion='C/ Mayor 1', metros=50, propietario=ana)
+            self.esperar(1)
+        self.assertEqual(auditoria.historial(piso).get().accion, Auditoria.ALTA)
+        self.assertEqual(self.bufer.pendientes(), 0)
+        self.bufer.parar(5)
+        self.assertFalse(self.bufer._hilo.is_alive())
+
+    def test_un_lote_despierta_al_hilo(self):
+        filas = [auditoria.fila(Pago, n, Auditoria.ALTA, {'total': [None, n]}) for n in range(4)]
+        with mock.patch.object(auditoria, 'LOTE', 3), override_settings(AUDITORIA_INTERVALO=3600):
+            self.bufer.anotar(filas[:2])
+            time.sleep(0.2)
+            self.assertEqual(self.bufer.pendientes(), 2)  # esperan al intervalo
+            self.bufer.anotar(filas[2:])
+            self.esperar(4)
+        self.assertEqual(Auditoria.objects.count(), 4)
+        self.assertEqual(self.bufer.pendientes(), 0)
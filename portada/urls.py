@@ -1,7 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'portada'
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', views.home_async if settings.VISTAS_ASYNC else views.home, name='home'),
+    path('metricas/', views.metricas, name='metricas'),
+    path('tareas/', views.tareas_lista, name='tareas'),
+    path('tareas/encolar/', views.tarea_encolar, name='tarea_encolar'),
+    path('tareas/<int:pk>/', views.tarea_estado, name='tarea'),
+    path('tareas/<int:pk>/cancelar/', views.tarea_cancelar, name='tarea_cancelar'),
+    path('tareas/<int:pk>/reintentar/', views.tarea_reintentar, name='tarea_reintentar'),
+    path('tareas/<int:pk>/resultado/', views.tarea_resultado, name='tarea_resultado'),
 ]
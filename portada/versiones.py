@@ -0,0 +1,108 @@
+# portada/versiones.py
+# Caché invalidada por versión de modelo: cada modelo tiene un contador en la
+# caché que las señales (portada/signals.py) y las escrituras masivas suben al
+# cambiar cualquier fila. Lo cacheado lleva en la clave las versiones de los
+# modelos de los que depende, así que un cambio deja inaccesible lo anterior
+# sin tener que buscarlo ni borrarlo.
+#
+# La caché tiene que ser compartida por todos los procesos que escriben: la web,
+# el trabajador de tareas y los comandos (Redis, BD...; ver settings_produccion).
+# Con LocMem cada proceso solo ve sus propias subidas, así que lo que se sirve
+# sin volver a la vista (respuestas enteras, 304 de la API) exige compartida().
+import hashlib
+import re
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.utils.http import quote_etag
+
+from . import replica
+
+MODELOS = ('inmueble', 'pago', 'tipopago', 'contrato', 'propietario')
+TTL = 600
+
+
+def compartida():
+    """Si la caché la ven todos los procesos; LocMem (y Dummy) es la de cada uno."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _clave(modelo):
+    return f'version:{modelo}'
+
+
+def _semilla():
+    # al perderse un contador (reinicio, desalojo) se reinicia con un valor nuevo,
+    # nunca con uno que ya pudiera estar en claves antiguas
+    return time.time_ns()
+
+
+def _subir(modelos):
+    for modelo in modelos:
+        try:
+            cache.incr(_clave(modelo))
+        except ValueError:
+            cache.set(_clave(modelo), _semilla(), None)
+
+
+def invalidar(*modelos):
+    """
+    Sube la versión de los modelos. Se sube ya (para quien lea dentro de la
+    misma transacción) y otra vez al confirmar: lo que otra petición cachee
+    entre medias con los datos aún sin confirmar queda también invalidado.
+    """
+    _subir(modelos)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _subir(modelos))
+
+
+def versiones(*modelos):
+    """Cadena con la versión actual de cada modelo, para componer claves."""
+    claves = [_clave(m) for m in modelos]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            cache.add(clave, _semilla(), None)
+            actuales[clave] = cache.get(clave)
+    resultado = '|'.join(f'{m}:{actuales[c]}' for m, c in zip(modelos, claves))
+    if replica.activa():
+        # lo leído de la réplica vale hasta su próximo refresco, aunque no cambie la versión
+        resultado += f'|replica:{replica.marca()}'
+    return resultado
+
+
+_TABLAS = re.compile(r'\bportada_(%s)(?![a-z])' % '|'.join(MODELOS))
+
+
+def de_sql(sql):
+    """Modelos versionados cuyas tablas (o sus índices FTS) aparecen en una consulta."""
+    return sorted(set(_TABLAS.findall(sql)))
+
+
+def clave(prefijo, modelos, *partes):
+    resumen = hashlib.sha1('|'.join(str(p) for p in partes).encode()).hexdigest()
+    return f'{prefijo}:{versiones(*modelos)}:{resumen}'
+
+
+def etag(modelos, *partes):
+    """
+    ETag de una respuesta que depende de `modelos`: cambia con su versión, sin
+    fechas (dos cambios en el mismo segundo darían el mismo Last-Modified).
+    None con una caché local: otro proceso puede haber cambiado los datos.
+    """
+    if not compartida():
+        return None
+    return quote_etag(hashlib.sha1(clave('etag', modelos, *partes).encode()).hexdigest())
+
+
+def cacheado(prefijo, modelos, calcular, *partes, ttl=TTL):
+    """Valor cacheado mientras no cambie ninguno de `modelos`; si no, se recalcula."""
+    k = clave(prefijo, modelos, *partes)
+    valor = cache.get(k)
+    if valor is None:
+        valor = calcular()
+        cache.set(k, valor, ttl)
+    return valor
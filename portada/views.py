@@ -1,6 +1,125 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render
+from django.contrib.auth.views import redirect_to_login
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_POST
+
+from . import tareas
+from .metricas import registro
+from .models import Tarea
 
 @login_required
 def home(request):
     return render(request, 'portada/home.html')
+
+@login_required
+async def home_async(request):
+    request.user = await request.auser()  # ya cargado por login_required: que la plantilla no lo repita
+    # la plantilla lee la sesión (mensajes): se renderiza en un hilo
+    return await sync_to_async(render)(request, 'portada/home.html')
+
+def metricas(request):
+    # solo staff, o un scraper con "Authorization: Bearer <METRICAS_TOKEN>"
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    cabecera = request.headers.get('Authorization', '')
+    autorizado = request.user.is_staff or (token and constant_time_compare(cabecera, f'Bearer {token}'))
+    if not autorizado:
+        if request.user.is_authenticated:
+            return HttpResponse(status=403)
+        return redirect_to_login(request.get_full_path())
+    if request.GET.get('formato') == 'json':
+        return HttpResponse(json.dumps(registro.muestras_lentas(), default=str, indent=2),
+                            content_type='application/json')
+    return HttpResponse(registro.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ----- TAREAS EN SEGUNDO PLANO (portada/tareas.py) -----
+def _estado(t):
+    return {
+        'id': t.pk,
+        'tipo': t.tipo,
+        'estado': t.estado,
+        'estado_display': t.get_estado_display(),
+        'progreso': round(t.progreso, 3),
+        'mensaje': t.mensaje,
+        'terminada': t.terminada,
+        'resultado': t.resultado,
+        'error': t.error.strip().splitlines()[-1] if t.error else '',
+        'descarga': reverse('portada:tarea_resultado', args=[t.pk])
+                    if t.estado == Tarea.HECHA and (t.resultado or {}).get('fichero') else None,
+    }
+
+def _responder(request, t, status=200):
+    # JSON para el JS que sondea; redirección a la lista si viene de un formulario normal
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(_estado(t), status=status)
+    return redirect('portada:tareas')
+
+@login_required
+def tareas_lista(request):
+    tareas.cargar()
+    lanzables = [(nombre, d.titulo) for nombre, d in sorted(tareas.REGISTRO.items())
+                 if d.web and nombre != 'exportar' and (request.user.is_staff or not d.solo_staff)]
+    return render(request, 'portada/tareas.html', {
+        'tareas': tareas.visibles_para(request.user).select_related('creada_por')[:50],
+        'lanzables': lanzables,
+    })
+
+@login_required
+@require_POST
+def tarea_encolar(request):
+    tareas.cargar()
+    tipo = request.POST.get('tipo', '')
+    definicion = tareas.REGISTRO.get(tipo)
+    if definicion is None or not definicion.web:
+        raise Http404
+    if definicion.solo_staff and not request.user.is_staff:
+        return HttpResponse(status=403)
+    # solo los que acepta la tarea: uno de más la haría fallar en cada intento;
+    # 'tipo' es el de la tarea, no el parámetro homónimo de generar_rentas
+    parametros = {k: v for k, v in request.POST.items() if k in definicion.parametros and k != 'tipo'}
+    try:
+        t = tareas.encolar(tipo, parametros, request.user)
+    except ValueError as e:
+        # mejor ahora que tras agotar los reintentos en el trabajador
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('portada:tareas')
+    return _responder(request, t, status=202)
+
+@login_required
+def tarea_estado(request, pk):
+    return JsonResponse(_estado(get_object_or_404(tareas.visibles_para(request.user), pk=pk)))
+
+@login_required
+@require_POST
+def tarea_cancelar(request, pk):
+    t = get_object_or_404(tareas.visibles_para(request.user), pk=pk)
+    tareas.cancelar(t.pk)
+    t.refresh_from_db()
+    return _responder(request, t)
+
+@login_required
+@require_POST
+def tarea_reintentar(request, pk):
+    t = get_object_or_404(tareas.visibles_para(request.user), pk=pk)
+    tareas.reintentar(t.pk)
+    t.refresh_from_db()
+    return _responder(request, t)
+
+@login_required
+def tarea_resultado(request, pk):
+    t = get_object_or_404(tareas.visibles_para(request.user), pk=pk, estado=Tarea.HECHA)
+    fichero = (t.resultado or {}).get('fichero')
+    if not fichero or not default_storage.exists(fichero):
+        raise Http404
+    return FileResponse(default_storage.open(fichero, 'rb'), as_attachment=True,
+                        filename=t.resultado.get('nombre') or fichero.rsplit('/', 1)[-1])